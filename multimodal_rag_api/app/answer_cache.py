@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from .config import settings
+
+
+def normalize_question(question):
+    return " ".join(question.casefold().split())
+
+
+class AnswerCache:
+    """Per-product answer cache with an exact-match and a semantic lookup.
+
+    Entries share one LRU across products and expire after ttl seconds.
+    invalidate(product) drops a product's entries and bumps its generation,
+    so answers computed against the old documents are not stored. Each
+    request counts once: as a hit of the lookup that answered it, or as a
+    miss from get_similar, or from record_miss when it skips that lookup.
+    """
+
+    def __init__(self, max_entries=None, ttl=None, threshold=None):
+        self.max_entries = max_entries or settings.ANSWER_CACHE_MAX_ENTRIES
+        self.ttl = settings.ANSWER_CACHE_TTL if ttl is None else ttl
+        self.threshold = settings.ANSWER_CACHE_SIMILARITY if threshold is None else threshold
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_product = {}
+        self._matrices = {}
+        self._generations = {}
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def generation(self, product):
+        return self._generations.get(product, 0)
+
+    def _expired(self, entry):
+        return self.ttl > 0 and time.time() - entry["created"] > self.ttl
+
+    def _drop(self, product, key):
+        self._entries.pop((product, key), None)
+        keys = self._by_product.get(product)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del self._by_product[product]
+        self._matrices.pop(product, None)
+
+    def get_exact(self, product, question):
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get((product, key))
+            if entry is not None and self._expired(entry):
+                self._drop(product, key)
+                entry = None
+            if entry is None:
+                return None
+            self._entries.move_to_end((product, key))
+            self.exact_hits += 1
+            return entry["answer"]
+
+    def record_miss(self):
+        """Counts a request that missed get_exact and is answered without calling get_similar."""
+        with self._lock:
+            self.misses += 1
+
+    def get_similar(self, product, vector):
+        with self._lock:
+            # Expired entries are dropped first, so a valid match further down still counts.
+            for key in [key for key in self._by_product.get(product, ()) if self._expired(self._entries[(product, key)])]:
+                self._drop(product, key)
+            keys = self._by_product.get(product)
+            if not keys:
+                self.misses += 1
+                return None
+            if product not in self._matrices:
+                ordered = [key for key in keys if self._entries[(product, key)]["vector"] is not None]
+                vectors = [self._entries[(product, key)]["vector"] for key in ordered]
+                self._matrices[product] = (ordered, np.stack(vectors) if vectors else None)
+            ordered, matrix = self._matrices[product]
+            if matrix is None:
+                self.misses += 1
+                return None
+            query = np.asarray(vector, dtype=np.float32)
+            query /= np.linalg.norm(query) or 1.0
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            key = ordered[best]
+            entry = self._entries[(product, key)]
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((product, key))
+            self.semantic_hits += 1
+            return entry["answer"]
+
+    def put(self, product, question, vector, answer, generation):
+        # Answers found without a question vector are only served to exact repeats.
+        key = normalize_question(question)
+        if vector is not None:
+            vector = np.asarray(vector, dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+        with self._lock:
+            if generation != self.generation(product):
+                return
+            self._entries[(product, key)] = {"answer": answer, "vector": vector, "created": time.time()}
+            self._entries.move_to_end((product, key))
+            self._by_product.setdefault(product, {})[key] = None
+            self._matrices.pop(product, None)
+            while len(self._entries) > self.max_entries:
+                (old_product, old_key), _ = next(iter(self._entries.items()))
+                self._drop(old_product, old_key)
+                self.evictions += 1
+
+    def invalidate(self, product):
+        with self._lock:
+            self._generations[product] = self.generation(product) + 1
+            for key in list(self._by_product.get(product, {})):
+                self._drop(product, key)
+            self.invalidations += 1
+
+    def stats(self):
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries)
+        }
@@ -1,157 +1,355 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Header
+from fastapi import APIRouter, HTTPException, Header, Depends, Request, Response
+from fastapi.responses import StreamingResponse
+import json
 import shutil
 import os
-from .models import RAGQueryRequest, RAGQueryResponse
-from .rag_pipeline import store_document_in_vector_db
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
-from langchain_openai import ChatOpenAI
+import time
+import zipfile
+from .models import RAGBatchQueryRequest, RAGQueryRequest, RAGQueryResponse
+from .batch_query import abatch_query
+from .bulk import import_directory
+from .blobs import BlobStore, UploadTooLarge, product_dir, receive_file, safe_filename, safe_product_name
+from .context import build_context
+from .query import (aembed_question, aexact_match, ahybrid_retrieve, agenerate, arerank, astream_answer, build_messages,
+                    candidate_count, rerank_enabled, source_metadata)
+from .config import settings
+from .metrics import INGEST_STAGES, PROMETHEUS_CONTENT_TYPE, cache_samples, metrics, stage
+from .resources import ResourceRegistry, get_resources
 
 router = APIRouter()
 
 ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "admin123")
+# Room for the multipart boundaries and part headers around the file itself.
+MULTIPART_OVERHEAD = 64 * 1024
+UPLOAD_REQUEST_BODY = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}}}}}}}
 
-@router.post("/admin/upload")
-def admin_upload_pdf(product: str, file: UploadFile = File(...), x_api_key: str = Header(...)):
+@router.post("/admin/upload", status_code=202, openapi_extra=UPLOAD_REQUEST_BODY)
+async def admin_upload_pdf(product: str, request: Request, response: Response, x_api_key: str = Header(...), resources: ResourceRegistry = Depends(get_resources)):
     if x_api_key != ADMIN_API_KEY:
         raise HTTPException(status_code=401, detail="Unauthorized")
     
-    if not os.getenv("OPENAI_API_KEY"):
-        raise HTTPException(status_code=500, detail="OpenAI API key not configured. Cannot process documents.")
+    if not settings.providers_ready():
+        raise HTTPException(status_code=500, detail="Model providers not configured: set OPENAI_API_KEY or choose offline providers. Cannot process documents.")
     
-    if file.filename is None:
-        raise HTTPException(status_code=400, detail="Uploaded file must have a filename.")
+    # Refuse oversized bodies before reading them; chunked ones are cut off while streaming.
+    max_bytes = settings.UPLOAD_MAX_MB * 1024 * 1024
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_bytes + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the limit of {settings.UPLOAD_MAX_MB} MB.")
     
-    safe_product = "".join(c for c in product if c.isalnum() or c in (' ', '-', '_')).strip()
-    safe_product = safe_product.replace(' ', '_')
+    blobs = BlobStore()
+    writer = blobs.writer(max_bytes)
+    try:
+        with stage("file_write", INGEST_STAGES):
+            filename = await receive_file(request, writer)
+            if filename is None:
+                raise HTTPException(status_code=400, detail="Uploaded file must have a filename.")
+            digest = writer.commit()
+    except UploadTooLarge:
+        writer.discard()
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the limit of {settings.UPLOAD_MAX_MB} MB.")
+    except ValueError as e:
+        writer.discard()
+        raise HTTPException(status_code=400, detail=f"Malformed upload: {str(e)}")
+    except BaseException:
+        writer.discard()
+        raise
     
-    data_dir = os.path.abspath("./data")
-    dest_dir = os.path.join(data_dir, safe_product)
-    os.makedirs(dest_dir, exist_ok=True)
+    stored_hash, version = resources.catalog.version(product, filename)
+    if digest == stored_hash:
+        response.status_code = 200
+        return {"product": product, "filename": filename, "job_id": None, "status": "unchanged", "version": version,
+                "file_hash": digest, "bytes": writer.size}
     
-    safe_filename = "".join(c for c in file.filename if c.isalnum() or c in (' ', '-', '_', '.')).strip()
-    dest = os.path.join(dest_dir, safe_filename)
     try:
-        with open(dest, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        try:
-            num_chunks = store_document_in_vector_db(dest, product, file.filename)
-            return {"product": product, "filename": file.filename, "chunks_stored": num_chunks}
-        except Exception as process_error:
-            return {
-                "product": product, 
-                "filename": file.filename, 
-                "status": "uploaded but processing failed",
-                "error": str(process_error),
-                "chunks_stored": 0
-            }
+        # Identical files share one blob; each product gets a link to it.
+        dest = blobs.link(digest, os.path.join(product_dir(product), safe_filename(filename)))
+        job = resources.jobs.submit(dest, product, filename, digest)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    return {"product": product, "filename": filename, "job_id": job["id"], "status": job["status"], "version": version,
+            "file_hash": digest, "bytes": writer.size}
+
+@router.delete("/admin/products/{product}/documents/{document}")
+def admin_delete_document(product: str, document: str, x_api_key: str = Header(...), resources: ResourceRegistry = Depends(get_resources)):
+    if x_api_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    if not resources.jobs.remove_document(product, document):
+        raise HTTPException(status_code=404, detail=f"Document '{document}' not found for product '{product}'.")
+    
+    path = os.path.join(product_dir(product), safe_filename(document))
+    if os.path.exists(path):
+        os.remove(path)
+    return {"product": product, "document": document, "deleted": True}
+
+@router.delete("/admin/products/{product}")
+def admin_delete_product(product: str, x_api_key: str = Header(...), resources: ResourceRegistry = Depends(get_resources)):
+    if x_api_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    if not resources.catalog.has_product(product):
+        raise HTTPException(status_code=404, detail=f"Product '{product}' not found.")
+    
+    documents = resources.jobs.remove_product(product)
+    if safe_product_name(product):
+        shutil.rmtree(product_dir(product), ignore_errors=True)
+    return {"product": product, "documents_deleted": documents}
+
+@router.get("/admin/jobs")
+def admin_list_jobs(status: str = None, limit: int = 100, x_api_key: str = Header(...), resources: ResourceRegistry = Depends(get_resources)):
+    if x_api_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    return resources.jobs.store.list(status=status, limit=limit)
+
+@router.get("/admin/jobs/{job_id}")
+def admin_get_job(job_id: str, x_api_key: str = Header(...), resources: ResourceRegistry = Depends(get_resources)):
+    if x_api_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    job = resources.jobs.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return job
+
+@router.post("/admin/imports", status_code=202, openapi_extra=UPLOAD_REQUEST_BODY)
+async def admin_import_zip(request: Request, product: str = None, x_api_key: str = Header(...), resources: ResourceRegistry = Depends(get_resources)):
+    if x_api_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    if not settings.providers_ready():
+        raise HTTPException(status_code=500, detail="Model providers not configured: set OPENAI_API_KEY or choose offline providers. Cannot process documents.")
+    
+    max_bytes = settings.IMPORT_MAX_MB * 1024 * 1024
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_bytes + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the limit of {settings.IMPORT_MAX_MB} MB.")
+    
+    # Archives are kept by hash, so uploading the same ZIP again resumes its import.
+    archives = BlobStore(import_directory())
+    writer = archives.writer(max_bytes)
+    try:
+        filename = await receive_file(request, writer)
+        if filename is None:
+            raise HTTPException(status_code=400, detail="Uploaded file must have a filename.")
+        digest = writer.commit()
+    except UploadTooLarge:
+        writer.discard()
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the limit of {settings.IMPORT_MAX_MB} MB.")
+    except ValueError as e:
+        writer.discard()
+        raise HTTPException(status_code=400, detail=f"Malformed upload: {str(e)}")
+    except BaseException:
+        writer.discard()
+        raise
+    
+    source = archives.path(digest)
+    if not zipfile.is_zipfile(source):
+        os.remove(source)
+        raise HTTPException(status_code=400, detail="Upload must be a ZIP file of PDFs, one folder per product.")
+    record = resources.jobs.start_import(source, product)
+    resources.jobs.submit_import(record["id"])
+    return {**resources.jobs.store.get_import(record["id"]), "filename": filename}
+
+@router.get("/admin/imports")
+def admin_list_imports(limit: int = 100, x_api_key: str = Header(...), resources: ResourceRegistry = Depends(get_resources)):
+    if x_api_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    return resources.jobs.store.list_imports(limit=limit)
+
+@router.get("/admin/imports/{import_id}")
+def admin_get_import(import_id: str, x_api_key: str = Header(...), resources: ResourceRegistry = Depends(get_resources)):
+    if x_api_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    record = resources.jobs.store.get_import(import_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Import '{import_id}' not found.")
+    jobs = {}
+    for job in resources.jobs.store.import_jobs(import_id).values():
+        jobs[job["status"]] = jobs.get(job["status"], 0) + 1
+    return {**record, "jobs": jobs}
+
+@router.post("/admin/imports/{import_id}/resume", status_code=202)
+def admin_resume_import(import_id: str, x_api_key: str = Header(...), resources: ResourceRegistry = Depends(get_resources)):
+    if x_api_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    record = resources.jobs.store.get_import(import_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Import '{import_id}' not found.")
+    if record["status"] == "completed":
+        raise HTTPException(status_code=409, detail=f"Import '{import_id}' has completed.")
+    if not resources.jobs.submit_import(import_id):
+        raise HTTPException(status_code=409, detail=f"Import '{import_id}' is running.")
+    return resources.jobs.store.get_import(import_id)
+
+@router.get("/admin/stats")
+def admin_stats(x_api_key: str = Header(...), resources: ResourceRegistry = Depends(get_resources)):
+    if x_api_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    return {"embedding_cache": resources.embedding_cache.stats(), "answer_cache": resources.answer_cache.stats()}
+
+@router.get("/metrics")
+def prometheus_metrics(resources: ResourceRegistry = Depends(get_resources)):
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    
+    return Response(metrics.render(cache_samples(resources)), media_type=PROMETHEUS_CONTENT_TYPE)
 
 @router.get("/products")
-def list_products():
-    if not os.getenv("OPENAI_API_KEY"):
-        return {"error": "OpenAI API key not configured"}
+async def list_products(response: Response, if_none_match: str = Header(None), resources: ResourceRegistry = Depends(get_resources)):
+    if not settings.providers_ready():
+        return {"error": "Model providers not configured: set OPENAI_API_KEY or choose offline providers"}
     
     try:
-        if not os.path.exists("./chroma_db"):
+        if not os.path.exists(resources.persist_directory):
             return {}
         
-        vectorstore = Chroma(
-            collection_name="mm_rag",
-            embedding_function=OpenAIEmbeddings(),
-            persist_directory="./chroma_db"
-        )
-        
-        try:
-            all_docs = vectorstore.get()
-            if not all_docs or not all_docs.get('metadatas'):
-                return {}
-        except Exception as inner_e:
-            return {}
-        
-        products = {}
-        
-        for metadata in all_docs['metadatas']:
-            if metadata and 'product' in metadata and 'document' in metadata:
-                product = metadata['product']
-                document = metadata['document']
-                if product not in products:
-                    products[product] = []
-                if document not in products[product]:
-                    products[product].append(document)
+        products, etag = resources.catalog.snapshot()
+        if if_none_match and etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers={"ETag": etag})
         
+        response.headers["ETag"] = etag
         return products
     except Exception as e:
         return {"error": f"Failed to load products: {str(e)}"}
 
-@router.post("/rag/query", response_model=RAGQueryResponse)
-def rag_query(request: RAGQueryRequest):
-    if not os.getenv("OPENAI_API_KEY"):
-        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+def check_query(request: RAGQueryRequest, resources: ResourceRegistry):
+    if not settings.providers_ready():
+        raise HTTPException(status_code=500, detail="Model providers not configured: set OPENAI_API_KEY or choose offline providers")
     
     product = getattr(request, 'product', None)
     if not product:
         raise HTTPException(status_code=400, detail="Product is required.")
     
+    if not resources.catalog.has_product(product):
+        raise HTTPException(status_code=400, detail=f"No documents found for product '{product}'. Available products: {resources.catalog.product_names()}")
+    return product
+
+@router.post("/rag/query", response_model=RAGQueryResponse)
+async def rag_query(request: RAGQueryRequest, resources: ResourceRegistry = Depends(get_resources)):
+    product = check_query(request, resources)
+    
+    answer_cache = resources.answer_cache
+    cached_answer = answer_cache.get_exact(product, request.question)
+    if cached_answer is not None:
+        return RAGQueryResponse(answer=cached_answer)
+    
     try:
-        vectorstore = Chroma(
-            collection_name="mm_rag",
-            embedding_function=OpenAIEmbeddings(),
-            persist_directory="./chroma_db"
-        )
-        
-        test_retriever = vectorstore.as_retriever(search_kwargs={"k": 1, "filter": {"product": product}})
-        test_docs = test_retriever.invoke("test")
-        
-        if not test_docs:
-            raise HTTPException(status_code=400, detail=f"No documents found for product '{product}'. Available products: {list(set([doc.get('product', 'unknown') for doc in vectorstore.get()['metadatas'] if doc]))}")
-        
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 5, "filter": {"product": product}})
-        docs = retriever.invoke(request.question)
-        text_chunks = [doc.page_content for doc in docs]
-        context_text = '\n'.join(text_chunks)
-        
-        if not context_text.strip():
-            return RAGQueryResponse(answer="I don't know.")
-        
-        context_length = len(context_text)
-        
-        if context_length > 1000:
-            system_prompt = """You are a helpful assistant that answers questions based on the provided context. 
+        generation = answer_cache.generation(product)
+        reranking = rerank_enabled(request.rerank)
+        k = candidate_count(reranking)
+        question_vector = None
+        docs = await aexact_match(resources, product, request.question, k)
+        if docs is None:
+            question_vector = await aembed_question(resources, request.question)
+            cached_answer = answer_cache.get_similar(product, question_vector)
+            if cached_answer is not None:
+                return RAGQueryResponse(answer=cached_answer)
             
-            Instructions:
-            - Give comprehensive and detailed answers when you have sufficient information
-            - Include specific details, examples, and elaborations from the context
-            - Structure your response clearly with relevant points
-            - Use only information from the provided context"""
-        elif context_length > 300:
-            system_prompt = """You are a helpful assistant that answers questions based on the provided context.
-            
-            Instructions:
-            - Provide clear and informative answers using the available context
-            - Include key details but keep responses focused
-            - Use only information from the provided context"""
+            docs = await ahybrid_retrieve(resources, product, request.question, question_vector, k)
         else:
-            system_prompt = """You are a helpful assistant that answers questions based on the provided context.
-            
-            Instructions:
-            - Give concise, direct answers based on the limited information available
-            - If context is insufficient for a detailed answer, provide what you can briefly
-            - Use only information from the provided context"""
+            answer_cache.record_miss()
+        rerank_ms = None
+        if reranking:
+            docs, rerank_ms = await arerank(resources, request.question, docs)
+            rerank_ms = round(rerank_ms, 1)
+        with stage("context"):
+            context = build_context(docs)
         
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Context:\n{context_text}\n\nQuestion: {request.question}\n\nAnswer:"}
-        ]
-        llm = ChatOpenAI(model="gpt-4o")
-        response = llm.invoke(messages)
-        if isinstance(response.content, str):
-            return RAGQueryResponse(answer=response.content)
-        else:
-            return RAGQueryResponse(answer=str(response.content))
+        if not context["text"].strip():
+            return RAGQueryResponse(answer="I don't know.", rerank_ms=rerank_ms)
+        
+        answer = await agenerate(resources, build_messages(context["text"], request.question, context["tokens"]))
+        answer_cache.put(product, request.question, question_vector, answer, generation)
+        return RAGQueryResponse(answer=answer, rerank_ms=rerank_ms, context_tokens=context["tokens"],
+                                tokens_saved=context["tokens_saved"])
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
- 
\ No newline at end of file
+def sse_event(event: str, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/rag/query/stream")
+async def rag_query_stream(request: RAGQueryRequest, resources: ResourceRegistry = Depends(get_resources)):
+    product = check_query(request, resources)
+    
+    async def events():
+        started = time.perf_counter()
+        answer_cache = resources.answer_cache
+        try:
+            cached_answer = answer_cache.get_exact(product, request.question)
+            if cached_answer is None:
+                generation = answer_cache.generation(product)
+                reranking = rerank_enabled(request.rerank)
+                k = candidate_count(reranking)
+                question_vector = None
+                docs = await aexact_match(resources, product, request.question, k)
+                if docs is None:
+                    question_vector = await aembed_question(resources, request.question)
+                    cached_answer = answer_cache.get_similar(product, question_vector)
+                else:
+                    answer_cache.record_miss()
+            if cached_answer is not None:
+                yield sse_event("sources", [])
+                yield sse_event("token", {"text": cached_answer})
+                yield sse_event("done", {"cached": True, "tokens": 1, "ttft_ms": round((time.perf_counter() - started) * 1000, 1),
+                                         "total_ms": round((time.perf_counter() - started) * 1000, 1)})
+                return
+            
+            if docs is None:
+                docs = await ahybrid_retrieve(resources, product, request.question, question_vector, k)
+            rerank_ms = None
+            if reranking:
+                docs, rerank_ms = await arerank(resources, request.question, docs)
+                rerank_ms = round(rerank_ms, 1)
+            with stage("context"):
+                context = build_context(docs)
+            docs = context["docs"]
+            yield sse_event("sources", source_metadata(docs))
+            if not context["text"].strip():
+                answer = "I don't know."
+                yield sse_event("token", {"text": answer})
+                tokens = 1
+                ttft = time.perf_counter() - started
+            else:
+                parts = []
+                ttft = None
+                async for text in astream_answer(resources, build_messages(context["text"], request.question, context["tokens"])):
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                    parts.append(text)
+                    yield sse_event("token", {"text": text})
+                answer = "".join(parts)
+                tokens = len(parts)
+                answer_cache.put(product, request.question, question_vector, answer, generation)
+            yield sse_event("done", {"cached": False, "tokens": tokens, "sources": len(docs), "rerank_ms": rerank_ms,
+                                     "context_tokens": context["tokens"], "tokens_saved": context["tokens_saved"],
+                                     "ttft_ms": round((ttft or 0) * 1000, 1),
+                                     "total_ms": round((time.perf_counter() - started) * 1000, 1)})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.post("/rag/query/batch")
+async def rag_query_batch(request: RAGBatchQueryRequest, resources: ResourceRegistry = Depends(get_resources)):
+    if not settings.providers_ready():
+        raise HTTPException(status_code=500, detail="Model providers not configured: set OPENAI_API_KEY or choose offline providers")
+    
+    if len(request.queries) > settings.BATCH_QUERY_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_QUERY_MAX_ITEMS} queries per batch.")
+    
+    async def lines():
+        try:
+            async for result in abatch_query(resources, request.queries):
+                yield json.dumps(result) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"Cache-Control": "no-cache"})
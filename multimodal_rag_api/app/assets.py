@@ -0,0 +1,194 @@
+import hashlib
+import os
+import shutil
+import time
+from html.parser import HTMLParser
+from .config import settings
+
+ASSET_CATEGORIES = {"Table": "table", "Image": "image"}
+CAPTION_CATEGORY = "FigureCaption"
+# Elements a caption may sit away from its figure or table.
+CAPTION_DISTANCE = 3
+CONTEXT_CHARS = 300
+
+
+def asset_collection_name(name=None):
+    return f"{name or settings.COLLECTION_NAME}-assets"
+
+def image_directory():
+    return os.path.join(settings.EXTRACTED_DOCS_DIR, "images")
+
+def store_image(path, directory=None):
+    """Move an extracted image to a path named by its content hash; returns the new path.
+
+    Identical images, from re-extraction or other documents, end up as one file.
+    """
+    directory = directory or image_directory()
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(1 << 20), b""):
+            digest.update(block)
+    digest = digest.hexdigest()
+    target = os.path.join(directory, digest[:2], digest + os.path.splitext(path)[1].lower())
+    if os.path.exists(target):
+        os.remove(path)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+    return target
+
+def store_extracted_images(elements, output_dir):
+    """Content-address every image unstructured wrote to output_dir and point the elements at the stored files."""
+    for element in elements:
+        metadata = getattr(element, "metadata", None)
+        path = getattr(metadata, "image_path", None)
+        if path and os.path.exists(path) and os.path.dirname(os.path.abspath(path)) == os.path.abspath(output_dir):
+            metadata.image_path = store_image(path)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    return elements
+
+def prune_images(referenced, directory=None, min_age=3600):
+    """Delete stored images no asset refers to, sparing files younger than min_age seconds (ingestions in flight)."""
+    directory = directory or image_directory()
+    referenced = {os.path.abspath(path) for path in referenced}
+    removed = 0
+    cutoff = time.time() - min_age
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.abspath(os.path.join(root, name))
+            if path not in referenced and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+class TableParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self.rows.append([])
+        elif tag in ("td", "th"):
+            self._cell = []
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self._cell is not None:
+            if not self.rows:
+                self.rows.append([])
+            self.rows[-1].append(" ".join("".join(self._cell).split()).replace("|", "\\|"))
+            self._cell = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+def table_markdown(html):
+    """A Markdown rendering of an HTML table; the first row is the header."""
+    parser = TableParser()
+    parser.feed(html)
+    rows = [row for row in parser.rows if row]
+    if not rows:
+        return ""
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    lines = ["| " + " | ".join(rows[0]) + " |", "|" + " --- |" * width]
+    lines += ["| " + " | ".join(row) + " |" for row in rows[1:]]
+    return "\n".join(lines)
+
+
+class AssetCollector:
+    """Collects the tables and figures of an element stream while passing it through.
+
+    Tables become Markdown (from unstructured's text_as_html when the
+    layout model inferred the structure, else their text). Figures are
+    described by their caption, the text OCR found in them and the text
+    just before them, and keep the path of their stored image. Both
+    remember their section and page.
+    """
+
+    def __init__(self):
+        self.assets = []
+        self._section = ""
+        self._context = ""
+        self._caption = None
+        self._position = 0
+
+    def watch(self, elements):
+        for element in elements:
+            self.add(element)
+            yield element
+
+    def add(self, element):
+        self._position += 1
+        category = getattr(element, "category", None) or "Text"
+        text = " ".join(str(element).split())
+        metadata = getattr(element, "metadata", None)
+        page = getattr(metadata, "page_number", None)
+        if category == "Title":
+            self._section = text
+        elif category == CAPTION_CATEGORY:
+            last = self.assets[-1] if self.assets else None
+            if last is not None and not last["caption"] and last["page"] == page and \
+                    self._position - last["position"] <= CAPTION_DISTANCE:
+                last["caption"] = text
+            else:
+                self._caption = (text, page, self._position)
+        elif category in ASSET_CATEGORIES:
+            caption = ""
+            if self._caption and self._caption[1] == page and self._position - self._caption[2] <= CAPTION_DISTANCE:
+                caption = self._caption[0]
+                self._caption = None
+            html = getattr(metadata, "text_as_html", None)
+            self.assets.append({
+                "kind": ASSET_CATEGORIES[category],
+                "caption": caption,
+                "content": (table_markdown(html) if html else "") or text,
+                "context": self._context,
+                "section": self._section,
+                "page": page,
+                "image_path": getattr(metadata, "image_path", None),
+                "position": self._position
+            })
+        elif text:
+            self._context = text if len(text) <= CONTEXT_CHARS else text[-CONTEXT_CHARS:].partition(" ")[2]
+
+    def chunks(self, text_chunks=()):
+        """Assets as chunks for a vector store, each linked to the first text chunk covering its page."""
+        chunks = []
+        for asset in self.assets:
+            if asset["kind"] == "image" and not (asset["image_path"] or asset["caption"] or asset["content"]):
+                continue
+            if asset["kind"] == "table":
+                text = f"Table: {asset['caption']}\n{asset['content']}" if asset["caption"] else f"Table:\n{asset['content']}"
+            else:
+                parts = [f"Figure: {asset['caption'] or asset['section'] or 'untitled'}"]
+                if asset["content"]:
+                    parts.append(f"Text in figure: {asset['content']}")
+                if asset["context"]:
+                    parts.append(f"Context: {asset['context']}")
+                text = "\n".join(parts)
+            metadata = {"kind": asset["kind"], "section": asset["section"], "caption": asset["caption"]}
+            if asset["page"] is not None:
+                metadata["page_start"] = metadata["page_end"] = asset["page"]
+                linked = linked_chunk(text_chunks, asset["page"], asset["section"])
+                if linked is not None:
+                    metadata["linked_chunk"] = linked
+            if asset["image_path"]:
+                metadata["image_path"] = asset["image_path"]
+            chunks.append({"text": text, "metadata": metadata})
+        return chunks
+
+
+def linked_chunk(chunks, page, section):
+    covering = [
+        index for index, chunk in enumerate(chunks)
+        if chunk["metadata"].get("page_start", page) <= page <= chunk["metadata"].get("page_end", page)
+    ]
+    for index in covering:
+        if chunks[index]["metadata"].get("section") == section:
+            return index
+    return covering[0] if covering else None
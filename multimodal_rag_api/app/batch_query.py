@@ -0,0 +1,132 @@
+import asyncio
+from .config import settings
+from .context import build_context
+from .metrics import stage
+from .query import (aexact_match, agenerate, ahybrid_retrieve_many, arerank, build_messages, candidate_count,
+                    rerank_enabled, source_metadata)
+
+
+def item_result(index, item, **fields):
+    return {"index": index, "product": item.product, "question": item.question, **fields}
+
+def item_error(index, item, error):
+    return item_result(index, item, error=str(error) if isinstance(error, Exception) else error)
+
+
+async def abatch_query(resources, items, llm_concurrency=None):
+    """Answers many (product, question) items, yielding one result per item as it finishes.
+
+    Results carry the item's index and come out of order. Answer-cache hits
+    and unknown products come first. The remaining questions are embedded in
+    one batched call, retrieved with one vector search per product, and
+    answered by the LLM at most llm_concurrency at a time
+    (BATCH_LLM_CONCURRENCY), on top of the process-wide LLM_CONCURRENCY.
+    A failing item yields {"error": ...} and the others carry on.
+    """
+    answer_cache = resources.answer_cache
+    pending = []
+    for index, item in enumerate(items):
+        if not item.product or not resources.catalog.has_product(item.product):
+            yield item_error(index, item, f"No documents found for product '{item.product}'.")
+            continue
+        cached_answer = answer_cache.get_exact(item.product, item.question)
+        if cached_answer is not None:
+            yield item_result(index, item, answer=cached_answer, cached=True)
+            continue
+        reranking = rerank_enabled(item.rerank)
+        pending.append({"index": index, "item": item, "generation": answer_cache.generation(item.product),
+                        "reranking": reranking, "k": candidate_count(reranking), "vector": None})
+    if not pending:
+        return
+
+    matches = await asyncio.gather(*(aexact_match(resources, state["item"].product, state["item"].question, state["k"])
+                                     for state in pending), return_exceptions=True)
+    ready = []
+    to_embed = []
+    for state, docs in zip(pending, matches):
+        if isinstance(docs, Exception):
+            yield item_error(state["index"], state["item"], docs)
+        elif docs is None:
+            to_embed.append(state)
+        else:
+            answer_cache.record_miss()
+            state["docs"] = docs
+            ready.append(state)
+
+    groups = {}
+    if to_embed:
+        try:
+            async with resources.embedding_slots:
+                vectors = await resources.embeddings.aembed_documents([state["item"].question for state in to_embed])
+        except Exception as e:
+            for state in to_embed:
+                yield item_error(state["index"], state["item"], e)
+            to_embed = []
+            vectors = []
+        for state, vector in zip(to_embed, vectors):
+            state["vector"] = vector
+            cached_answer = answer_cache.get_similar(state["item"].product, vector)
+            if cached_answer is not None:
+                yield item_result(state["index"], state["item"], answer=cached_answer, cached=True)
+            else:
+                groups.setdefault((state["item"].product, state["k"]), []).append(state)
+
+    results = asyncio.Queue()
+    slots = asyncio.Semaphore(llm_concurrency or settings.BATCH_LLM_CONCURRENCY)
+    tasks = set()
+
+    async def answer(state):
+        item = state["item"]
+        try:
+            docs = state["docs"]
+            rerank_ms = None
+            if state["reranking"]:
+                docs, rerank_ms = await arerank(resources, item.question, docs)
+                rerank_ms = round(rerank_ms, 1)
+            with stage("context"):
+                context = build_context(docs)
+            if not context["text"].strip():
+                await results.put(item_result(state["index"], item, answer="I don't know.", cached=False, sources=[],
+                                              rerank_ms=rerank_ms))
+                return
+            async with slots:
+                text = await agenerate(resources, build_messages(context["text"], item.question, context["tokens"]))
+            answer_cache.put(item.product, item.question, state["vector"], text, state["generation"])
+            await results.put(item_result(state["index"], item, answer=text, cached=False,
+                                          sources=source_metadata(context["docs"]), rerank_ms=rerank_ms,
+                                          context_tokens=context["tokens"], tokens_saved=context["tokens_saved"]))
+        except Exception as e:
+            await results.put(item_error(state["index"], item, e))
+
+    def start(state):
+        task = asyncio.create_task(answer(state))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    async def retrieve_group(product, k, states):
+        try:
+            found = await ahybrid_retrieve_many(resources, product, [state["item"].question for state in states],
+                                                [state["vector"] for state in states], k)
+        except Exception as e:
+            for state in states:
+                await results.put(item_error(state["index"], state["item"], e))
+            return
+        for state, docs in zip(states, found):
+            state["docs"] = docs
+            start(state)
+
+    for state in ready:
+        start(state)
+    for (product, k), states in groups.items():
+        task = asyncio.create_task(retrieve_group(product, k, states))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    remaining = len(ready) + sum(len(states) for states in groups.values())
+    try:
+        for _ in range(remaining):
+            yield await results.get()
+    finally:
+        # The client went away or the batch is done: stop whatever is still running.
+        for task in list(tasks):
+            task.cancel()
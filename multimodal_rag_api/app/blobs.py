@@ -0,0 +1,187 @@
+"""Content-addressed storage of uploaded files.
+
+Every distinct file is stored once, as DATA_DIR/.blobs/<aa>/<sha256>, and
+each product holding it gets a hard link named after the document in
+DATA_DIR/<product>/, so the same bytes uploaded under several names or
+products take the space of one copy. Blobs no document links to any more
+are removed by `python -m app.cli prune-blobs`.
+"""
+import hashlib
+import os
+import shutil
+import time
+import uuid
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+from .config import settings
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def safe_product_name(product: str):
+    safe_product = "".join(c for c in product if c.isalnum() or c in (' ', '-', '_')).strip()
+    return safe_product.replace(' ', '_')
+
+def safe_filename(filename: str):
+    return "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_', '.')).strip()
+
+def product_dir(product: str):
+    return os.path.join(os.path.abspath(settings.DATA_DIR), safe_product_name(product))
+
+def blob_directory():
+    # Product directory names never start with a dot (see safe_product_name).
+    return os.path.join(settings.DATA_DIR, ".blobs")
+
+
+class BlobWriter:
+    """Writes one upload into a partial file while hashing it, then files it under its hash."""
+
+    def __init__(self, store, max_bytes):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._digest = hashlib.sha256()
+        os.makedirs(store.partial_directory, exist_ok=True)
+        self.partial = os.path.join(store.partial_directory, f"{uuid.uuid4().hex}.part")
+        self._file = open(self.partial, "wb")
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the limit of {self.max_bytes} bytes.")
+        self._digest.update(data)
+        self._file.write(data)
+
+    def commit(self):
+        """Stores the blob, or drops the partial file if the same bytes are stored already; returns the hash."""
+        self._file.close()
+        digest = self._digest.hexdigest()
+        path = self.store.path(digest)
+        if os.path.exists(path):
+            os.remove(self.partial)
+            # A fresh mtime keeps prune() off a blob that is about to be linked again.
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self.partial, path)
+        return digest
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self.partial):
+            os.remove(self.partial)
+
+
+class BlobStore:
+    def __init__(self, root=None):
+        self.root = root or blob_directory()
+        self.partial_directory = os.path.join(self.root, "partial")
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def writer(self, max_bytes):
+        return BlobWriter(self, max_bytes)
+
+    def store(self, source, max_bytes):
+        """Copies a binary file object into the store; returns its hash."""
+        writer = self.writer(max_bytes)
+        try:
+            for block in iter(lambda: source.read(1 << 20), b""):
+                writer.write(block)
+            return writer.commit()
+        except BaseException:
+            writer.discard()
+            raise
+
+    def link(self, digest, dest):
+        """Makes `dest` the blob's content: a hard link, or a copy where the filesystem has none."""
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        partial = f"{dest}.{uuid.uuid4().hex}.part"
+        try:
+            os.link(self.path(digest), partial)
+        except OSError:
+            shutil.copyfile(self.path(digest), partial)
+        os.replace(partial, dest)
+        return dest
+
+    def prune(self, min_age=3600):
+        """Deletes blobs no document links to and abandoned partial uploads, sparing those younger than min_age seconds."""
+        removed = 0
+        cutoff = time.time() - min_age
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime < cutoff and (directory == self.partial_directory or stat.st_nlink == 1):
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        return removed
+
+
+class FilePart:
+    """Parser callbacks passing the data of one file field to a writer as it arrives."""
+
+    def __init__(self, field, writer):
+        self.field = field
+        self.writer = writer
+        self.filename = None
+        self._header = b""
+        self._value = b""
+        self._disposition = b""
+        self._target = False
+
+    def on_part_begin(self):
+        self._disposition = b""
+        self._target = False
+
+    def on_header_field(self, data, start, end):
+        self._header += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._value += data[start:end]
+
+    def on_header_end(self):
+        if self._header.lower() == b"content-disposition":
+            self._disposition = self._value
+        self._header = self._value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        self._target = (self.filename is None and b"filename" in options
+                        and options.get(b"name", b"").decode("utf-8", "replace") == self.field)
+        if self._target:
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+
+    def on_part_data(self, data, start, end):
+        if self._target:
+            self.writer.write(data[start:end])
+
+    def callbacks(self):
+        return {name: getattr(self, name) for name in ("on_part_begin", "on_header_field", "on_header_value",
+                                                      "on_header_end", "on_headers_finished", "on_part_data")}
+
+
+async def receive_file(request, writer, field="file"):
+    """Streams the `field` file of a multipart/form-data request into `writer`.
+
+    Returns the file's name, or None if the request has no such file.
+    Malformed bodies raise ValueError, and UploadTooLarge is raised as
+    soon as the file outgrows the writer's limit.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise ValueError("Expected a multipart/form-data request.")
+    part = FilePart(field, writer)
+    parser = MultipartParser(params[b"boundary"], part.callbacks())
+    async for data in request.stream():
+        if data:
+            # Parsing calls the writer, so the disk writes stay off the event loop.
+            await run_in_threadpool(parser.write, data)
+    parser.finalize()
+    return part.filename
@@ -0,0 +1,256 @@
+"""Bulk ingestion of a directory tree or ZIP archive of PDFs.
+
+Each top-level folder is a product and every PDF below it one of its
+documents, named by its path inside the folder with "/" turned into "_".
+PDFs outside any folder go to the import's default product, and are
+skipped without one. A ZIP whose PDFs all sit in one enclosing folder
+(as `zip -r products.zip products/` makes) is read from inside it.
+
+Files are stored like uploads (see app.blobs) and each gets an ingestion
+job, the import's checkpoint for that file. As many files as the queue
+has partitioning processes are in flight at once, their page windows
+spread over its process pool. Files done partitioning are embedded and
+written together, about IMPORT_BATCH_CHUNKS chunks at a time (see
+sync_documents). Running an import again resumes it: files whose job
+completed are not read again, and the rest are ingested or skipped as
+uploads are.
+"""
+import json
+import os
+import threading
+import time
+import zipfile
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ThreadPoolExecutor, wait
+from .blobs import BlobStore, product_dir, safe_filename
+from .config import settings
+from .partitioning import iter_partitioned_elements
+from .rag_pipeline import chunk_document, embed_missing, plan_vectors, sync_documents
+
+DONE_STATUSES = ("completed", "unchanged")
+
+
+def import_directory():
+    """Where ZIP files uploaded to /admin/imports are kept until their import completes."""
+    return os.path.join(settings.DATA_DIR, ".imports")
+
+def is_pdf(parts):
+    return parts[-1].lower().endswith(".pdf") and not any(part.startswith(".") or part == "__MACOSX" for part in parts)
+
+@contextmanager
+def source_files(source, product=None):
+    """(product, document, open) of every PDF to import from a directory or ZIP file, in path order.
+
+    A ZIP file stays open, for the openers, until the block exits.
+    """
+    archive = None
+    if os.path.isdir(source):
+        paths = sorted(os.path.join(root, name) for root, _, names in os.walk(source) for name in names)
+        found = [(os.path.relpath(path, source).split(os.sep), lambda path=path: open(path, "rb")) for path in paths]
+    else:
+        archive = zipfile.ZipFile(source)
+        found = [(info.filename.split("/"), lambda info=info: archive.open(info))
+                 for info in sorted(archive.infolist(), key=lambda info: info.filename) if not info.is_dir()]
+    try:
+        found = [(parts, opener) for parts, opener in found if is_pdf(parts)]
+        if archive is not None and found and all(len(parts) > 2 and parts[0] == found[0][0][0] for parts, _ in found):
+            found = [(parts[1:], opener) for parts, opener in found]
+        entries = {}
+        for parts, opener in found:
+            key = (parts[0], "_".join(parts[1:])) if len(parts) > 1 else (product, parts[0])
+            if key[0] is None:
+                continue
+            if key in entries:
+                print(f"WARNING: Skipping {'/'.join(parts)}: another file is imported as {key[0]}/{key[1]}.")
+                continue
+            entries[key] = opener
+        yield [(*key, opener) for key, opener in entries.items()]
+    finally:
+        if archive is not None:
+            archive.close()
+
+
+class BulkImport:
+    """One run of an import, on an IngestionQueue's process pool and write lock.
+
+    on_progress(progress) is called at most every progress_interval
+    seconds, and once at the end.
+    """
+
+    def __init__(self, queue, import_id, on_progress=None, batch_chunks=None, progress_interval=1.0):
+        self.queue = queue
+        self.store = queue.store
+        self.resources = queue.resources
+        self.record = self.store.get_import(import_id)
+        self.on_progress = on_progress
+        self.batch_chunks = batch_chunks or settings.IMPORT_BATCH_CHUNKS
+        self.progress_interval = progress_interval
+        self.blobs = BlobStore()
+        self.stopping = False
+        self._read_lock = threading.Lock()
+        self._progress_lock = threading.Lock()
+        self._reported = 0.0
+        self.files_total = self.files_done = self.files_failed = self.chunks_stored = 0
+        self._started = time.perf_counter()
+        self._files_at_start = self._chunks_at_start = 0
+
+    def _stopped(self):
+        return self.stopping or self.queue.closing
+
+    def progress(self):
+        with self._progress_lock:
+            elapsed = time.perf_counter() - self._started
+            files = self.files_done + self.files_failed - self._files_at_start
+            chunks = self.chunks_stored - self._chunks_at_start
+            remaining = self.files_total - self.files_done - self.files_failed
+            return {
+                "id": self.record["id"], "files_total": self.files_total, "files_done": self.files_done,
+                "files_failed": self.files_failed, "chunks_stored": self.chunks_stored, "elapsed_s": round(elapsed, 1),
+                "docs_per_s": round(files / elapsed, 2) if elapsed else None,
+                "chunks_per_s": round(chunks / elapsed, 1) if elapsed else None,
+                "eta_s": round(remaining * elapsed / files) if files else None
+            }
+
+    def _report(self, force=False):
+        now = time.perf_counter()
+        if not force and now - self._reported < self.progress_interval:
+            return
+        self._reported = now
+        progress = self.progress()
+        self.store.update_import(self.record["id"], **{key: progress[key] for key in (
+            "files_total", "files_done", "files_failed", "chunks_stored", "docs_per_s", "chunks_per_s")})
+        if self.on_progress is not None:
+            self.on_progress(progress)
+
+    def _finished(self, files=1, chunks=0, failed=0):
+        with self._progress_lock:
+            self.files_done += files
+            self.chunks_stored += chunks
+            self.files_failed += failed
+
+    def _fail(self, job_id, error):
+        # Interrupted by shutdown: leave the file to the next run.
+        if not self._stopped():
+            self.store.update(job_id, status="failed", error=str(error))
+            self._finished(files=0, failed=1)
+
+    def _prepare(self, entry, job):
+        """Stores and partitions one file; returns it ready for sync_documents, or None if it needs no write."""
+        product, document, opener = entry
+        if self._stopped():
+            return None
+        path = os.path.join(product_dir(product), safe_filename(document))
+        if job is None:
+            job = self.store.create(product, document, path, import_id=self.record["id"])
+        job_id = job["id"]
+        try:
+            # Members of one ZIP file are read one at a time.
+            with self._read_lock, opener() as source:
+                digest = self.blobs.store(source, settings.UPLOAD_MAX_MB * 1024 * 1024)
+            self.blobs.link(digest, path)
+            self.store.update(job_id, status="queued", path=path, file_hash=digest, error=None)
+            if digest == self.resources.catalog.version(product, document)[0]:
+                self.store.update(job_id, status="unchanged")
+                self._finished()
+                return None
+            if self.queue.copy_existing(job_id, digest, product, document):
+                self._finished(chunks=self.store.get(job_id)["chunks_stored"])
+                return None
+
+            self.store.update(job_id, status="partitioning")
+            elements = iter_partitioned_elements(
+                path, self.queue.partitioners,
+                on_pages=lambda pages: self.store.update(job_id, pages_parsed=pages),
+                on_plan=lambda strategies: self.store.update(job_id, page_strategies=json.dumps(strategies))
+            )
+            chunks, assets = chunk_document(elements, self.resources.asset_store is not None)
+            self.store.update(job_id, status="embedding", chunks_total=len(chunks))
+            return {"job_id": job_id, "product": product, "document": document, "chunks": chunks, "assets": assets,
+                    "file_hash": digest}
+        except (CancelledError, Exception) as e:
+            self._fail(job_id, e)
+            return None
+
+    def _write(self, batch):
+        resources = self.resources
+        asset_store = resources.asset_store
+        try:
+            # Embedding happens before taking the write lock; sync_documents then finds every vector.
+            plans = [plan_vectors(d["chunks"], d["product"], d["document"], resources.vectorstores) for d in batch]
+            if asset_store is not None:
+                plans += [plan_vectors(d["assets"], d["product"], d["document"], asset_store)
+                          for d in batch if d["assets"] is not None]
+            vectors = embed_missing(plans, resources.embeddings)
+            with self.queue.write_lock:
+                results = sync_documents(batch, resources.vectorstores, resources.catalog, resources.embeddings, vectors,
+                                         resources.keyword_index, asset_store)
+        except Exception as e:
+            for d in batch:
+                self._fail(d["job_id"], e)
+            return
+        for d, result in zip(batch, results):
+            self.store.update(d["job_id"], status="completed", chunks_stored=len(d["chunks"]),
+                              chunks_reused=result["reused"], chunks_embedded=len(d["chunks"]),
+                              chunks_deleted=result["deleted"], assets_stored=len(d["assets"] or ()))
+            self._finished(chunks=len(d["chunks"]))
+
+    def run(self):
+        """Imports every file not done yet; returns the import record."""
+        import_id = self.record["id"]
+        with ExitStack() as stack:
+            try:
+                entries = stack.enter_context(source_files(self.record["source"], self.record["product"]))
+            except (OSError, zipfile.BadZipFile) as e:
+                self.store.update_import(import_id, status="failed", error=str(e))
+                return self.store.get_import(import_id)
+            self._run(entries)
+        if not self._stopped():
+            self.store.update_import(import_id, status="failed" if self.files_failed else "completed")
+        return self.store.get_import(import_id)
+
+    def _run(self, entries):
+        import_id = self.record["id"]
+        jobs = self.store.import_jobs(import_id)
+        done = {key: job for key, job in jobs.items() if job["status"] in DONE_STATUSES}
+        todo = [entry for entry in entries if entry[:2] not in done]
+        self.files_total = len(entries)
+        self.files_done = self._files_at_start = len(entries) - len(todo)
+        self.chunks_stored = self._chunks_at_start = sum(job["chunks_stored"] for job in done.values())
+        self._started = time.perf_counter()
+        self.store.update_import(import_id, status="running", error=None)
+        self._report(force=True)
+
+        workers = getattr(self.queue.partitioners, "_max_workers", 1)
+        batch = []
+        batch_chunks = 0
+        remaining = iter(todo)
+        pending = set()
+        try:
+            with ThreadPoolExecutor(workers, thread_name_prefix="import") as pool:
+                try:
+                    while True:
+                        while len(pending) < 2 * workers and not self._stopped():
+                            entry = next(remaining, None)
+                            if entry is None:
+                                break
+                            pending.add(pool.submit(self._prepare, entry, jobs.get(entry[:2])))
+                        if not pending:
+                            break
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            prepared = future.result()
+                            if prepared is not None:
+                                batch.append(prepared)
+                                batch_chunks += len(prepared["chunks"]) + len(prepared["assets"] or ())
+                        if batch and (batch_chunks >= self.batch_chunks or not pending):
+                            self._write(batch)
+                            batch, batch_chunks = [], 0
+                        self._report()
+                except BaseException:
+                    self.stopping = True
+                    raise
+        finally:
+            self._report(force=True)
+            if self._stopped():
+                # Running the import again picks up where this run stopped.
+                self.store.update_import(import_id, status="interrupted")
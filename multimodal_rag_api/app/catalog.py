@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from .vector_routing import stored_batches
+
+CATALOG_FILENAME = "catalog.sqlite3"
+
+
+def catalog_path(persist_directory):
+    return os.path.join(persist_directory, CATALOG_FILENAME)
+
+
+class ProductCatalog:
+    """Product -> document -> chunk-count index kept beside the vector store.
+
+    Reads are served from an in-memory dict; every write goes through to a
+    small SQLite table so the index survives restarts. Documents stored by
+    set_document also carry the hash of the file they came from and a
+    version that is bumped whenever that file changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "product TEXT NOT NULL, document TEXT NOT NULL, chunks INTEGER NOT NULL, "
+            "PRIMARY KEY (product, document))"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(documents)")}
+        if "file_hash" not in columns:
+            self._conn.execute("ALTER TABLE documents ADD COLUMN file_hash TEXT")
+        if "version" not in columns:
+            self._conn.execute("ALTER TABLE documents ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        self._conn.commit()
+        self._listeners = []
+        self._products = {}
+        self._versions = {}
+        rows = self._conn.execute("SELECT product, document, chunks, file_hash, version FROM documents ORDER BY rowid")
+        for product, document, chunks, file_hash, version in rows:
+            self._products.setdefault(product, {})[document] = chunks
+            self._versions[(product, document)] = (file_hash, version)
+        self._refresh_listing()
+
+    @classmethod
+    def for_directory(cls, persist_directory):
+        return cls(catalog_path(persist_directory))
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def _notify(self, products):
+        for product in products:
+            for listener in self._listeners:
+                listener(product)
+
+    def is_empty(self):
+        return not self._products
+
+    def has_product(self, product):
+        return product in self._products
+
+    def product_names(self):
+        return sorted(self._products)
+
+    def chunk_count(self, product, document=None):
+        documents = self._products.get(product, {})
+        return sum(documents.values()) if document is None else documents.get(document, 0)
+
+    def version(self, product, document):
+        """Return (file_hash, version) of a stored document, or (None, 0)."""
+        return self._versions.get((product, document), (None, 0))
+
+    def find_file(self, file_hash, exclude=None):
+        """A stored (product, document) ingested from a file with this hash, other than `exclude`, or None."""
+        if file_hash is None:
+            return None
+        return next((key for key, (stored_hash, _) in list(self._versions.items())
+                     if stored_hash == file_hash and key != exclude), None)
+
+    def snapshot(self):
+        return self._snapshot
+
+    def _refresh_listing(self):
+        listing = {product: list(documents) for product, documents in self._products.items()}
+        digest = hashlib.sha1(json.dumps(listing, sort_keys=True).encode("utf-8")).hexdigest()
+        self._snapshot = (listing, f'"{digest}"')
+
+    def set_document(self, product, document, chunks, file_hash=None):
+        return self.set_documents([(product, document, chunks, file_hash)])[0]
+
+    def set_documents(self, documents):
+        """Stores (product, document, chunks, file_hash) entries in one transaction; returns their versions."""
+        versions = []
+        with self._lock:
+            rows = []
+            for product, document, chunks, file_hash in documents:
+                previous_hash, version = self._versions.get((product, document), (None, 0))
+                if file_hash is None or file_hash != previous_hash:
+                    version += 1
+                rows.append((product, document, chunks, file_hash, version))
+                self._products.setdefault(product, {})[document] = chunks
+                self._versions[(product, document)] = (file_hash, version)
+                versions.append(version)
+            self._conn.executemany(
+                "INSERT INTO documents (product, document, chunks, file_hash, version) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (product, document) DO UPDATE SET "
+                "chunks = excluded.chunks, file_hash = excluded.file_hash, version = excluded.version",
+                rows
+            )
+            self._conn.commit()
+            self._refresh_listing()
+        self._notify(dict.fromkeys(product for product, _, _, _ in documents))
+        return versions
+
+    def remove_document(self, product, document):
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE product = ? AND document = ?", (product, document))
+            self._conn.commit()
+            documents = self._products.get(product, {})
+            removed = documents.pop(document, None) is not None
+            if not documents:
+                self._products.pop(product, None)
+            self._versions.pop((product, document), None)
+            self._refresh_listing()
+        self._notify([product])
+        return removed
+
+    def remove_product(self, product):
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE product = ?", (product,))
+            self._conn.commit()
+            documents = self._products.pop(product, {})
+            for document in documents:
+                self._versions.pop((product, document), None)
+            self._refresh_listing()
+        self._notify([product])
+        return len(documents)
+
+    def rebuild_from_vectorstore(self, vectorstore, batch_size=1000):
+        counts = {}
+        for batch in stored_batches(vectorstore, ["metadatas"], batch_size):
+            for metadata in batch.get("metadatas") or []:
+                if metadata and "product" in metadata and "document" in metadata:
+                    key = (metadata["product"], metadata["document"])
+                    counts[key] = counts.get(key, 0) + 1
+
+        products = {}
+        for (product, document), chunks in counts.items():
+            products.setdefault(product, {})[document] = chunks
+        with self._lock:
+            # Keep the file hashes of documents that are still stored, so unchanged uploads stay skipped.
+            versions = {key: self._versions.get(key, (None, 1)) for key in counts}
+            self._conn.execute("DELETE FROM documents")
+            self._conn.executemany(
+                "INSERT INTO documents (product, document, chunks, file_hash, version) VALUES (?, ?, ?, ?, ?)",
+                [(product, document, chunks, *versions[(product, document)])
+                 for (product, document), chunks in counts.items()]
+            )
+            self._conn.commit()
+            changed = set(self._products) | set(products)
+            self._products = products
+            self._versions = versions
+            self._refresh_listing()
+        self._notify(changed)
+        return len(counts)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,133 @@
+import re
+from functools import lru_cache
+from .config import settings
+
+SKIPPED_CATEGORIES = {"Header", "Footer", "PageNumber", "PageBreak"}
+SECTION_CATEGORIES = {"Title"}
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+WORD_PIECE = re.compile(r"\s*\w+|\s*[^\w\s]")
+
+
+class RegexTokenizer:
+    """Word-piece stand-in for a BPE encoding when tiktoken's files are unavailable."""
+
+    def encode(self, text):
+        return WORD_PIECE.findall(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(name=None):
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name or settings.CHUNK_TOKENIZER)
+    except Exception:
+        # The encoding is downloaded on first use, which fails on offline hosts.
+        return RegexTokenizer()
+
+
+class Chunker:
+    """Packs partitioned elements into chunks of at most max_tokens tokens.
+
+    A Title starts a new chunk and names the section of the chunks that
+    follow it. Within a section, consecutive chunks share their trailing
+    elements up to overlap_tokens. Elements longer than a chunk are split
+    at sentence ends, and sentences longer than a chunk at token bounds.
+    """
+
+    def __init__(self, max_tokens=None, overlap_tokens=None, tokenizer=None):
+        self.max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS
+        self.overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+        self.tokenizer = tokenizer or get_tokenizer()
+
+    def pieces(self, text):
+        tokens = self.tokenizer.encode(text)
+        if len(tokens) <= self.max_tokens:
+            yield text, len(tokens)
+            return
+        for sentence in SENTENCE_END.split(text):
+            tokens = self.tokenizer.encode(sentence)
+            if len(tokens) <= self.max_tokens:
+                yield sentence, len(tokens)
+                continue
+            for start in range(0, len(tokens), self.max_tokens):
+                window = tokens[start:start + self.max_tokens]
+                yield self.tokenizer.decode(window).strip(), len(window)
+
+    def overlap(self, pieces):
+        carried = []
+        size = 0
+        for piece in reversed(pieces):
+            if piece[3] in SECTION_CATEGORIES or size + piece[1] > self.overlap_tokens:
+                break
+            carried.append(piece)
+            size += piece[1]
+        carried.reverse()
+        return carried
+
+    def chunk(self, elements):
+        section = ""
+        pieces = []
+        size = 0
+        fresh = False
+
+        for element in elements:
+            category = getattr(element, "category", None) or "Text"
+            if category in SKIPPED_CATEGORIES:
+                continue
+            text = " ".join(str(element).split())
+            if not text:
+                continue
+            page = getattr(getattr(element, "metadata", None), "page_number", None)
+
+            if category in SECTION_CATEGORIES:
+                if fresh:
+                    yield self.build(pieces, section)
+                    pieces, size, fresh = [], 0, False
+                elif pieces and pieces[-1][3] not in SECTION_CATEGORIES:
+                    # Only overlap is pending; it belongs to the previous section.
+                    pieces, size = [], 0
+                section = text
+                for piece, tokens in self.pieces(text):
+                    if pieces and size + tokens > self.max_tokens:
+                        yield self.build(pieces, section)
+                        pieces, size = [], 0
+                    pieces.append((piece, tokens, page, category))
+                    size += tokens
+                continue
+
+            for piece, tokens in self.pieces(text):
+                if fresh and size + tokens > self.max_tokens:
+                    yield self.build(pieces, section)
+                    pieces = self.overlap(pieces)
+                    size = sum(carried[1] for carried in pieces)
+                    fresh = False
+                if size + tokens > self.max_tokens:
+                    # The overlap does not fit beside the piece and is dropped; a title gets a chunk of its own.
+                    if pieces and pieces[0][3] in SECTION_CATEGORIES:
+                        yield self.build(pieces, section)
+                    pieces, size = [], 0
+                pieces.append((piece, tokens, page, category))
+                size += tokens
+                fresh = True
+
+        if fresh or any(piece[3] in SECTION_CATEGORIES for piece in pieces):
+            yield self.build(pieces, section)
+
+    def build(self, pieces, section):
+        metadata = {
+            "section": section,
+            "element_types": ",".join(dict.fromkeys(piece[3] for piece in pieces)),
+            "tokens": sum(piece[1] for piece in pieces)
+        }
+        pages = [piece[2] for piece in pieces if piece[2] is not None]
+        if pages:
+            metadata["page_start"] = min(pages)
+            metadata["page_end"] = max(pages)
+        return {"text": " ".join(piece[0] for piece in pieces), "metadata": metadata}
+
+
+def chunk_elements(elements, max_tokens=None, overlap_tokens=None):
+    return list(Chunker(max_tokens, overlap_tokens).chunk(elements))
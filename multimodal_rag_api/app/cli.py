@@ -0,0 +1,225 @@
+"""Maintenance commands. Run from multimodal_rag_api/:
+
+    python -m app.cli rebuild-catalog
+    python -m app.cli rebuild-keyword-index
+    python -m app.cli migrate-collections --to product
+    python -m app.cli migrate-backend --to numpy
+    python -m app.cli re-embed
+    python -m app.cli prune-assets
+    python -m app.cli prune-blobs
+    python -m app.cli ingest manuals/ --workers 4
+
+Commands that move or re-embed vectors also handle the collection of
+extracted tables and figures (<collection>-assets). `ingest` writes to
+chroma_db itself, so do not run it while the API is ingesting; upload a
+ZIP file to POST /admin/imports instead.
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+import zipfile
+from .config import settings
+from .assets import asset_collection_name, prune_images
+from .blobs import BlobStore
+from .catalog import ProductCatalog
+from .keyword_index import KeywordIndex
+from .vector_routing import (SHARDING_MODES, VECTOR_BACKENDS, copy_vectors, migrate_collections, open_vector_store,
+                             reembed_vectors, stored_batches)
+
+
+def collection_names(args):
+    return [args.collection, asset_collection_name(args.collection)]
+
+
+def rebuild_catalog(args):
+    if not os.path.exists(args.persist_directory):
+        print(f"No vector store found at {args.persist_directory}")
+        return 1
+    vectorstores = open_vector_store(args.persist_directory, name=args.collection)
+    catalog = ProductCatalog.for_directory(args.persist_directory)
+    try:
+        documents = catalog.rebuild_from_vectorstore(vectorstores)
+        print(f"Catalog rebuilt: {len(catalog.product_names())} products, {documents} documents")
+    finally:
+        catalog.close()
+    return 0
+
+
+def rebuild_keyword_index(args):
+    if not os.path.exists(args.persist_directory):
+        print(f"No vector store found at {args.persist_directory}")
+        return 1
+    vectorstores = open_vector_store(args.persist_directory, name=args.collection)
+    keyword_index = KeywordIndex.for_directory(args.persist_directory)
+    try:
+        chunks = keyword_index.rebuild_from_vectorstore(vectorstores)
+        print(f"Keyword index rebuilt: {chunks} chunks")
+    finally:
+        keyword_index.close()
+    return 0
+
+
+def migrate(args):
+    if not os.path.exists(args.persist_directory):
+        print(f"No vector store found at {args.persist_directory}")
+        return 1
+    chunks = sum(migrate_collections(args.persist_directory, args.to, name=name) for name in collection_names(args))
+    print(f"Moved {chunks} chunks to the '{args.to}' layout. Set COLLECTION_SHARDING={args.to} before starting the API.")
+    return 0
+
+
+def migrate_backend(args):
+    if not os.path.exists(args.persist_directory):
+        print(f"No vector store found at {args.persist_directory}")
+        return 1
+    source_backend = next(backend for backend in VECTOR_BACKENDS if backend != args.to)
+    chunks = 0
+    for name in collection_names(args):
+        source = open_vector_store(args.persist_directory, backend=source_backend, name=name)
+        target = open_vector_store(args.persist_directory, backend=args.to, name=name)
+        try:
+            chunks += copy_vectors(source, target)
+        finally:
+            source.close()
+            target.close()
+    print(f"Copied {chunks} chunks from {source_backend} to {args.to}. Set VECTOR_BACKEND={args.to} before starting the API; "
+          f"the {source_backend} data is left in place.")
+    return 0
+
+
+def reembed(args):
+    if not os.path.exists(args.persist_directory):
+        print(f"No vector store found at {args.persist_directory}")
+        return 1
+    # The registry gives the configured, batched and cached embeddings.
+    from .resources import ResourceRegistry
+    resources = ResourceRegistry(args.persist_directory)
+    staging_directory = os.path.join(args.persist_directory, "reembed-staging")
+    try:
+        model = resources.embeddings.model
+        source = open_vector_store(args.persist_directory, name=args.collection, embedding_model=model)
+        recorded = source.embedding_models()
+        source.close()
+        if recorded == {model} and not os.path.exists(staging_directory) and not args.force:
+            print(f"Stored vectors are already embedded with {model}; pass --force to embed them again.")
+            return 0
+        chunks = 0
+        for name in collection_names(args):
+            source = open_vector_store(args.persist_directory, name=name, embedding_model=model)
+            staging = open_vector_store(staging_directory, name=name, embedding_model=model)
+            try:
+                if source.count() or staging.count():
+                    chunks += reembed_vectors(source, staging, resources.embeddings, args.batch_size)
+            finally:
+                source.close()
+                staging.close()
+    finally:
+        resources.close()
+    shutil.rmtree(staging_directory, ignore_errors=True)
+    print(f"Re-embedded {chunks} chunks with {model} (previously {', '.join(sorted(recorded)) or 'unrecorded'}).")
+    return 0
+
+
+def prune_assets(args):
+    asset_store = open_vector_store(args.persist_directory, name=asset_collection_name(args.collection))
+    try:
+        referenced = {
+            metadata["image_path"] for batch in stored_batches(asset_store, ["metadatas"])
+            for metadata in batch["metadatas"] if metadata and metadata.get("image_path")
+        }
+    finally:
+        asset_store.close()
+    removed = prune_images(referenced, min_age=args.min_age)
+    print(f"Removed {removed} extracted images no table or figure refers to; {len(referenced)} in use.")
+    return 0
+
+
+def prune_blobs(args):
+    removed = BlobStore().prune(min_age=args.min_age)
+    print(f"Removed {removed} uploaded files no product links to any more.")
+    return 0
+
+
+def format_progress(progress):
+    eta = progress["eta_s"]
+    return (f"{progress['files_done']}/{progress['files_total']} files, {progress['files_failed']} failed, "
+            f"{progress['chunks_stored']} chunks  {progress['docs_per_s'] or 0:.1f} docs/s  "
+            f"{progress['chunks_per_s'] or 0:.0f} chunks/s  ETA {time.strftime('%H:%M:%S', time.gmtime(eta)) if eta is not None else '-'}")
+
+
+def ingest(args):
+    if not os.path.isdir(args.source) and not zipfile.is_zipfile(args.source):
+        print(f"{args.source} is neither a directory nor a ZIP file")
+        return 1
+    if not settings.providers_ready():
+        print("Model providers not configured: set OPENAI_API_KEY or choose offline providers. Cannot process documents.")
+        return 1
+    if args.workers:
+        settings.INGEST_WORKERS = args.workers
+    from .resources import ResourceRegistry
+    resources = ResourceRegistry(args.persist_directory)
+    try:
+        queue = resources.jobs
+        record = queue.start_import(args.source, args.product, restart=args.restart)
+        if record["files_done"]:
+            print(f"Resuming import {record['id']}: {record['files_done']}/{record['files_total']} files done.")
+        try:
+            record = queue.run_import(record["id"], on_progress=lambda progress: print(
+                "\r" + format_progress(progress), end="", flush=True), batch_chunks=args.batch_chunks)
+        except KeyboardInterrupt:
+            print(f"\nInterrupted; run the same command again to resume import {record['id']}.")
+            return 130
+        print()
+        if record["files_failed"]:
+            # Files that failed in an earlier run and completed since are not listed.
+            failed = [job for job in queue.store.import_jobs(record["id"]).values() if job["status"] == "failed"]
+            for job in failed[:20]:
+                print(f"Failed: {job['product']}/{job['document']}: {job['error']}")
+    finally:
+        resources.close()
+    print(f"Import {record['id']} {record['status']}: {record['files_done']}/{record['files_total']} files, "
+          f"{record['files_failed']} failed, {record['chunks_stored']} chunks.")
+    return 0 if record["status"] == "completed" else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    parser.add_argument("--persist-directory", default=settings.CHROMA_DIR)
+    parser.add_argument("--collection", default=settings.COLLECTION_NAME)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("rebuild-catalog", help="Backfill the product catalog from an existing chroma_db").set_defaults(func=rebuild_catalog)
+    commands.add_parser("rebuild-keyword-index", help="Rebuild the BM25 keyword index from an existing chroma_db").set_defaults(func=rebuild_keyword_index)
+    migrate_parser = commands.add_parser("migrate-collections", help="Move stored chunks between one global collection and per-product collections")
+    migrate_parser.add_argument("--to", choices=SHARDING_MODES, required=True)
+    migrate_parser.set_defaults(func=migrate)
+    backend_parser = commands.add_parser("migrate-backend", help="Copy stored chunks and their embeddings to another vector backend")
+    backend_parser.add_argument("--to", choices=VECTOR_BACKENDS, required=True)
+    backend_parser.set_defaults(func=migrate_backend)
+    reembed_parser = commands.add_parser("re-embed", help="Embed every stored chunk again with the configured EMBEDDING_PROVIDER")
+    reembed_parser.add_argument("--batch-size", type=int, default=1000)
+    reembed_parser.add_argument("--force", action="store_true", help="re-embed even if the stored vectors already use the configured model")
+    reembed_parser.set_defaults(func=reembed)
+    prune_parser = commands.add_parser("prune-assets", help="Delete stored images of figures that are no longer indexed")
+    prune_parser.add_argument("--min-age", type=int, default=3600, help="spare images younger than this many seconds")
+    prune_parser.set_defaults(func=prune_assets)
+    blobs_parser = commands.add_parser("prune-blobs", help="Delete stored uploads whose documents were all deleted")
+    blobs_parser.add_argument("--min-age", type=int, default=3600, help="spare files younger than this many seconds")
+    blobs_parser.set_defaults(func=prune_blobs)
+    ingest_parser = commands.add_parser("ingest", help="Ingest a directory or ZIP file of PDFs, one folder per product; resumes an interrupted run")
+    ingest_parser.add_argument("source")
+    ingest_parser.add_argument("--product", help="product of PDFs that are not in a folder")
+    ingest_parser.add_argument("--workers", type=int, help="processes partitioning PDFs (default INGEST_WORKERS)")
+    ingest_parser.add_argument("--batch-chunks", type=int, default=settings.IMPORT_BATCH_CHUNKS,
+                               help="chunks embedded and written per batch")
+    ingest_parser.add_argument("--restart", action="store_true", help="start a new import instead of resuming the last one")
+    ingest_parser.set_defaults(func=ingest)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
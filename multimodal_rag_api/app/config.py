@@ -6,9 +6,94 @@ load_dotenv()
 class Settings:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     EXTRACTED_DOCS_DIR = os.getenv("EXTRACTED_DOCS_DIR", "./note-books/extracted_docs")
+    CHROMA_DIR = os.getenv("CHROMA_DIR", "./chroma_db")
+    DATA_DIR = os.getenv("DATA_DIR", "./data")
+    UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB", "200"))
+    IMPORT_MAX_MB = int(os.getenv("IMPORT_MAX_MB", "10240"))
+    IMPORT_BATCH_CHUNKS = int(os.getenv("IMPORT_BATCH_CHUNKS", "1000"))
+    COLLECTION_NAME = os.getenv("COLLECTION_NAME", "mm_rag")
+    COLLECTION_SHARDING = os.getenv("COLLECTION_SHARDING", "global")
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+    VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "float32")
+    VECTOR_IVF_LISTS = int(os.getenv("VECTOR_IVF_LISTS", "0"))
+    VECTOR_IVF_PROBES = int(os.getenv("VECTOR_IVF_PROBES", "8"))
+    VECTOR_IVF_MIN_ROWS = int(os.getenv("VECTOR_IVF_MIN_ROWS", "20000"))
+    LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+    LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+    HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+    HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+    JOBS_DB = os.getenv("JOBS_DB", "./jobs.sqlite3")
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+    PARTITION_WINDOW_PAGES = int(os.getenv("PARTITION_WINDOW_PAGES", "10"))
+    PARTITION_WORKERS = int(os.getenv("PARTITION_WORKERS", "2"))
+    PARTITION_STRATEGY = os.getenv("PARTITION_STRATEGY", "auto")
+    PARTITION_MIN_TEXT_BYTES = int(os.getenv("PARTITION_MIN_TEXT_BYTES", "200"))
+    PARTITION_MIN_IMAGE_PIXELS = int(os.getenv("PARTITION_MIN_IMAGE_PIXELS", "40000"))
+    PARTITION_TABLE_RECTS = int(os.getenv("PARTITION_TABLE_RECTS", "12"))
+    CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "cl100k_base")
+    CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+    EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+    EMBED_LOCAL_MODEL_DIR = os.getenv("EMBED_LOCAL_MODEL_DIR", "./models/embedder")
+    EMBED_LOCAL_POOLING = os.getenv("EMBED_LOCAL_POOLING", "mean")
+    EMBED_LOCAL_MAX_TOKENS = int(os.getenv("EMBED_LOCAL_MAX_TOKENS", "256"))
+    EMBED_LOCAL_BATCH_SIZE = int(os.getenv("EMBED_LOCAL_BATCH_SIZE", "32"))
+    EMBED_LOCAL_THREADS = int(os.getenv("EMBED_LOCAL_THREADS", "1"))
+    EMBED_LOCAL_WORKERS = int(os.getenv("EMBED_LOCAL_WORKERS", "2"))
+    FAKE_EMBEDDING_DIMENSION = int(os.getenv("FAKE_EMBEDDING_DIMENSION", "1024"))
+    FAKE_EMBEDDING_LATENCY = float(os.getenv("FAKE_EMBEDDING_LATENCY", "0"))
+    FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0"))
+    FAKE_LLM_TOKEN_LATENCY = float(os.getenv("FAKE_LLM_TOKEN_LATENCY", "0"))
+    FAKE_LLM_ANSWER_TOKENS = int(os.getenv("FAKE_LLM_ANSWER_TOKENS", "0"))
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+    EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+    EMBED_REQUESTS_PER_SECOND = float(os.getenv("EMBED_REQUESTS_PER_SECOND", "50"))
+    EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+    EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH")
+    EMBED_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBED_CACHE_MEMORY_ENTRIES", "2048"))
+    EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "50000"))
+    QUERY_EMBED_CONCURRENCY = int(os.getenv("QUERY_EMBED_CONCURRENCY", "64"))
+    VECTOR_SEARCH_CONCURRENCY = int(os.getenv("VECTOR_SEARCH_CONCURRENCY", "8"))
+    LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "64"))
+    BATCH_QUERY_MAX_ITEMS = int(os.getenv("BATCH_QUERY_MAX_ITEMS", "1000"))
+    BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+    HYBRID_DENSE_WEIGHT = float(os.getenv("HYBRID_DENSE_WEIGHT", "1.0"))
+    HYBRID_KEYWORD_WEIGHT = float(os.getenv("HYBRID_KEYWORD_WEIGHT", "1.0"))
+    HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+    KEYWORD_EXACT_MATCH = os.getenv("KEYWORD_EXACT_MATCH", "true").lower() in ("1", "true", "yes")
+    KEYWORD_EXACT_MAX_WORDS = int(os.getenv("KEYWORD_EXACT_MAX_WORDS", "8"))
+    RERANKER = os.getenv("RERANKER", "lexical")
+    RERANK_BY_DEFAULT = os.getenv("RERANK_BY_DEFAULT", "false").lower() in ("1", "true", "yes")
+    RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+    RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "4"))
+    RERANK_MODEL_DIR = os.getenv("RERANK_MODEL_DIR", "./models/reranker")
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    RERANK_THREADS = int(os.getenv("RERANK_THREADS", "1"))
+    RERANK_CONCURRENCY = int(os.getenv("RERANK_CONCURRENCY", "2"))
+    MULTIMODAL_INDEXING = os.getenv("MULTIMODAL_INDEXING", "true").lower() in ("1", "true", "yes")
+    MULTIMODAL_TOP_K = int(os.getenv("MULTIMODAL_TOP_K", "3"))
+    MULTIMODAL_WEIGHT = float(os.getenv("MULTIMODAL_WEIGHT", "1.0"))
+    CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "0"))
+    CONTEXT_DEDUP_DISTANCE = int(os.getenv("CONTEXT_DEDUP_DISTANCE", "3"))
+    CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
     
     def __init__(self):
-        if not self.OPENAI_API_KEY:
+        if not self.providers_ready():
             print("WARNING: OPENAI_API_KEY not found. Some features will not work.")
 
-settings = Settings() 
\ No newline at end of file
+    def uses_openai(self):
+        return self.EMBEDDING_PROVIDER == "openai" or self.LLM_PROVIDER == "openai"
+
+    def providers_ready(self):
+        """Whether the configured embedding and chat models can be used: the OpenAI ones need OPENAI_API_KEY."""
+        return bool(os.getenv("OPENAI_API_KEY")) or not self.uses_openai()
+
+settings = Settings()
\ No newline at end of file
@@ -0,0 +1,117 @@
+import numpy as np
+from .chunking import get_tokenizer
+from .config import settings
+from .keyword_index import tokenize
+
+# Token encoding and retrieved-context budget per chat model; other models use the defaults.
+MODEL_ENCODINGS = {"gpt-4o": "o200k_base", "gpt-4o-mini": "o200k_base", "gpt-4-turbo": "cl100k_base",
+                   "gpt-3.5-turbo": "cl100k_base"}
+MODEL_CONTEXT_BUDGETS = {"gpt-4o": 3000, "gpt-4o-mini": 3000, "gpt-4-turbo": 3000, "gpt-3.5-turbo": 1500}
+DEFAULT_CONTEXT_BUDGET = 2000
+
+
+def context_budget(model=None):
+    if settings.CONTEXT_MAX_TOKENS > 0:
+        return settings.CONTEXT_MAX_TOKENS
+    return MODEL_CONTEXT_BUDGETS.get(model or settings.LLM_MODEL, DEFAULT_CONTEXT_BUDGET)
+
+def count_tokens(text, model=None):
+    """Length of text in the chat model's encoding, as the context budget counts it."""
+    model = model or settings.LLM_MODEL
+    return len(get_tokenizer(MODEL_ENCODINGS.get(model, settings.CHUNK_TOKENIZER)).encode(text))
+
+def simhash(tokens):
+    """64-bit SimHash over word bigrams.
+
+    Built on hash(), so values are only comparable within one process.
+    """
+    shingles = zip(tokens, tokens[1:]) if len(tokens) > 1 else [tuple(tokens)]
+    hashes = np.fromiter((hash(shingle) for shingle in shingles), dtype=np.int64).view(np.uint8)
+    bits = np.unpackbits(hashes.reshape(-1, 8), axis=1)
+    majority = bits.sum(axis=0) * 2 > len(bits)
+    return int.from_bytes(np.packbits(majority).tobytes(), "big")
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+def page_order_key(doc):
+    return (doc.metadata.get("page_start") or 0, doc.metadata.get("chunk_id") or 0)
+
+
+class ContextBuilder:
+    """Turns ranked chunks into the prompt context under a token budget.
+
+    Near-duplicates (SimHash within dedup_distance bits) are dropped, the
+    rest are picked by maximal marginal relevance until the budget is
+    spent, and the picks are laid out document by document in page order.
+    Relevance is the retrieval rank; redundancy is token-set overlap.
+    """
+
+    def __init__(self, budget=None, model=None, dedup_distance=None, mmr_lambda=None):
+        model = model or settings.LLM_MODEL
+        self.budget = budget or context_budget(model)
+        self.tokenizer = get_tokenizer(MODEL_ENCODINGS.get(model, settings.CHUNK_TOKENIZER))
+        self.dedup_distance = settings.CONTEXT_DEDUP_DISTANCE if dedup_distance is None else dedup_distance
+        self.mmr_lambda = settings.CONTEXT_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+
+    def deduplicate(self, candidates):
+        kept = []
+        for candidate in candidates:
+            if not any(bin(candidate["simhash"] ^ other["simhash"]).count("1") <= self.dedup_distance for other in kept):
+                kept.append(candidate)
+        return kept
+
+    def mmr(self, candidate, selected):
+        redundancy = max((jaccard(candidate["terms"], other["terms"]) for other in selected), default=0.0)
+        return self.mmr_lambda * candidate["relevance"] - (1 - self.mmr_lambda) * redundancy
+
+    def select(self, candidates):
+        selected = []
+        remaining = list(candidates)
+        spent = 0
+        while remaining:
+            best = max(remaining, key=lambda candidate: self.mmr(candidate, selected))
+            remaining.remove(best)
+            if spent + best["tokens"] <= self.budget:
+                selected.append(best)
+                spent += best["tokens"]
+        if not selected and candidates:
+            # Even the best chunk is over budget: send its leading tokens.
+            best = candidates[0]
+            tokens = self.tokenizer.encode(best["doc"].page_content)[:self.budget]
+            selected.append(dict(best, text=self.tokenizer.decode(tokens), tokens=len(tokens)))
+        return selected
+
+    def build(self, docs):
+        candidates = []
+        for rank, doc in enumerate(docs):
+            tokens = tokenize(doc.page_content)
+            candidates.append({
+                "doc": doc,
+                "text": doc.page_content,
+                "tokens": len(self.tokenizer.encode(doc.page_content)),
+                "terms": set(tokens),
+                "simhash": simhash(tokens),
+                "relevance": 1 - rank / len(docs)
+            })
+        unique = self.deduplicate(candidates)
+        selected = self.select(unique)
+
+        document_rank = {}
+        for candidate in candidates:
+            document_rank.setdefault(candidate["doc"].metadata.get("document"), len(document_rank))
+        selected.sort(key=lambda candidate: (document_rank[candidate["doc"].metadata.get("document")],
+                                             page_order_key(candidate["doc"])))
+        text = "\n".join(candidate["text"] for candidate in selected)
+        tokens = len(self.tokenizer.encode(text))
+        return {
+            "text": text,
+            "docs": [candidate["doc"] for candidate in selected],
+            "tokens": tokens,
+            "tokens_saved": max(0, len(self.tokenizer.encode("\n".join(doc.page_content for doc in docs))) - tokens),
+            "duplicates": len(candidates) - len(unique)
+        }
+
+
+def build_context(docs, model=None):
+    return ContextBuilder(model=model).build(docs)
@@ -0,0 +1,244 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.embeddings import Embeddings
+from .config import settings
+
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+EMBEDDING_PROVIDERS = ("openai", "onnx", "fake")
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by sync and async callers.
+
+    reserve() takes a token immediately, going into debt if needed, and
+    returns how long the caller must wait before using it.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+
+def retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code in RETRYABLE_STATUS_CODES or type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+class BatchEmbedder(Embeddings):
+    """Embeds texts in fixed-size batches with bounded concurrency.
+
+    Every request takes a token from a shared bucket, and batches that hit a
+    rate limit are retried on their own with exponential backoff, so batches
+    that already succeeded are never embedded twice.
+    """
+
+    def __init__(self, embeddings, batch_size=None, max_in_flight=None, requests_per_second=None,
+                 max_retries=None, backoff_base=0.5, backoff_max=30.0):
+        self.embeddings = embeddings
+        self.batch_size = batch_size or settings.EMBED_BATCH_SIZE
+        # A wrapped model may declare its own limits, as OnnxEmbeddings does.
+        self.max_in_flight = max_in_flight or getattr(embeddings, "max_in_flight", None) or settings.EMBED_MAX_IN_FLIGHT
+        if requests_per_second is None:
+            requests_per_second = getattr(embeddings, "requests_per_second", None)
+        self.bucket = TokenBucket(settings.EMBED_REQUESTS_PER_SECOND if requests_per_second is None else requests_per_second)
+        self.max_retries = settings.EMBED_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+
+    def _backoff(self, attempt, error):
+        if attempt >= self.max_retries or not is_retryable(error):
+            raise error
+        self.retries += 1
+        delay = retry_after(error) or min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return delay * (0.5 + random.random() / 2)
+
+    def _embed_batch(self, batch):
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                return self.embeddings.embed_documents(batch)
+            except Exception as e:
+                time.sleep(self._backoff(attempt, e))
+                attempt += 1
+
+    async def _aembed_batch(self, batch):
+        attempt = 0
+        while True:
+            await self.bucket.acquire_async()
+            try:
+                return await self.embeddings.aembed_documents(batch)
+            except Exception as e:
+                await asyncio.sleep(self._backoff(attempt, e))
+                attempt += 1
+
+    def embed(self, texts, on_progress=None):
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        if not batches:
+            return []
+        results = [None] * len(batches)
+        done = 0
+        lock = threading.Lock()
+
+        def run(index):
+            nonlocal done
+            results[index] = self._embed_batch(batches[index])
+            with lock:
+                done += len(batches[index])
+                if on_progress is not None:
+                    on_progress(done)
+
+        workers = min(self.max_in_flight, len(batches))
+        if workers == 1:
+            for index in range(len(batches)):
+                run(index)
+        else:
+            with ThreadPoolExecutor(workers, thread_name_prefix="embed") as pool:
+                for future in [pool.submit(run, index) for index in range(len(batches))]:
+                    future.result()
+        return [vector for batch in results for vector in batch]
+
+    async def aembed(self, texts):
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async def run(batch):
+            async with semaphore:
+                return await self._aembed_batch(batch)
+
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(run(batch) for batch in batches))
+        return [vector for batch in results for vector in batch]
+
+    def embed_documents(self, texts):
+        return self.embed(texts)
+
+    def embed_query(self, text):
+        return self.embed([text])[0]
+
+    async def aembed_documents(self, texts):
+        return await self.aembed(texts)
+
+    async def aembed_query(self, text):
+        return (await self.aembed([text]))[0]
+
+
+class OnnxEmbeddings(Embeddings):
+    """A sentence-transformer exported to ONNX, e.g. all-MiniLM-L6-v2, run on the CPU.
+
+    model_dir holds model.onnx and the Hugging Face tokenizer.json. Texts
+    are sorted by length and encoded batch_size at a time so padding stays
+    short. Token vectors are pooled over the attention mask (mean or cls)
+    unless the model outputs a sentence_embedding, then L2-normalized.
+    The model is named after model_dir, e.g. "onnx:all-MiniLM-L6-v2".
+    """
+
+    # Local inference has no rate limit; BatchEmbedder runs max_in_flight batches in threads.
+    requests_per_second = 0
+
+    def __init__(self, model_dir, batch_size=None, max_length=None, pooling=None, threads=None, max_in_flight=None):
+        # Optional dependencies: only needed when EMBEDDING_PROVIDER=onnx.
+        import numpy as np
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self._np = np
+        self.model = f"onnx:{os.path.basename(os.path.normpath(model_dir))}"
+        self.batch_size = batch_size or settings.EMBED_LOCAL_BATCH_SIZE
+        self.pooling = pooling or settings.EMBED_LOCAL_POOLING
+        if self.pooling not in ("mean", "cls"):
+            raise ValueError(f"EMBED_LOCAL_POOLING must be 'mean' or 'cls', got '{self.pooling}'")
+        self.max_in_flight = max_in_flight or settings.EMBED_LOCAL_WORKERS
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length or settings.EMBED_LOCAL_MAX_TOKENS)
+        self.tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads or settings.EMBED_LOCAL_THREADS
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, "model.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self.inputs = {model_input.name for model_input in self.session.get_inputs()}
+        outputs = [model_output.name for model_output in self.session.get_outputs()]
+        self.output = "sentence_embedding" if "sentence_embedding" in outputs else outputs[0]
+
+    def _encode(self, texts):
+        np = self._np
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feed = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+        }
+        vectors = self.session.run([self.output], {name: value for name, value in feed.items() if name in self.inputs})[0]
+        if vectors.ndim == 3:
+            if self.pooling == "cls":
+                vectors = vectors[:, 0]
+            else:
+                weights = mask[:, :, None].astype(vectors.dtype)
+                vectors = (vectors * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1)
+        vectors = vectors.astype(np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts):
+        order = sorted(range(len(texts)), key=lambda index: len(texts[index]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for index, vector in zip(batch, self._encode([texts[index] for index in batch])):
+                vectors[index] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def load_embeddings(**client_options):
+    """The embedding model selected by EMBEDDING_PROVIDER; client_options go to the OpenAI client."""
+    if settings.EMBEDDING_PROVIDER not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"EMBEDDING_PROVIDER must be one of {EMBEDDING_PROVIDERS}, got '{settings.EMBEDDING_PROVIDER}'")
+    if settings.EMBEDDING_PROVIDER == "onnx":
+        return OnnxEmbeddings(settings.EMBED_LOCAL_MODEL_DIR)
+    if settings.EMBEDDING_PROVIDER == "fake":
+        from .offline import LexicalEmbeddings
+        return LexicalEmbeddings(settings.FAKE_EMBEDDING_DIMENSION, settings.FAKE_EMBEDDING_LATENCY)
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=settings.EMBEDDING_MODEL, **client_options)
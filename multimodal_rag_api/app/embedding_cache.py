@@ -0,0 +1,171 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from langchain_core.embeddings import Embeddings
+from .config import settings
+
+
+def cache_key(model, text):
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Content-addressed vector cache: an in-memory LRU in front of SQLite.
+
+    The disk table is bounded by max_entries; when it grows past that the
+    least recently used tenth is evicted.
+    """
+
+    def __init__(self, path, memory_entries=None, max_entries=None):
+        self.path = path
+        self.memory_entries = memory_entries or settings.EMBED_CACHE_MEMORY_ENTRIES
+        self.max_entries = max_entries or settings.EMBED_CACHE_MAX_ENTRIES
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            self.memory_hits += len(found)
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            for start in range(0, len(missing), 500):
+                batch = missing[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({', '.join('?' for _ in batch)})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector
+                    self._remember(key, vector)
+                if rows:
+                    now = time.time()
+                    self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key, _ in rows])
+                    self.disk_hits += len(rows)
+            self._conn.commit()
+            self.misses += sum(1 for key in keys if key not in found)
+        return [found.get(key) for key in keys]
+
+    def put_many(self, keys, vectors):
+        now = time.time()
+        rows = []
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                vector = array("f", vector)
+                self._remember(key, vector)
+                rows.append((key, vector.tobytes(), now))
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            self._disk_entries += self._conn.total_changes - before
+            if self._disk_entries > self.max_entries:
+                evict = self._disk_entries - int(self.max_entries * 0.9)
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (evict,)
+                )
+                self._disk_entries -= evict
+                self.evictions += evict
+            self._conn.commit()
+
+    def stats(self):
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "disk_entries": self._disk_entries
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings that only send texts missing from the cache to the inner embedder."""
+
+    def __init__(self, inner, cache, model):
+        self.inner = inner
+        self.cache = cache
+        self.model = model
+
+    def _lookup(self, texts):
+        keys = [cache_key(self.model, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        missing = {}
+        for index, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[index], index)
+        return keys, vectors, missing
+
+    def _merge(self, keys, vectors, missing, fresh):
+        if missing:
+            self.cache.put_many(list(missing), fresh)
+            fresh_by_key = dict(zip(missing, fresh))
+            vectors = [fresh_by_key[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        return [list(vector) for vector in vectors]
+
+    def embed(self, texts, on_progress=None):
+        keys, vectors, missing = self._lookup(texts)
+        cached = len(texts) - len(missing)
+        if cached and on_progress is not None:
+            on_progress(cached)
+
+        fresh = []
+        if missing:
+            progress = None if on_progress is None else (lambda done: on_progress(cached + done))
+            fresh = self.inner.embed([texts[index] for index in missing.values()], on_progress=progress)
+        return self._merge(keys, vectors, missing, fresh)
+
+    async def aembed(self, texts):
+        keys, vectors, missing = self._lookup(texts)
+        fresh = []
+        if missing:
+            fresh = await self.inner.aembed([texts[index] for index in missing.values()])
+        return self._merge(keys, vectors, missing, fresh)
+
+    def embed_documents(self, texts):
+        return self.embed(texts)
+
+    def embed_query(self, text):
+        return self.embed([text])[0]
+
+    async def aembed_documents(self, texts):
+        return await self.aembed(texts)
+
+    async def aembed_query(self, text):
+        return (await self.aembed([text]))[0]
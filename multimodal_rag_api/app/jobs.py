@@ -0,0 +1,339 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
+from .bulk import BulkImport, import_directory
+from .config import settings
+from .metrics import INGEST_STAGES, stage
+from .rag_pipeline import (chunk_document, chunk_ids, copy_document, delete_document, delete_product, file_hash,
+                           sync_document)
+from .partitioning import iter_partitioned_elements
+
+ACTIVE_STATUSES = ("queued", "partitioning", "embedding")
+IMPORT_ACTIVE_STATUSES = ("queued", "running", "interrupted")
+
+JOB_FIELDS = (
+    "id", "product", "document", "path", "file_hash", "status", "pages_parsed", "chunks_total",
+    "chunks_reused", "chunks_embedded", "chunks_stored", "chunks_deleted", "assets_stored", "page_strategies",
+    "copied_from", "import_id", "error", "created_at", "updated_at"
+)
+
+IMPORT_FIELDS = (
+    "id", "source", "product", "status", "files_total", "files_done", "files_failed", "chunks_stored",
+    "docs_per_s", "chunks_per_s", "error", "created_at", "updated_at"
+)
+
+ADDED_COLUMNS = {
+    "page_strategies": "TEXT",
+    "file_hash": "TEXT",
+    "chunks_reused": "INTEGER NOT NULL DEFAULT 0",
+    "chunks_deleted": "INTEGER NOT NULL DEFAULT 0",
+    "assets_stored": "INTEGER NOT NULL DEFAULT 0",
+    "copied_from": "TEXT",
+    "import_id": "TEXT"
+}
+
+
+def job_record(row):
+    job = dict(zip(JOB_FIELDS, row))
+    if job["page_strategies"] is not None:
+        job["page_strategies"] = json.loads(job["page_strategies"])
+    return job
+
+
+class JobStore:
+    """SQLite-backed ingestion job records, shared by the API and worker processes."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, product TEXT NOT NULL, document TEXT NOT NULL, path TEXT NOT NULL, "
+            "status TEXT NOT NULL, pages_parsed INTEGER NOT NULL DEFAULT 0, "
+            "chunks_total INTEGER NOT NULL DEFAULT 0, chunks_embedded INTEGER NOT NULL DEFAULT 0, "
+            "chunks_stored INTEGER NOT NULL DEFAULT 0, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, definition in ADDED_COLUMNS.items():
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS imports ("
+            "id TEXT PRIMARY KEY, source TEXT NOT NULL, product TEXT, status TEXT NOT NULL, "
+            "files_total INTEGER NOT NULL DEFAULT 0, files_done INTEGER NOT NULL DEFAULT 0, "
+            "files_failed INTEGER NOT NULL DEFAULT 0, chunks_stored INTEGER NOT NULL DEFAULT 0, "
+            "docs_per_s REAL, chunks_per_s REAL, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_import ON jobs (import_id)")
+        self._conn.commit()
+
+    def create(self, product, document, path, file_hash=None, import_id=None):
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, product, document, path, file_hash, status, import_id, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, product, document, path, file_hash, import_id, now, now)
+            )
+            self._conn.commit()
+        return self.get(job_id)
+
+    def update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return job_record(row) if row else None
+
+    def list(self, status=None, limit=100, import_id=None):
+        query = f"SELECT {', '.join(JOB_FIELDS)} FROM jobs"
+        conditions = {"status": status, "import_id": import_id}
+        params = tuple(value for value in conditions.values() if value)
+        if params:
+            query += " WHERE " + " AND ".join(f"{name} = ?" for name, value in conditions.items() if value)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, (*params, limit)).fetchall()
+        return [job_record(row) for row in rows]
+
+    def active(self):
+        placeholders = ", ".join("?" for _ in ACTIVE_STATUSES)
+        with self._lock:
+            rows = self._conn.execute(
+                # Jobs of bulk imports are picked up again by resuming their import.
+                f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE status IN ({placeholders}) AND import_id IS NULL "
+                f"ORDER BY created_at",
+                ACTIVE_STATUSES
+            ).fetchall()
+        return [job_record(row) for row in rows]
+
+    def create_import(self, source, product=None):
+        now = time.time()
+        import_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO imports (id, source, product, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (import_id, source, product, now, now)
+            )
+            self._conn.commit()
+        return self.get_import(import_id)
+
+    def update_import(self, import_id, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE imports SET {assignments} WHERE id = ?", (*fields.values(), import_id))
+            self._conn.commit()
+
+    def get_import(self, import_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(IMPORT_FIELDS)} FROM imports WHERE id = ?", (import_id,)).fetchone()
+        return dict(zip(IMPORT_FIELDS, row)) if row else None
+
+    def list_imports(self, limit=100):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(IMPORT_FIELDS)} FROM imports ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(zip(IMPORT_FIELDS, row)) for row in rows]
+
+    def unfinished_import(self, source):
+        """The latest import of `source` that did not complete, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(IMPORT_FIELDS)} FROM imports WHERE source = ? AND status != 'completed' "
+                f"ORDER BY created_at DESC LIMIT 1", (source,)
+            ).fetchone()
+        return dict(zip(IMPORT_FIELDS, row)) if row else None
+
+    def import_jobs(self, import_id):
+        """Jobs of an import by (product, document), the latest one where a document has several."""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE import_id = ? ORDER BY updated_at",
+                                      (import_id,)).fetchall()
+        jobs = [job_record(row) for row in rows]
+        return {(job["product"], job["document"]): job for job in jobs}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class IngestionQueue:
+    """Runs uploads in the background.
+
+    Each job runs on a small thread pool. Its PDF is split into page
+    windows that are partitioned in a shared, bounded process pool and
+    streamed into the chunker. Embedding and the Chroma write happen in
+    this process so they reuse the pooled clients and keep a single writer
+    on chroma_db. A file identical to the stored version is skipped, one
+    already ingested under another product or name gets a copy of those
+    chunks and vectors, and a changed one only embeds the chunks that are
+    not stored yet. Bulk imports (see app.bulk) run one at a time on the
+    same process pool and write lock.
+    """
+
+    def __init__(self, store, resources, max_workers=None):
+        self.store = store
+        self.resources = resources
+        max_workers = max_workers or settings.INGEST_WORKERS
+        self.partitioners = ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn"))
+        self._runners = ThreadPoolExecutor(max_workers, thread_name_prefix="ingest")
+        self._importers = ThreadPoolExecutor(1, thread_name_prefix="import")
+        self._importing = set()
+        self._import_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.closing = False
+
+    def submit(self, pdf_path, product, document, file_hash=None):
+        job = self.store.create(product, document, pdf_path, file_hash)
+        self._runners.submit(self._run, job)
+        return job
+
+    def resume(self):
+        jobs = self.store.active()
+        for job in jobs:
+            self.store.update(job["id"], status="queued")
+            self._runners.submit(self._run, job)
+        # Imports of directories are resumed by running `app.cli ingest` again.
+        for record in self.store.list_imports(limit=1000):
+            if record["status"] in IMPORT_ACTIVE_STATUSES and self.uploaded_import(record):
+                self.submit_import(record["id"])
+        return len(jobs)
+
+    def _run(self, job):
+        job_id = job["id"]
+        product, document = job["product"], job["document"]
+        try:
+            digest = job["file_hash"] or file_hash(job["path"])
+            if digest == self.resources.catalog.version(product, document)[0]:
+                self.store.update(job_id, status="unchanged", file_hash=digest)
+                return
+            if self.copy_existing(job_id, digest, product, document):
+                return
+
+            self.store.update(job_id, status="partitioning", file_hash=digest)
+            elements = iter_partitioned_elements(
+                job["path"], self.partitioners,
+                on_pages=lambda pages: self.store.update(job_id, pages_parsed=pages),
+                on_plan=lambda strategies: self.store.update(job_id, page_strategies=json.dumps(strategies))
+            )
+            asset_store = self.resources.asset_store
+            chunks, assets = chunk_document(elements, asset_store is not None)
+
+            # Only chunks whose content is not stored yet need an embedding.
+            ids = chunk_ids(chunks, product, document)
+            stored = self.resources.vectorstores.stored_ids(product, document)
+            new = [i for i, chunk_id in enumerate(ids) if chunk_id not in stored]
+            reused = len(chunks) - len(new)
+            texts = [chunks[i]["text"] for i in new]
+            new_ids = [ids[i] for i in new]
+            if assets:
+                # Tables and figures are embedded in the same batched calls as the text.
+                asset_ids = chunk_ids(assets, product, document)
+                stored_assets = asset_store.stored_ids(product, document)
+                texts += [asset["text"] for asset, asset_id in zip(assets, asset_ids) if asset_id not in stored_assets]
+                new_ids += [asset_id for asset_id in asset_ids if asset_id not in stored_assets]
+            self.store.update(job_id, status="embedding", chunks_total=len(chunks),
+                              chunks_reused=reused, chunks_embedded=reused)
+            with stage("embed", INGEST_STAGES):
+                vectors = self.resources.embeddings.embed(
+                    texts,
+                    on_progress=lambda done: self.store.update(job_id, chunks_embedded=reused + min(done, len(new)))
+                )
+            with self.write_lock:
+                result = sync_document(chunks, product, document, self.resources.vectorstores, self.resources.catalog,
+                                       self.resources.embeddings, dict(zip(new_ids, vectors)), digest,
+                                       self.resources.keyword_index, assets, asset_store)
+            self.store.update(job_id, status="completed", chunks_stored=len(chunks),
+                              chunks_reused=result["reused"], chunks_deleted=result["deleted"],
+                              assets_stored=len(assets or ()))
+        except (CancelledError, Exception) as e:
+            # Interrupted by shutdown: leave the job active so resume() picks it up.
+            if not self.closing:
+                self.store.update(job_id, status="failed", error=str(e))
+
+    def copy_existing(self, job_id, digest, product, document):
+        """Store the job's document from an ingested copy of the same file; False if there is none."""
+        source = self.resources.catalog.find_file(digest, exclude=(product, document))
+        if source is None:
+            return False
+        with self.write_lock:
+            result = copy_document(*source, product, document, self.resources.vectorstores, self.resources.catalog,
+                                   self.resources.embeddings, digest, self.resources.keyword_index,
+                                   self.resources.asset_store)
+        if result is None:
+            return False
+        self.store.update(job_id, status="completed", file_hash=digest, copied_from="/".join(source),
+                          chunks_total=result["chunks"], chunks_reused=result["chunks"],
+                          chunks_embedded=result["chunks"], chunks_stored=result["chunks"],
+                          chunks_deleted=result["deleted"], assets_stored=result["assets_stored"])
+        return True
+
+    def start_import(self, source, product=None, restart=False):
+        """The import of `source`, resuming its last unfinished one unless `restart`."""
+        source = os.path.abspath(source)
+        record = None if restart else self.store.unfinished_import(source)
+        return record or self.store.create_import(source, product)
+
+    def submit_import(self, import_id):
+        """Runs an import in the background, one at a time; False if it is running already."""
+        with self._import_lock:
+            if import_id in self._importing:
+                return False
+            self._importing.add(import_id)
+            self.store.update_import(import_id, status="queued")
+        self._importers.submit(self.run_import, import_id)
+        return True
+
+    def run_import(self, import_id, on_progress=None, batch_chunks=None):
+        bulk = BulkImport(self, import_id, on_progress, batch_chunks)
+        try:
+            record = bulk.run()
+        except Exception as e:
+            if not self.closing:
+                self.store.update_import(import_id, status="failed", error=str(e))
+            raise
+        finally:
+            with self._import_lock:
+                self._importing.discard(import_id)
+        # ZIP files uploaded to the API are only kept until their import completes.
+        if record["status"] == "completed" and self.uploaded_import(record) and os.path.exists(record["source"]):
+            os.remove(record["source"])
+        return record
+
+    @staticmethod
+    def uploaded_import(record):
+        return os.path.dirname(os.path.dirname(record["source"])) == os.path.abspath(import_directory())
+
+    def remove_document(self, product, document):
+        with self.write_lock:
+            return delete_document(product, document, self.resources.vectorstores, self.resources.catalog,
+                                   self.resources.keyword_index, self.resources.asset_store)
+
+    def remove_product(self, product):
+        with self.write_lock:
+            return delete_product(product, self.resources.vectorstores, self.resources.catalog,
+                                  self.resources.keyword_index, self.resources.asset_store)
+
+    def shutdown(self):
+        self.closing = True
+        self.partitioners.shutdown(wait=False, cancel_futures=True)
+        self._runners.shutdown(wait=True, cancel_futures=True)
+        self._importers.shutdown(wait=True, cancel_futures=True)
+        self.store.close()
@@ -0,0 +1,211 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from heapq import nlargest
+from langchain_core.documents import Document
+from .config import settings
+from .vector_routing import stored_batches
+
+KEYWORD_INDEX_FILENAME = "keyword_index.sqlite3"
+TOKEN = re.compile(r"\w+(?:[-./]\w+)*")
+SEPARATOR = re.compile(r"[-./]")
+QUOTED = re.compile(r'"([^"]+)"')
+
+
+def tokenize(text):
+    # Compound tokens such as part numbers are kept whole as well as split.
+    tokens = []
+    for token in TOKEN.findall(text.casefold()):
+        tokens.append(token)
+        if SEPARATOR.search(token):
+            tokens.extend(part for part in SEPARATOR.split(token) if part)
+    return tokens
+
+def exact_terms(question):
+    """Terms a user expects verbatim: quoted phrases and codes such as part numbers.
+
+    A code has both digits and a separator (PN-00001-00, 3.5.1). Acronyms,
+    years and plain words are left to hybrid retrieval, which also finds
+    them by meaning.
+    """
+    terms = [phrase.casefold() for phrase in QUOTED.findall(question)]
+    for token in TOKEN.findall(question):
+        if any(c.isdigit() for c in token) and SEPARATOR.search(token):
+            terms.append(token.casefold())
+    return terms
+
+
+class KeywordIndex:
+    """BM25 index over stored chunks, partitioned by product.
+
+    Chunk text and metadata are kept in SQLite beside the vector store. A
+    product's postings are built in memory on its first search and dropped
+    whenever its chunks change.
+    """
+
+    def __init__(self, path, k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id TEXT PRIMARY KEY, product TEXT NOT NULL, document TEXT NOT NULL, "
+            "text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_product ON chunks (product, document)")
+        self._conn.commit()
+        self._partitions = {}
+
+    @classmethod
+    def for_directory(cls, persist_directory):
+        return cls(os.path.join(persist_directory, KEYWORD_INDEX_FILENAME))
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM chunks LIMIT 1").fetchone() is None
+
+    def upsert(self, product, document, ids, texts, metadatas):
+        self.upsert_many([(product, document, ids, texts, metadatas)])
+
+    def upsert_many(self, documents):
+        """Stores the chunks of (product, document, ids, texts, metadatas) entries in one transaction."""
+        rows = [(chunk_id, product, document, text, json.dumps(metadata))
+                for product, document, ids, texts, metadatas in documents
+                for chunk_id, text, metadata in zip(ids, texts, metadatas)]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, product, document, text, metadata) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+            for product, _, _, _, _ in documents:
+                self._partitions.pop(product, None)
+
+    def delete(self, product, ids):
+        ids = list(ids)
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                self._conn.execute(f"DELETE FROM chunks WHERE id IN ({', '.join('?' for _ in batch)})", batch)
+            self._conn.commit()
+            self._partitions.pop(product, None)
+
+    def delete_document(self, product, document):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE product = ? AND document = ?", (product, document))
+            self._conn.commit()
+            self._partitions.pop(product, None)
+
+    def delete_product(self, product):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE product = ?", (product,))
+            self._conn.commit()
+            self._partitions.pop(product, None)
+
+    def rebuild_from_vectorstore(self, vectorstore, batch_size=1000):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            for batch in stored_batches(vectorstore, ["documents", "metadatas"], batch_size):
+                rows = [
+                    (chunk_id, metadata["product"], metadata["document"], text, json.dumps(metadata))
+                    for chunk_id, text, metadata in zip(batch["ids"], batch["documents"], batch["metadatas"])
+                    if text and metadata and "product" in metadata and "document" in metadata
+                ]
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (id, product, document, text, metadata) VALUES (?, ?, ?, ?, ?)", rows
+                )
+            self._conn.commit()
+            self._partitions = {}
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def _partition(self, product):
+        with self._lock:
+            partition = self._partitions.get(product)
+            if partition is None:
+                ids = []
+                lengths = []
+                postings = {}
+                rows = self._conn.execute("SELECT id, text FROM chunks WHERE product = ? ORDER BY rowid", (product,))
+                for index, (chunk_id, text) in enumerate(rows):
+                    counts = Counter(tokenize(text))
+                    ids.append(chunk_id)
+                    lengths.append(sum(counts.values()))
+                    for term, frequency in counts.items():
+                        postings.setdefault(term, []).append((index, frequency))
+                average = sum(lengths) / len(lengths) if lengths else 0.0
+                partition = {"ids": ids, "lengths": lengths, "postings": postings, "average_length": average}
+                self._partitions[product] = partition
+            return partition
+
+    def _scores(self, partition, terms, candidates=None):
+        scores = {}
+        count = len(partition["ids"])
+        for term in set(terms):
+            postings = partition["postings"].get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for index, frequency in postings:
+                if candidates is not None and index not in candidates:
+                    continue
+                norm = frequency + self.k1 * (1 - self.b + self.b * partition["lengths"][index] / partition["average_length"])
+                scores[index] = scores.get(index, 0.0) + idf * frequency * (self.k1 + 1) / norm
+        return scores
+
+    def _documents(self, ids):
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT id, text, metadata FROM chunks WHERE id IN ({', '.join('?' for _ in batch)})", batch
+                )
+                for chunk_id, text, metadata in rows:
+                    found[chunk_id] = Document(page_content=text, metadata=json.loads(metadata), id=chunk_id)
+        return [found[chunk_id] for chunk_id in ids if chunk_id in found]
+
+    def search(self, product, query, k=5):
+        partition = self._partition(product)
+        scores = self._scores(partition, tokenize(query))
+        best = nlargest(k, scores.items(), key=lambda item: item[1])
+        return self._documents([partition["ids"][index] for index, _ in best])
+
+    def exact_search(self, product, question, k=5):
+        """Chunks containing every exact term of a short question, or None if it is not such a lookup."""
+        terms = exact_terms(question)
+        if not terms or len(TOKEN.findall(question)) > settings.KEYWORD_EXACT_MAX_WORDS:
+            return None
+        required = set()
+        phrases = []
+        for term in terms:
+            if TOKEN.fullmatch(term):
+                required.add(term)
+            else:
+                phrases.append(term)
+                required.update(TOKEN.findall(term))
+
+        partition = self._partition(product)
+        candidates = None
+        for term in required:
+            matching = {index for index, _ in partition["postings"].get(term, ())}
+            candidates = matching if candidates is None else candidates & matching
+            if not candidates:
+                return []
+        scores = self._scores(partition, tokenize(question), candidates)
+        ranked = [partition["ids"][index] for index, _ in sorted(scores.items(), key=lambda item: -item[1])]
+        if not phrases:
+            return self._documents(ranked[:k])
+        documents = [document for document in self._documents(ranked)
+                     if all(phrase in " ".join(document.page_content.casefold().split()) for phrase in phrases)]
+        return documents[:k]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
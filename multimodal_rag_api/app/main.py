@@ -1,12 +1,24 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .api import router
-import os
+from .config import settings
+from .metrics import MetricsMiddleware
+from .resources import ResourceRegistry
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.resources = ResourceRegistry()
+    if settings.providers_ready():
+        app.state.resources.jobs.resume()
+    yield
+    await app.state.resources.aclose()
 
 app = FastAPI(
     title="PDF RAG API",
     description="API for PDF document retrieval-augmented generation (RAG).",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -19,7 +31,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/")
 def root():
@@ -0,0 +1,203 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from .config import settings
+
+QUERY_STAGES = "rag_query_stage_duration_seconds"
+INGEST_STAGES = "rag_ingest_stage_duration_seconds"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+METRICS = {
+    "rag_http_requests_total": ("counter", "HTTP requests by route, method and status."),
+    "rag_http_request_duration_seconds": ("histogram", "Time from request to the end of the response body."),
+    QUERY_STAGES: ("histogram", "Time spent in each stage of answering a question."),
+    INGEST_STAGES: ("histogram", "Time spent in each stage of ingesting a document."),
+    "rag_chunks_total": ("counter", "Chunks written by ingestion, by lane and operation."),
+    "rag_llm_tokens_total": ("counter", "LLM tokens by direction (estimated when the model reports no usage)."),
+    "rag_answer_cache_lookups_total": ("counter", "Answer cache lookups by result."),
+    "rag_answer_cache_entries": ("gauge", "Answers held by the answer cache."),
+    "rag_embedding_cache_lookups_total": ("counter", "Embedding cache lookups by result."),
+    "rag_embedding_cache_entries": ("gauge", "Embeddings held by the embedding cache, by tier.")
+}
+
+# Stage timings of the request being served, for its Server-Timing header.
+current_timings = contextvars.ContextVar("current_timings", default=None)
+
+
+def label_text(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+def number_text(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metrics:
+    """Process-wide counters and latency histograms, rendered in the Prometheus text format.
+
+    Updates take one lock and a bisect, so they can stay on in production.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, enabled=None):
+        self.buckets = tuple(buckets)
+        self.enabled = settings.METRICS_ENABLED if enabled is None else enabled
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(counts), total, count) for key, (counts, total, count) in self._histograms.items()}
+        return counters, histograms
+
+    def render(self, samples=()):
+        """The text exposition of every metric, plus `samples` of (name, labels, value) read at scrape time."""
+        counters, histograms = self.snapshot()
+        series = {}
+        for (name, labels), value in counters.items():
+            series.setdefault(name, []).append(f"{name}{label_text(labels)} {number_text(value)}")
+        for name, labels, value in samples:
+            series.setdefault(name, []).append(f"{name}{label_text(tuple(sorted(labels.items())))} {number_text(value)}")
+        for (name, labels), (counts, total, count) in sorted(histograms.items()):
+            lines = series.setdefault(name, [])
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{label_text(labels + (('le', number_text(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{label_text(labels)} {total!r}")
+            lines.append(f"{name}_count{label_text(labels)} {count}")
+        out = []
+        for name in sorted(series):
+            kind, description = METRICS.get(name, ("untyped", ""))
+            out += [f"# HELP {name} {description}", f"# TYPE {name} {kind}", *series[name]]
+        return "\n".join(out) + "\n"
+
+
+metrics = Metrics()
+
+
+def record_stage(name, seconds, histogram=QUERY_STAGES):
+    metrics.observe(histogram, seconds, stage=name)
+    timings = current_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+@contextmanager
+def stage(name, histogram=QUERY_STAGES):
+    """Times the block into `histogram` and into the current request's Server-Timing."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started, histogram)
+
+def cache_samples(resources):
+    answers = resources.answer_cache.stats()
+    embeddings = resources.embedding_cache.stats()
+    return [
+        ("rag_answer_cache_lookups_total", {"result": "exact_hit"}, answers["exact_hits"]),
+        ("rag_answer_cache_lookups_total", {"result": "semantic_hit"}, answers["semantic_hits"]),
+        ("rag_answer_cache_lookups_total", {"result": "miss"}, answers["misses"]),
+        ("rag_answer_cache_entries", {}, answers["entries"]),
+        ("rag_embedding_cache_lookups_total", {"result": "memory_hit"}, embeddings["memory_hits"]),
+        ("rag_embedding_cache_lookups_total", {"result": "disk_hit"}, embeddings["disk_hits"]),
+        ("rag_embedding_cache_lookups_total", {"result": "miss"}, embeddings["misses"]),
+        ("rag_embedding_cache_entries", {"tier": "memory"}, embeddings["memory_entries"]),
+        ("rag_embedding_cache_entries", {"tier": "disk"}, embeddings["disk_entries"])
+    ]
+
+def server_timing(timings, total):
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class TimedIterator:
+    """Passes `iterable` through, adding up the time spent producing its items in `seconds`."""
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self.seconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            return next(self._iterator)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting and timing HTTP requests by route.
+
+    With server_timing (SERVER_TIMING) responses carry the stages timed so
+    far in a Server-Timing header; for streamed responses that is only what
+    ran before the first byte.
+    """
+
+    def __init__(self, app, server_timing=None):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        timings = {}
+        token = current_timings.set(timings)
+        status = 500
+        with_header = settings.SERVER_TIMING if self.server_timing is None else self.server_timing
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if with_header:
+                    header = server_timing(timings, time.perf_counter() - started).encode("latin-1")
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header)]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_timings.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.inc("rag_http_requests_total", method=scope["method"], route=route, status=str(status))
+            metrics.observe("rag_http_request_duration_seconds", time.perf_counter() - started, route=route)
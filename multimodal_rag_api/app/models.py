@@ -1,8 +1,16 @@
+from typing import List, Optional
 from pydantic import BaseModel
 
 class RAGQueryRequest(BaseModel):
     question: str
     product: str
+    rerank: Optional[bool] = None
 
 class RAGQueryResponse(BaseModel):
-    answer: str 
\ No newline at end of file
+    answer: str
+    rerank_ms: Optional[float] = None
+    context_tokens: Optional[int] = None
+    tokens_saved: Optional[int] = None
+
+class RAGBatchQueryRequest(BaseModel):
+    queries: List[RAGQueryRequest]
\ No newline at end of file
@@ -0,0 +1,437 @@
+import json
+import os
+import sqlite3
+import threading
+import numpy as np
+from langchain_core.documents import Document
+from .config import settings
+
+NUMPY_STORE_DIRNAME = "numpy_store"
+SEARCH_BLOCK_ROWS = 16384
+# int8 rows are widened to float32 this many at a time, which keeps the copy in cache.
+WIDEN_ROWS = 256
+DTYPES = {"float32": np.float32, "int8": np.int8}
+
+
+def quantize(vectors, quantization):
+    """Stored rows, per-row scales and squared norms of the vectors as stored."""
+    if quantization == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1.0
+        stored = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        restored = stored.astype(np.float32) * scales[:, None]
+    else:
+        scales = np.ones(len(vectors), dtype=np.float32)
+        stored = restored = vectors
+    return stored, scales.astype(np.float32), np.einsum("ij,ij->i", restored, restored)
+
+def dot_rows(matrix, query):
+    if matrix.dtype == np.float32:
+        return matrix @ query
+    dots = np.empty((len(matrix),) + query.shape[1:], dtype=np.float32)
+    for start in range(0, len(matrix), WIDEN_ROWS):
+        dots[start:start + WIDEN_ROWS] = matrix[start:start + WIDEN_ROWS].astype(np.float32) @ query
+    return dots
+
+def kmeans(vectors, lists, iterations=10, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), lists, replace=False)].copy()
+    for _ in range(iterations):
+        labels = nearest_centroids(vectors, centroids, 1)[:, 0]
+        for i in range(lists):
+            members = vectors[labels == i]
+            if len(members):
+                centroids[i] = members.mean(axis=0)
+    return centroids
+
+def nearest_centroids(vectors, centroids, count):
+    distances = (centroids * centroids).sum(axis=1) - 2 * vectors @ centroids.T
+    return np.argsort(distances, axis=1)[:, :count]
+
+
+class NumpyVectorStore:
+    """In-process vector backend: embeddings in memory-mapped matrices, text and metadata in SQLite.
+
+    Each product's rows sit in a few contiguous spans of the matrix, so a
+    search is a matrix-vector product over slices of the memmap and an
+    argpartition, with no per-row filtering. Writes append a span, deletes
+    leave dead rows, and the matrix is rewritten sorted by product once dead
+    rows or spans pile up. VECTOR_QUANTIZATION=int8 stores rows as int8 with
+    a per-row scale, a quarter of the float32 size. With VECTOR_IVF_LISTS set,
+    products of at least VECTOR_IVF_MIN_ROWS rows are searched through
+    k-means lists built on their first search. Results are ranked by L2
+    distance, like Chroma's default collections. The embedding model of the
+    first write is recorded next to the dimension. Collections other than
+    COLLECTION_NAME are kept in numpy_store-<name>.
+    """
+
+    sharding = None
+
+    def __init__(self, persist_directory, embeddings=None, quantization=None, ivf_lists=None, embedding_model=None,
+                 name=None):
+        self.name = name or settings.COLLECTION_NAME
+        # COLLECTION_NAME keeps the original directory; other collections (e.g. the asset lane) get their own.
+        dirname = NUMPY_STORE_DIRNAME if self.name == settings.COLLECTION_NAME else f"{NUMPY_STORE_DIRNAME}-{self.name}"
+        self.directory = os.path.join(persist_directory, dirname)
+        self.embeddings = embeddings
+        self.embedding_model = embedding_model or getattr(embeddings, "model", None)
+        self.ivf_lists = settings.VECTOR_IVF_LISTS if ivf_lists is None else ivf_lists
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._ivf_lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.directory, "rows.sqlite3"), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            "row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, product TEXT NOT NULL, document TEXT NOT NULL, "
+            "text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS rows_document ON rows (product, document)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+        stored_quantization = meta.get("quantization")
+        self.quantization = stored_quantization or quantization or settings.VECTOR_QUANTIZATION
+        if self.quantization not in DTYPES:
+            raise ValueError(f"VECTOR_QUANTIZATION must be one of {tuple(DTYPES)}, got '{self.quantization}'")
+        if stored_quantization and quantization and quantization != stored_quantization:
+            print(f"WARNING: {self.directory} holds {stored_quantization} vectors; ignoring quantization={quantization}.")
+        self.dimension = int(meta["dimension"]) if "dimension" in meta else None
+        self._generation = int(meta.get("generation", 0))
+        self._ivf = {}
+        self._load()
+
+    def _path(self, name, generation=None):
+        return os.path.join(self.directory, f"{name}-{self._generation if generation is None else generation}.bin")
+
+    def _open(self, generation, rows):
+        """Memory-maps the matrices of a generation with room for `rows` rows, growing the files if needed."""
+        capacity = max(rows, 1024)
+        arrays = []
+        for name, dtype, width in (("vectors", DTYPES[self.quantization], self.dimension), ("scales", np.float32, 1),
+                                   ("norms", np.float32, 1)):
+            path = self._path(name, generation)
+            size = capacity * width * np.dtype(dtype).itemsize
+            with open(path, "ab") as handle:
+                if handle.tell() < size:
+                    handle.truncate(size)
+            existing = os.path.getsize(path) // (width * np.dtype(dtype).itemsize)
+            shape = (existing, width) if name == "vectors" else (existing,)
+            arrays.append(np.memmap(path, dtype=dtype, mode="r+", shape=shape))
+        return arrays
+
+    def _load(self):
+        self._size = 0
+        self._spans = {}
+        self._vectors = self._scales = self._norms = None
+        self._alive = np.zeros(0, dtype=bool)
+        if self.dimension is None:
+            return
+        rows = self._conn.execute("SELECT row, product FROM rows ORDER BY row").fetchall()
+        self._size = rows[-1][0] + 1 if rows else 0
+        self._vectors, self._scales, self._norms = self._open(self._generation, self._size)
+        self._alive = np.zeros(len(self._vectors), dtype=bool)
+        for row, product in rows:
+            self._alive[row] = True
+            spans = self._spans.setdefault(product, [])
+            if spans and spans[-1][1] == row:
+                spans[-1][1] = row + 1
+            else:
+                spans.append([row, row + 1])
+        for name in os.listdir(self.directory):
+            if name.endswith(".bin") and not name.endswith(f"-{self._generation}.bin"):
+                os.remove(os.path.join(self.directory, name))
+
+    def _ensure_capacity(self, rows):
+        if self._vectors is None or rows > len(self._vectors):
+            capacity = max(rows, 2 * (0 if self._vectors is None else len(self._vectors)))
+            self._vectors, self._scales, self._norms = self._open(self._generation, capacity)
+            alive = np.zeros(len(self._vectors), dtype=bool)
+            alive[:len(self._alive)] = self._alive
+            self._alive = alive
+
+    def _rows(self, query, params):
+        return [row for row, in self._conn.execute(query, params)]
+
+    def _kill(self, rows):
+        for start in range(0, len(rows), 500):
+            batch = rows[start:start + 500]
+            self._conn.execute(f"DELETE FROM rows WHERE row IN ({', '.join('?' for _ in batch)})", batch)
+        self._alive[rows] = False
+
+    def stored_ids(self, product, document):
+        with self._lock:
+            return {chunk_id for chunk_id, in self._conn.execute(
+                "SELECT id FROM rows WHERE product = ? AND document = ?", (product, document))}
+
+    def document_chunks(self, product, document):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT row, id, text, metadata FROM rows WHERE product = ? AND document = ? ORDER BY row",
+                (product, document)
+            ).fetchall()
+            vectors, scales = self._vectors, self._scales
+        indices = [row for row, _, _, _ in rows]
+        return {
+            "ids": [chunk_id for _, chunk_id, _, _ in rows],
+            "embeddings": vectors[indices].astype(np.float32) * scales[indices, None] if rows else [],
+            "documents": [text for _, _, text, _ in rows],
+            "metadatas": [json.loads(metadata) for _, _, _, metadata in rows]
+        }
+
+    def upsert(self, product, ids, embeddings, documents, metadatas):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if not len(ids):
+            return
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+                meta = [("dimension", str(self.dimension)), ("quantization", self.quantization)]
+                if self.embedding_model:
+                    meta.append(("embedding_model", self.embedding_model))
+                self._conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", meta)
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(f"Expected {self.dimension}-dimensional embeddings, got {vectors.shape[1]}")
+            replaced = []
+            for start in range(0, len(ids), 500):
+                batch = list(ids[start:start + 500])
+                replaced += self._rows(f"SELECT row FROM rows WHERE id IN ({', '.join('?' for _ in batch)})", batch)
+            self._ensure_capacity(self._size + len(ids))
+            if replaced:
+                self._kill(replaced)
+            start, end = self._size, self._size + len(ids)
+            self._vectors[start:end], self._scales[start:end], self._norms[start:end] = quantize(vectors, self.quantization)
+            for array in (self._vectors, self._scales, self._norms):
+                array.flush()
+            self._conn.executemany(
+                "INSERT INTO rows (row, id, product, document, text, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                [(start + i, chunk_id, product, metadata.get("document", ""), text, json.dumps(metadata))
+                 for i, (chunk_id, text, metadata) in enumerate(zip(ids, documents, metadatas))]
+            )
+            self._conn.commit()
+            self._alive[start:end] = True
+            spans = self._spans.setdefault(product, [])
+            if spans and spans[-1][1] == start:
+                spans[-1][1] = end
+            else:
+                spans.append([start, end])
+            self._size = end
+            self._changed(product)
+
+    def update_metadata(self, product, ids, metadatas):
+        with self._lock:
+            self._conn.executemany("UPDATE rows SET metadata = ? WHERE id = ?",
+                                   [(json.dumps(metadata), chunk_id) for chunk_id, metadata in zip(ids, metadatas)])
+            self._conn.commit()
+
+    def delete(self, product, ids):
+        ids = list(ids)
+        with self._lock:
+            rows = []
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                rows += self._rows(f"SELECT row FROM rows WHERE id IN ({', '.join('?' for _ in batch)})", batch)
+            self._kill(rows)
+            self._conn.commit()
+            self._changed(product)
+
+    def delete_document(self, product, document):
+        with self._lock:
+            self._kill(self._rows("SELECT row FROM rows WHERE product = ? AND document = ?", (product, document)))
+            self._conn.commit()
+            self._changed(product)
+
+    def delete_product(self, product):
+        with self._lock:
+            self._kill(self._rows("SELECT row FROM rows WHERE product = ?", (product,)))
+            self._conn.commit()
+            self._spans.pop(product, None)
+            self._changed(product)
+
+    def _changed(self, product):
+        self._ivf.pop(product, None)
+        dead = self._size - int(self._alive[:self._size].sum())
+        spans = max((len(spans) for spans in self._spans.values()), default=0)
+        if dead > max(1024, self._size // 4) or spans > 16:
+            self._compact()
+
+    def _compact(self):
+        """Rewrites the live rows sorted by product, so each product is one span again."""
+        order = []
+        spans = {}
+        for product in sorted(self._spans):
+            start = len(order)
+            for span_start, span_end in self._spans[product]:
+                order.extend(row for row in range(span_start, span_end) if self._alive[row])
+            if len(order) > start:
+                spans[product] = [[start, len(order)]]
+        generation = self._generation + 1
+        vectors, scales, norms = self._open(generation, len(order))
+        for start in range(0, len(order), SEARCH_BLOCK_ROWS):
+            rows = order[start:start + SEARCH_BLOCK_ROWS]
+            vectors[start:start + len(rows)] = self._vectors[rows]
+            scales[start:start + len(rows)] = self._scales[rows]
+            norms[start:start + len(rows)] = self._norms[rows]
+        for array in (vectors, scales, norms):
+            array.flush()
+        # Row is the primary key, so move rows through negative numbers to avoid collisions.
+        self._conn.executemany("UPDATE rows SET row = ? WHERE row = ?", [(-new - 1, old) for new, old in enumerate(order)])
+        self._conn.execute("UPDATE rows SET row = -row - 1")
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)", (str(generation),))
+        self._conn.commit()
+        old_generation = self._generation
+        self._generation = generation
+        self._vectors, self._scales, self._norms = vectors, scales, norms
+        self._alive = np.zeros(len(vectors), dtype=bool)
+        self._alive[:len(order)] = True
+        self._spans = spans
+        self._size = len(order)
+        self._ivf = {}
+        # Searches still holding the old maps keep reading the unlinked files.
+        for name in ("vectors", "scales", "norms"):
+            os.remove(self._path(name, old_generation))
+
+    def _product_rows(self, spans, alive):
+        return np.concatenate([np.arange(start, end) for start, end in spans])[
+            np.concatenate([alive[start:end] for start, end in spans])]
+
+    def _ivf_index(self, product, spans, vectors, scales, alive):
+        with self._ivf_lock:
+            index = self._ivf.get(product)
+            if index is None:
+                rows = self._product_rows(spans, alive)
+                lists = min(self.ivf_lists, len(rows))
+                rng = np.random.default_rng(0)
+                sample = np.sort(rng.choice(rows, min(len(rows), 64 * lists), replace=False))
+                centroids = kmeans(vectors[sample].astype(np.float32) * scales[sample, None], lists)
+                labels = np.concatenate([
+                    nearest_centroids(vectors[block].astype(np.float32) * scales[block, None], centroids, 1)[:, 0]
+                    for block in np.array_split(rows, max(1, len(rows) // SEARCH_BLOCK_ROWS))
+                ])
+                index = {"centroids": centroids, "lists": [rows[labels == i] for i in range(lists)]}
+                with self._lock:
+                    if self._vectors is vectors:
+                        self._ivf[product] = index
+            return index
+
+    def search(self, product, vector, k=5):
+        return self.search_many(product, [vector], k)[0]
+
+    def search_many(self, product, vectors, k=5):
+        """Top k documents for each query vector; exact searches share one pass over the product's rows."""
+        with self._lock:
+            spans = [tuple(span) for span in self._spans.get(product, ())]
+            arrays = self._vectors, self._scales, self._norms, self._alive
+        if not spans:
+            return [[] for _ in vectors]
+        queries = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        if self.ivf_lists and sum(end - start for start, end in spans) >= settings.VECTOR_IVF_MIN_ROWS:
+            index = self._ivf_index(product, spans, arrays[0], arrays[1], arrays[3])
+            ranked = []
+            for query, probes in zip(queries, nearest_centroids(queries, index["centroids"], settings.VECTOR_IVF_PROBES)):
+                rows = np.sort(np.concatenate([index["lists"][i] for i in probes]))
+                blocks = [rows[start:start + SEARCH_BLOCK_ROWS] for start in range(0, len(rows), SEARCH_BLOCK_ROWS)]
+                ranked += self._rank(blocks, arrays, query[None, :], k)
+        else:
+            blocks = [slice(block_start, min(block_start + SEARCH_BLOCK_ROWS, end))
+                      for start, end in spans for block_start in range(start, end, SEARCH_BLOCK_ROWS)]
+            ranked = self._rank(blocks, arrays, queries, k)
+        found = self._documents({row for rows in ranked for row in rows})
+        return [[found[row] for row in rows if row in found] for rows in ranked]
+
+    def _rank(self, blocks, arrays, queries, k):
+        """Rows of the k nearest live vectors for each query, nearest first."""
+        vectors, scales, norms, alive = arrays
+        best_scores = []
+        best_rows = []
+        for block in blocks:
+            rows = np.arange(block.start, block.stop) if isinstance(block, slice) else block
+            dots = dot_rows(vectors[block], queries.T) * scales[block][:, None]
+            # Larger is closer: ||q - x||^2 = ||q||^2 - (2 q.x - ||x||^2).
+            scores = np.where(alive[block][:, None], 2 * dots - norms[block][:, None], -np.inf)
+            rows = np.broadcast_to(rows[:, None], scores.shape)
+            if len(scores) > k:
+                top = np.argpartition(-scores, k, axis=0)[:k]
+                scores, rows = np.take_along_axis(scores, top, axis=0), np.take_along_axis(rows, top, axis=0)
+            best_scores.append(scores)
+            best_rows.append(rows)
+        scores = np.concatenate(best_scores)
+        rows = np.concatenate(best_rows)
+        ranked = []
+        for column in range(scores.shape[1]):
+            order = np.argsort(-scores[:, column], kind="stable")[:k]
+            order = order[np.isfinite(scores[order, column])]
+            ranked.append(rows[order, column].tolist())
+        return ranked
+
+    def _documents(self, rows):
+        """Documents by row; rows deleted since the search are left out."""
+        rows = list(rows)
+        found = {}
+        with self._lock:
+            for start in range(0, len(rows), 500):
+                batch = rows[start:start + 500]
+                found.update(
+                    (row, Document(page_content=text, metadata=json.loads(metadata), id=chunk_id))
+                    for row, chunk_id, text, metadata in self._conn.execute(
+                        f"SELECT row, id, text, metadata FROM rows WHERE row IN ({', '.join('?' for _ in batch)})", batch)
+                )
+        return found
+
+    def batches(self, include, batch_size=1000):
+        last = -1
+        while True:
+            with self._lock:
+                batch = self._conn.execute(
+                    "SELECT row, id, text, metadata FROM rows WHERE row > ? ORDER BY row LIMIT ?", (last, batch_size)
+                ).fetchall()
+                vectors, scales = self._vectors, self._scales
+            if not batch:
+                return
+            rows = [row for row, _, _, _ in batch]
+            result = {"ids": [chunk_id for _, chunk_id, _, _ in batch]}
+            if "documents" in include:
+                result["documents"] = [text for _, _, text, _ in batch]
+            if "metadatas" in include:
+                result["metadatas"] = [json.loads(metadata) for _, _, _, metadata in batch]
+            if "embeddings" in include:
+                result["embeddings"] = vectors[rows].astype(np.float32) * scales[rows, None]
+            yield result
+            last = rows[-1]
+            if len(batch) < batch_size:
+                return
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def embedding_models(self):
+        with self._lock:
+            return {model for model, in self._conn.execute("SELECT value FROM meta WHERE key = 'embedding_model'")}
+
+    def clear(self):
+        """Drops every row and the recorded dimension, quantization and model."""
+        with self._lock:
+            self._conn.execute("DELETE FROM rows")
+            self._conn.execute("DELETE FROM meta")
+            self._conn.commit()
+            self._vectors = self._scales = self._norms = None
+            self._ivf = {}
+            self.dimension = None
+            self._generation = 0
+            self._load()
+            for name in os.listdir(self.directory):
+                if name.endswith(".bin"):
+                    os.remove(os.path.join(self.directory, name))
+
+    def pending_migration(self):
+        return 0
+
+    def close(self):
+        with self._lock:
+            for array in (self._vectors, self._scales, self._norms):
+                if array is not None:
+                    array.flush()
+            self._vectors = self._scales = self._norms = None
+            self._ivf = {}
+            self._conn.close()
@@ -0,0 +1,102 @@
+"""Deterministic offline stand-ins for the OpenAI embedding and chat models.
+
+Selected with EMBEDDING_PROVIDER=fake and LLM_PROVIDER=fake, so the API
+and the benchmarks run without network access or an API key.
+"""
+import asyncio
+import hashlib
+import re
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+class LexicalEmbeddings(Embeddings):
+    """Hashed bag-of-words vectors: an offline proxy for comparing retrieval quality.
+
+    Texts that share words get similar vectors. latency seconds are added
+    per call, standing in for the API round trip.
+    """
+
+    def __init__(self, dimension=1024, latency=0.0):
+        self.dimension = dimension
+        self.model = f"lexical-{dimension}"
+        self.latency = latency
+
+    def _vector(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r"\w+", text.casefold()):
+            vector[int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=4).digest(), "little") % self.dimension] += 1
+        vector = np.log1p(vector)
+        return (vector / (np.linalg.norm(vector) or 1.0)).tolist()
+
+    def embed_documents(self, texts):
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeChatModel:
+    """Stand-in for ChatOpenAI that echoes the question back.
+
+    latency is the time to the first token; token_latency is added per
+    streamed token, so invoke() costs the same as draining stream().
+    """
+
+    def __init__(self, latency=0.0, token_latency=0.0, answer_tokens=0):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.answer_tokens = answer_tokens
+        self.calls = 0
+
+    def _tokens(self, messages):
+        question = messages[-1]["content"].rsplit("Question:", 1)[-1]
+        words = f"Answer to: {question.replace('Answer:', '').strip()}".split(" ")
+        words += ["lorem"] * max(0, self.answer_tokens - len(words))
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+    def invoke(self, messages):
+        self.calls += 1
+        tokens = self._tokens(messages)
+        delay = self.latency + self.token_latency * len(tokens)
+        if delay:
+            time.sleep(delay)
+        return AIMessage(content="".join(tokens))
+
+    def stream(self, messages):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        for token in self._tokens(messages):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield AIMessageChunk(content=token)
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        tokens = self._tokens(messages)
+        delay = self.latency + self.token_latency * len(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+        return AIMessage(content="".join(tokens))
+
+    async def astream(self, messages):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for token in self._tokens(messages):
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield AIMessageChunk(content=token)
@@ -0,0 +1,156 @@
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pypdf import PdfReader, PdfWriter
+from .config import settings
+from .assets import store_extracted_images
+
+
+TEXT_OBJECT = re.compile(rb"\bBT\b(.*?)\bET\b", re.S)
+TEXT_STRING = re.compile(rb"\((?:[^()\\]|\\.)*\)|<([0-9A-Fa-f\s]*)>")
+RECT_OPERATOR = re.compile(rb"\sre\s")
+
+def text_bytes(content):
+    # Bytes shown by text operators; far cheaper than extract_text, which decodes fonts.
+    total = 0
+    for text_object in TEXT_OBJECT.findall(content):
+        for match in TEXT_STRING.finditer(text_object):
+            total += len(match.group(1)) // 2 if match.group(1) is not None else len(match.group(0)) - 2
+    return total
+
+def scan_page(page):
+    """Measure what a page needs: its text layer, large images and ruled boxes."""
+    try:
+        contents = page.get_contents()
+        content = contents.get_data() if contents is not None else b""
+    except Exception:
+        content = b""
+
+    images = 0
+    xobjects = page.get("/Resources", {}).get("/XObject") or {}
+    for xobject in xobjects.values():
+        xobject = xobject.get_object()
+        if xobject.get("/Subtype") == "/Image" and \
+                xobject.get("/Width", 0) * xobject.get("/Height", 0) >= settings.PARTITION_MIN_IMAGE_PIXELS:
+            images += 1
+    return {"text_bytes": text_bytes(content), "images": images, "rects": len(RECT_OPERATOR.findall(content))}
+
+def page_strategy(scan):
+    # Scanned pages have no usable text layer; figures and tables need the layout model.
+    if scan["text_bytes"] < settings.PARTITION_MIN_TEXT_BYTES or scan["images"] or \
+            scan["rects"] >= settings.PARTITION_TABLE_RECTS:
+        return "hi_res"
+    return "fast"
+
+def plan_strategies(pdf_path: str, strategy: str = None):
+    """Return the partition strategy for each page of a PDF.
+
+    With "auto", pages are pre-scanned with pypdf and only those without a
+    text layer, or with large images or tables, go through hi_res.
+    """
+    strategy = strategy or settings.PARTITION_STRATEGY
+    reader = PdfReader(pdf_path)
+    if strategy != "auto":
+        return [strategy] * len(reader.pages)
+    return [page_strategy(scan_page(page)) for page in reader.pages]
+
+def strategy_windows(strategies, window: int):
+    """Split pages into windows of at most `window` pages sharing one strategy."""
+    windows = []
+    start = 0
+    for index in range(1, len(strategies) + 1):
+        if index == len(strategies) or strategies[index] != strategies[start] or index - start == window:
+            windows.append((start, index, strategies[start]))
+            start = index
+    return windows
+
+def partition_pages(pdf_path: str, first_page: int, last_page: int, page_count: int, strategy: str = "hi_res"):
+    # Imported here so API processes that only answer queries never load unstructured.
+    from unstructured.partition.pdf import partition_pdf
+
+    kwargs = dict(strategy=strategy)
+    output_dir = None
+    if strategy == "hi_res":
+        # unstructured names extracted files by page, so each window writes to its own directory
+        # and the files are then stored by content hash.
+        os.makedirs(settings.EXTRACTED_DOCS_DIR, exist_ok=True)
+        output_dir = tempfile.mkdtemp(prefix="extract-", dir=settings.EXTRACTED_DOCS_DIR)
+        kwargs.update(
+            infer_table_structure=True,
+            extract_images_in_pdf=True,
+            extract_image_block_types=["Image", "Table"],
+            extract_image_block_to_payload=False,
+            extract_image_block_output_dir=output_dir
+        )
+    try:
+        if first_page == 0 and last_page == page_count:
+            elements = partition_pdf(filename=pdf_path, **kwargs)
+        else:
+            reader = PdfReader(pdf_path)
+            writer = PdfWriter()
+            for index in range(first_page, last_page):
+                writer.add_page(reader.pages[index])
+            fd, window_path = tempfile.mkstemp(suffix=".pdf")
+            try:
+                with os.fdopen(fd, "wb") as window_file:
+                    writer.write(window_file)
+                elements = partition_pdf(filename=window_path, starting_page_number=first_page + 1, **kwargs)
+            finally:
+                os.remove(window_path)
+    except BaseException:
+        if output_dir is not None:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+    return elements if output_dir is None else store_extracted_images(elements, output_dir)
+
+def iter_partitioned_elements(pdf_path: str, executor=None, window: int = None, on_pages=None, workers: int = None,
+                              strategy: str = None, on_plan=None):
+    """Yield a PDF's elements in page order, partitioning page windows in parallel.
+
+    At most two windows per worker are in flight, so memory stays bounded by
+    the window size rather than the document length. Without an executor,
+    a temporary pool of `workers` processes is used (in-process if 1).
+    on_plan(strategies) receives the per-page strategies before partitioning
+    starts; on_pages(done) is called after each window with the pages parsed
+    so far.
+    """
+    window = window or settings.PARTITION_WINDOW_PAGES
+    workers = workers or settings.PARTITION_WORKERS
+    strategies = plan_strategies(pdf_path, strategy)
+    if on_plan is not None:
+        on_plan(strategies)
+    page_count = len(strategies)
+    windows = deque(strategy_windows(strategies, window))
+    owned = executor is None and len(windows) > 1 and workers > 1
+    if owned:
+        executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    pending = deque()
+
+    try:
+        if executor is None:
+            for first_page, last_page, window_strategy in windows:
+                yield from partition_pages(pdf_path, first_page, last_page, page_count, window_strategy)
+                if on_pages is not None:
+                    on_pages(last_page)
+            return
+
+        max_pending = 2 * getattr(executor, "_max_workers", 1)
+        while windows or pending:
+            while windows and len(pending) < max_pending:
+                first_page, last_page, window_strategy = windows.popleft()
+                pending.append((last_page, executor.submit(
+                    partition_pages, pdf_path, first_page, last_page, page_count, window_strategy
+                )))
+            last_page, future = pending.popleft()
+            yield from future.result()
+            if on_pages is not None:
+                on_pages(last_page)
+    finally:
+        for _, future in pending:
+            future.cancel()
+        if owned:
+            executor.shutdown(cancel_futures=True)
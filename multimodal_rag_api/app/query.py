@@ -0,0 +1,251 @@
+import asyncio
+import time
+from langchain_core.documents import Document
+from .config import settings
+from .chunking import get_tokenizer
+from .context import context_budget, count_tokens
+from .metrics import metrics, record_stage, stage
+from .reranking import rerank
+
+# Shares of the context budget above which the answer should be detailed, or focused rather than brief.
+# With the default budget of 2000 tokens they are about 1000 and 300 characters of context.
+DETAILED_ANSWER_SHARE = 1 / 8
+FOCUSED_ANSWER_SHARE = 1 / 25
+
+def retrieve(resources, product: str, question_vector, k: int = 5):
+    return resources.vectorstores.search(product, question_vector, k)
+
+async def aembed_question(resources, question: str):
+    with stage("embed"):
+        async with resources.embedding_slots:
+            return await resources.embeddings.aembed_query(question)
+
+async def aretrieve(resources, product: str, question_vector, k: int = 5):
+    # Chroma is an in-process SQLite/HNSW store with no async API.
+    with stage("vector_search"):
+        async with resources.search_slots:
+            return await asyncio.to_thread(retrieve, resources, product, question_vector, k)
+
+async def aretrieve_many(resources, product: str, question_vectors, k: int = 5):
+    with stage("vector_search"):
+        async with resources.search_slots:
+            return await asyncio.to_thread(resources.vectorstores.search_many, product, question_vectors, k)
+
+async def akeyword_search(resources, product: str, question: str, k: int = 5):
+    with stage("keyword_search"):
+        async with resources.search_slots:
+            return await asyncio.to_thread(resources.keyword_index.search, product, question, k)
+
+async def akeyword_search_many(resources, product: str, questions, k: int = 5):
+    with stage("keyword_search"):
+        async with resources.search_slots:
+            return await asyncio.to_thread(lambda: [resources.keyword_index.search(product, question, k) for question in questions])
+
+async def aexact_match(resources, product: str, question: str, k: int = 5):
+    """Chunks for a lookup of exact terms (part numbers, quoted phrases), found without embedding the question.
+
+    The tables and figures on their pages are merged in as the asset lane.
+    Returns None when the question is not such a lookup or nothing matches every term.
+    """
+    if not settings.KEYWORD_EXACT_MATCH:
+        return None
+    with stage("exact_match"):
+        async with resources.search_slots:
+            docs = await asyncio.to_thread(resources.keyword_index.exact_search, product, question, k)
+    if not docs:
+        return None
+    return merge_lanes(docs, await apage_assets(resources, product, docs))
+
+def reciprocal_rank_fusion(rankings, weights, k: int = 5, rrf_k: int = None):
+    rrf_k = rrf_k or settings.HYBRID_RRF_K
+    scores = {}
+    docs = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking, 1):
+            key = doc.id or doc.page_content
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)[:k]]
+
+async def aasset_search(resources, product: str, question_vector, k: int = None):
+    """Tables and figures (see app.assets) closest to the question."""
+    asset_store = resources.asset_store
+    if asset_store is None or question_vector is None:
+        return []
+    with stage("asset_search"):
+        async with resources.search_slots:
+            return await asyncio.to_thread(asset_store.search, product, question_vector, k or settings.MULTIMODAL_TOP_K)
+
+async def aasset_search_many(resources, product: str, question_vectors, k: int = None):
+    asset_store = resources.asset_store
+    if asset_store is None:
+        return [[] for _ in question_vectors]
+    with stage("asset_search"):
+        async with resources.search_slots:
+            return await asyncio.to_thread(asset_store.search_many, product, question_vectors,
+                                           k or settings.MULTIMODAL_TOP_K)
+
+def page_assets(asset_store, product: str, docs, k: int):
+    """Stored tables and figures on the pages of docs, in the order of the first doc covering each."""
+    stored = {}
+    found = {}
+    for doc in docs:
+        document = doc.metadata.get("document")
+        if document not in stored:
+            stored[document] = asset_store.document_chunks(product, document)
+        first, last = doc.metadata.get("page_start"), doc.metadata.get("page_end")
+        if first is None:
+            continue
+        assets = stored[document]
+        for asset_id, text, metadata in zip(assets["ids"], assets["documents"], assets["metadatas"]):
+            metadata = metadata or {}
+            page = metadata.get("page_start")
+            if asset_id not in found and page is not None and first <= page <= (last or first):
+                found[asset_id] = Document(page_content=text, metadata=metadata, id=asset_id)
+    return list(found.values())[:k]
+
+async def apage_assets(resources, product: str, docs, k: int = None):
+    """The asset lane for chunks found without a question vector (see aexact_match)."""
+    asset_store = resources.asset_store
+    if asset_store is None:
+        return []
+    with stage("asset_search"):
+        async with resources.search_slots:
+            return await asyncio.to_thread(page_assets, asset_store, product, docs, k or settings.MULTIMODAL_TOP_K)
+
+def merge_lanes(text_docs, asset_docs):
+    """The text lane's chunks and the asset lane's tables and figures, interleaved by rank.
+
+    Assets are added to the text results rather than taking their places.
+    """
+    if not asset_docs:
+        return text_docs
+    return reciprocal_rank_fusion([text_docs, asset_docs], [1.0, settings.MULTIMODAL_WEIGHT],
+                                  len(text_docs) + len(asset_docs))
+
+async def ahybrid_retrieve(resources, product: str, question: str, question_vector, k: int = 5):
+    """Dense and BM25 results fused by weighted reciprocal rank, plus the asset lane's matches."""
+    candidates = max(k, settings.HYBRID_CANDIDATES)
+    weights = [settings.HYBRID_DENSE_WEIGHT, settings.HYBRID_KEYWORD_WEIGHT]
+    with stage("retrieve"):
+        *rankings, assets = await asyncio.gather(
+            aretrieve(resources, product, question_vector, candidates) if weights[0] > 0 else asyncio.sleep(0, []),
+            akeyword_search(resources, product, question, candidates) if weights[1] > 0 else asyncio.sleep(0, []),
+            aasset_search(resources, product, question_vector)
+        )
+        return merge_lanes(reciprocal_rank_fusion(rankings, weights, k), assets)
+
+async def ahybrid_retrieve_many(resources, product: str, questions, question_vectors, k: int = 5):
+    """ahybrid_retrieve for several questions about one product, with one vector search for all of them."""
+    candidates = max(k, settings.HYBRID_CANDIDATES)
+    weights = [settings.HYBRID_DENSE_WEIGHT, settings.HYBRID_KEYWORD_WEIGHT]
+    empty = [[] for _ in questions]
+    with stage("retrieve"):
+        dense, keyword, assets = await asyncio.gather(
+            aretrieve_many(resources, product, question_vectors, candidates) if weights[0] > 0 else asyncio.sleep(0, empty),
+            akeyword_search_many(resources, product, questions, candidates) if weights[1] > 0 else asyncio.sleep(0, empty),
+            aasset_search_many(resources, product, question_vectors)
+        )
+        return [merge_lanes(reciprocal_rank_fusion(rankings, weights, k), found)
+                for *rankings, found in zip(dense, keyword, assets)]
+
+def rerank_enabled(requested=None):
+    return settings.RERANK_BY_DEFAULT if requested is None else requested
+
+def candidate_count(reranking: bool, k: int = 5):
+    return max(k, settings.RERANK_CANDIDATES) if reranking else k
+
+async def arerank(resources, question: str, docs, top_k: int = None):
+    """Best top_k of the over-fetched candidates, and the milliseconds spent reranking."""
+    top_k = top_k or settings.RERANK_TOP_K
+    started = time.perf_counter()
+    # The reranker is CPU-bound; a few slots keep it from starving the event loop's other work.
+    async with resources.rerank_slots:
+        docs = await asyncio.to_thread(rerank, resources.reranker, question, docs, top_k)
+    elapsed = time.perf_counter() - started
+    record_stage("rerank", elapsed)
+    return docs, elapsed * 1000
+
+def record_tokens(messages, answer: str, usage=None):
+    """Adds a call's tokens to rag_llm_tokens_total, from the model's usage report or else the chunk tokenizer."""
+    if not metrics.enabled:
+        return
+    if usage:
+        prompt_tokens, answer_tokens = usage["input_tokens"], usage["output_tokens"]
+    else:
+        tokenizer = get_tokenizer()
+        prompt_tokens = sum(len(tokenizer.encode(message["content"])) for message in messages)
+        answer_tokens = len(tokenizer.encode(answer))
+    metrics.inc("rag_llm_tokens_total", prompt_tokens, direction="input")
+    metrics.inc("rag_llm_tokens_total", answer_tokens, direction="output")
+
+async def agenerate(resources, messages):
+    with stage("llm"):
+        async with resources.llm_slots:
+            message = await resources.llm.ainvoke(messages)
+    text = message_text(message)
+    record_tokens(messages, text, getattr(message, "usage_metadata", None))
+    return text
+
+async def astream_answer(resources, messages):
+    started = time.perf_counter()
+    parts = []
+    usage = None
+    async with resources.llm_slots:
+        async for chunk in resources.llm.astream(messages):
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            text = message_text(chunk)
+            if text:
+                if not parts:
+                    record_stage("llm_first_token", time.perf_counter() - started)
+                parts.append(text)
+                yield text
+    record_stage("llm", time.perf_counter() - started)
+    record_tokens(messages, "".join(parts), usage)
+
+def build_messages(context_text: str, question: str, context_tokens: int = None, model: str = None):
+    """Chat messages for the question; the answer asked for is longer the more of the context budget is filled.
+
+    context_tokens is counted from context_text when not given (build_context reports it).
+    """
+    if context_tokens is None:
+        context_tokens = count_tokens(context_text, model)
+    budget = context_budget(model)
+
+    if context_tokens > budget * DETAILED_ANSWER_SHARE:
+        system_prompt = """You are a helpful assistant that answers questions based on the provided context.
+
+        Instructions:
+        - Give comprehensive and detailed answers when you have sufficient information
+        - Include specific details, examples, and elaborations from the context
+        - Structure your response clearly with relevant points
+        - Use only information from the provided context"""
+    elif context_tokens > budget * FOCUSED_ANSWER_SHARE:
+        system_prompt = """You are a helpful assistant that answers questions based on the provided context.
+
+        Instructions:
+        - Provide clear and informative answers using the available context
+        - Include key details but keep responses focused
+        - Use only information from the provided context"""
+    else:
+        system_prompt = """You are a helpful assistant that answers questions based on the provided context.
+
+        Instructions:
+        - Give concise, direct answers based on the limited information available
+        - If context is insufficient for a detailed answer, provide what you can briefly
+        - Use only information from the provided context"""
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"Context:\n{context_text}\n\nQuestion: {question}\n\nAnswer:"}
+    ]
+
+def source_metadata(docs):
+    return [
+        {key: doc.metadata.get(key) for key in ("product", "document", "chunk_id", "section", "page_start", "page_end",
+                                                  "kind", "image_path")}
+        for doc in docs
+    ]
+
+def message_text(message):
+    return message.content if isinstance(message.content, str) else str(message.content)
@@ -1,41 +1,228 @@
+import hashlib
+import time
 from .config import settings
-from unstructured.partition.pdf import partition_pdf
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
-
-def store_document_in_vector_db(pdf_path: str, product: str, document: str, persist_directory: str = "./chroma_db"):
-    elements = partition_pdf(
-        filename=pdf_path,
-        strategy="hi_res",
-        extract_images_in_pdf=True,
-        extract_image_block_types=["Image", "Table"],
-        extract_image_block_to_payload=False,
-        extract_image_block_output_dir=settings.EXTRACTED_DOCS_DIR
-    )
-    texts = []
-    current_chunk = ""
-    
-    for el in elements:
-        text = str(el).strip()
-        if len(text) < 10:
-            continue
-            
-        current_chunk += text + " "
-        
-        if len(current_chunk) > 500 or text.endswith('.') and len(current_chunk) > 200:
-            if current_chunk.strip():
-                texts.append(current_chunk.strip())
-            current_chunk = ""
-    
-    if current_chunk.strip():
-        texts.append(current_chunk.strip())
-    
-    texts = [t for t in texts if len(t) > 50]
-    vectorstore = Chroma(
-        collection_name="mm_rag",
-        embedding_function=OpenAIEmbeddings(),
-        persist_directory=persist_directory
-    )
-    metadatas = [{"product": product, "document": document, "chunk_id": i} for i in range(len(texts))]
-    vectorstore.add_texts(texts, metadatas=metadatas)
-    return len(texts) 
\ No newline at end of file
+from .assets import AssetCollector, asset_collection_name
+from .catalog import ProductCatalog
+from .chunking import chunk_elements
+from .embedding import BatchEmbedder, load_embeddings
+from .keyword_index import KeywordIndex
+from .metrics import INGEST_STAGES, TimedIterator, metrics, stage
+from .partitioning import iter_partitioned_elements
+from .vector_routing import open_vector_store
+
+# Rows per vector store write, below Chroma's maximum batch size.
+UPSERT_BATCH_SIZE = 1000
+
+def file_hash(path: str):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_ids(chunks, product: str, document: str):
+    # Content-addressed, so re-ingesting an edited file keeps the ids of unchanged chunks.
+    ids = []
+    seen = {}
+    for chunk in chunks:
+        content_hash = hashlib.sha256(chunk["text"].encode("utf-8")).hexdigest()
+        occurrence = seen[content_hash] = seen.get(content_hash, -1) + 1
+        ids.append(hashlib.sha256(f"{product}\0{document}\0{content_hash}\0{occurrence}".encode("utf-8")).hexdigest())
+    return ids
+
+def chunk_document(elements, collect_assets=None):
+    """Chunks of a document's elements, and its tables and figures (None unless collect_assets).
+
+    Elements are usually partitioned as they are consumed, so the time
+    spent waiting for them is recorded as partitioning and the rest as
+    chunking.
+    """
+    collect_assets = settings.MULTIMODAL_INDEXING if collect_assets is None else collect_assets
+    elements = TimedIterator(elements)
+    started = time.perf_counter()
+    collector = AssetCollector()
+    chunks = chunk_elements(collector.watch(elements) if collect_assets else elements)
+    assets = collector.chunks(chunks) if collect_assets else None
+    metrics.observe(INGEST_STAGES, elements.seconds, stage="partition")
+    metrics.observe(INGEST_STAGES, time.perf_counter() - started - elements.seconds, stage="chunk")
+    return chunks, assets
+
+def plan_vectors(chunks, product: str, document: str, vectorstores):
+    """Which of a document's chunks are new, kept or stale in one vector store.
+
+    Chunks already stored keep their vectors and only get fresh metadata,
+    new chunks need a vector and stored chunks no longer in the document
+    are deleted.
+    """
+    ids = chunk_ids(chunks, product, document)
+    stored = vectorstores.stored_ids(product, document)
+    metadatas = [
+        {**chunk["metadata"], "product": product, "document": document, "chunk_id": i}
+        for i, chunk in enumerate(chunks)
+    ]
+    return {
+        "product": product, "chunks": chunks, "ids": ids, "metadatas": metadatas,
+        "new": [i for i, chunk_id in enumerate(ids) if chunk_id not in stored],
+        "kept": [i for i, chunk_id in enumerate(ids) if chunk_id in stored],
+        "stale": list(stored.difference(ids))
+    }
+
+def embed_missing(plans, embedder, vectors=None):
+    """`vectors` (keyed by chunk id) plus those of every new chunk of `plans`, embedded in one batched call."""
+    vectors = dict(vectors or {})
+    missing = {}
+    for plan in plans:
+        for i in plan["new"]:
+            if plan["ids"][i] not in vectors:
+                missing[plan["ids"][i]] = plan["chunks"][i]["text"]
+    if missing:
+        with stage("embed", INGEST_STAGES):
+            vectors.update(zip(missing, embedder.embed(list(missing.values()))))
+    return vectors
+
+def apply_vectors(plans, vectorstores, vectors, batch_size=UPSERT_BATCH_SIZE):
+    """Writes planned changes with one call per product and operation (per batch_size rows)."""
+    products = {}
+    for plan in plans:
+        products.setdefault(plan["product"], []).append(plan)
+    with stage("store", INGEST_STAGES):
+        for product, group in products.items():
+            new = [(plan, i) for plan in group for i in plan["new"]]
+            for start in range(0, len(new), batch_size):
+                rows = new[start:start + batch_size]
+                vectorstores.upsert(
+                    product,
+                    ids=[plan["ids"][i] for plan, i in rows],
+                    embeddings=[vectors[plan["ids"][i]] for plan, i in rows],
+                    documents=[plan["chunks"][i]["text"] for plan, i in rows],
+                    metadatas=[plan["metadatas"][i] for plan, i in rows]
+                )
+            kept = [(plan, i) for plan in group for i in plan["kept"]]
+            for start in range(0, len(kept), batch_size):
+                rows = kept[start:start + batch_size]
+                vectorstores.update_metadata(product, [plan["ids"][i] for plan, i in rows],
+                                             [plan["metadatas"][i] for plan, i in rows])
+            stale = [chunk_id for plan in group for chunk_id in plan["stale"]]
+            if stale:
+                vectorstores.delete(product, stale)
+    return [{"added": len(plan["new"]), "reused": len(plan["kept"]), "deleted": len(plan["stale"])} for plan in plans]
+
+def sync_documents(documents, vectorstores, catalog, embedder, vectors=None, keyword_index=None, asset_store=None):
+    """sync_document for several documents at once, each a dict of product, document, chunks and
+    optionally assets and file_hash.
+
+    New chunks of all of them are embedded in one batched call and written
+    with one call per product to each store, the keyword index and the
+    catalog. Returns the result of each document.
+    """
+    plans = [plan_vectors(d["chunks"], d["product"], d["document"], vectorstores) for d in documents]
+    asset_plans = [
+        plan_vectors(d["assets"], d["product"], d["document"], asset_store)
+        if asset_store is not None and d.get("assets") is not None else None
+        for d in documents
+    ]
+    # Tables and figures are embedded in the same batched calls as the text.
+    vectors = embed_missing(plans + [plan for plan in asset_plans if plan], embedder, vectors)
+    results = apply_vectors(plans, vectorstores, vectors)
+    asset_results = iter(apply_vectors([plan for plan in asset_plans if plan], asset_store, vectors)
+                         if asset_store is not None else [])
+    for result, asset_plan in zip(results, asset_plans):
+        lanes = {"text": result}
+        if asset_plan is not None:
+            result["assets"] = lanes["assets"] = next(asset_results)
+        for lane, counts in lanes.items():
+            for operation in ("added", "reused", "deleted"):
+                metrics.inc("rag_chunks_total", counts[operation], lane=lane, operation=operation)
+    if keyword_index is not None:
+        with stage("keyword_index", INGEST_STAGES):
+            keyword_index.upsert_many([(d["product"], d["document"], plan["ids"], [chunk["text"] for chunk in d["chunks"]],
+                                        plan["metadatas"]) for d, plan in zip(documents, plans)])
+            for plan in plans:
+                if plan["stale"]:
+                    keyword_index.delete(plan["product"], plan["stale"])
+    stored = [(d["product"], d["document"], len(d["chunks"]), d.get("file_hash")) for d in documents if d["chunks"]]
+    versions = iter(catalog.set_documents(stored))
+    for d, result in zip(documents, results):
+        if d["chunks"]:
+            result["version"] = next(versions)
+        else:
+            catalog.remove_document(d["product"], d["document"])
+            result["version"] = 0
+    return results
+
+def sync_document(chunks, product: str, document: str, vectorstores, catalog, embedder, vectors=None, file_hash=None,
+                  keyword_index=None, assets=None, asset_store=None):
+    """Make a document's stored chunks exactly `chunks`, and its tables and figures `assets` when given.
+
+    Only text chunks go to the keyword index and count in the catalog;
+    assets live in their own store (see app.assets).
+    """
+    return sync_documents([{"product": product, "document": document, "chunks": chunks, "assets": assets,
+                            "file_hash": file_hash}], vectorstores, catalog, embedder, vectors, keyword_index,
+                          asset_store)[0]
+
+def stored_chunks(vectorstores, source_product: str, source_document: str, product: str, document: str):
+    """A stored document's chunks in their original order, and their vectors keyed by chunk id under `product`/`document`."""
+    stored = vectorstores.document_chunks(source_product, source_document)
+    rows = sorted(zip(stored["metadatas"], stored["documents"], stored["embeddings"]), key=lambda row: row[0]["chunk_id"])
+    chunks = [
+        {"text": text, "metadata": {key: value for key, value in metadata.items()
+                                    if key not in ("product", "document", "chunk_id")}}
+        for metadata, text, _ in rows
+    ]
+    return chunks, dict(zip(chunk_ids(chunks, product, document), (vector for _, _, vector in rows)))
+
+def copy_document(source_product: str, source_document: str, product: str, document: str, vectorstores, catalog, embedder,
+                  file_hash=None, keyword_index=None, asset_store=None):
+    """Store an already ingested copy of the same file as `product`/`document`, reusing its chunks and vectors.
+
+    Returns None, without writing anything, if the source has no stored chunks.
+    """
+    chunks, vectors = stored_chunks(vectorstores, source_product, source_document, product, document)
+    if not chunks:
+        return None
+    assets = None
+    if asset_store is not None:
+        assets, asset_vectors = stored_chunks(asset_store, source_product, source_document, product, document)
+        vectors.update(asset_vectors)
+    result = sync_document(chunks, product, document, vectorstores, catalog, embedder, vectors, file_hash,
+                           keyword_index, assets, asset_store)
+    result["chunks"] = len(chunks)
+    result["assets_stored"] = len(assets or ())
+    return result
+
+def delete_document(product: str, document: str, vectorstores, catalog, keyword_index=None, asset_store=None):
+    vectorstores.delete_document(product, document)
+    if asset_store is not None:
+        asset_store.delete_document(product, document)
+    if keyword_index is not None:
+        keyword_index.delete_document(product, document)
+    return catalog.remove_document(product, document)
+
+def delete_product(product: str, vectorstores, catalog, keyword_index=None, asset_store=None):
+    vectorstores.delete_product(product)
+    if asset_store is not None:
+        asset_store.delete_product(product)
+    if keyword_index is not None:
+        keyword_index.delete_product(product)
+    return catalog.remove_product(product)
+
+def store_document_in_vector_db(pdf_path: str, product: str, document: str, persist_directory: str = settings.CHROMA_DIR, vectorstores=None, catalog=None, embedder=None, keyword_index=None, asset_store=None):
+    if catalog is None:
+        catalog = ProductCatalog.for_directory(persist_directory)
+    digest = file_hash(pdf_path)
+    stored_hash, version = catalog.version(product, document)
+    if digest == stored_hash:
+        return {"added": 0, "reused": catalog.chunk_count(product, document), "deleted": 0, "version": version}
+
+    chunks, assets = chunk_document(iter_partitioned_elements(pdf_path))
+    if vectorstores is None:
+        vectorstores = open_vector_store(persist_directory, load_embeddings())
+    if embedder is None:
+        embedder = BatchEmbedder(vectorstores.embeddings)
+    if keyword_index is None:
+        keyword_index = KeywordIndex.for_directory(persist_directory)
+    if asset_store is None and assets is not None:
+        asset_store = open_vector_store(persist_directory, vectorstores.embeddings, name=asset_collection_name())
+    return sync_document(chunks, product, document, vectorstores, catalog, embedder, file_hash=digest,
+                         keyword_index=keyword_index, assets=assets, asset_store=asset_store)
@@ -0,0 +1,92 @@
+import math
+import os
+from .config import settings
+from .keyword_index import tokenize
+
+
+class LexicalReranker:
+    """Scores candidates by the idf-weighted share of question terms they contain.
+
+    idf is taken over the candidate set, so terms every candidate shares
+    count for little; matching question bigrams add a small bonus.
+    """
+
+    name = "lexical"
+
+    def score(self, question, texts):
+        question_tokens = tokenize(question)
+        terms = set(question_tokens)
+        bigrams = set(zip(question_tokens, question_tokens[1:]))
+        documents = [tokenize(text) for text in texts]
+        token_sets = [set(tokens) for tokens in documents]
+        idf = {
+            term: math.log(1 + len(texts) / (1 + sum(term in tokens for tokens in token_sets)))
+            for term in terms
+        }
+        total = sum(idf.values()) or 1.0
+        scores = []
+        for tokens, token_set in zip(documents, token_sets):
+            coverage = sum(weight for term, weight in idf.items() if term in token_set) / total
+            bonus = len(bigrams & set(zip(tokens, tokens[1:]))) / len(bigrams) if bigrams else 0.0
+            scores.append(coverage + 0.25 * bonus)
+        return scores
+
+
+class OnnxCrossEncoder:
+    """A cross-encoder exported to ONNX, e.g. ms-marco-MiniLM-L-6-v2.
+
+    model_dir holds model.onnx and the Hugging Face tokenizer.json.
+    Pairs are scored batch_size at a time on the CPU.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_dir, batch_size=None, max_length=512):
+        # Optional dependencies: only needed when RERANKER=onnx.
+        import numpy as np
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self._np = np
+        self.batch_size = batch_size or settings.RERANK_BATCH_SIZE
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = settings.RERANK_THREADS
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, "model.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self.inputs = {model_input.name for model_input in self.session.get_inputs()}
+
+    def score(self, question, texts):
+        np = self._np
+        scores = []
+        for start in range(0, len(texts), self.batch_size):
+            encodings = self.tokenizer.encode_batch([(question, text) for text in texts[start:start + self.batch_size]])
+            feed = {
+                "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+                "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+                "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+            }
+            logits = self.session.run(None, {name: value for name, value in feed.items() if name in self.inputs})[0]
+            logits = logits.reshape(len(encodings), -1)
+            scores.extend(logits[:, -1].tolist())
+        return scores
+
+
+def load_reranker():
+    if settings.RERANKER == "onnx":
+        try:
+            return OnnxCrossEncoder(settings.RERANK_MODEL_DIR)
+        except Exception as e:
+            print(f"WARNING: ONNX reranker unavailable ({e}); falling back to lexical reranking.")
+    return LexicalReranker()
+
+def rerank(reranker, question, docs, top_k):
+    if not docs:
+        return docs
+    scores = reranker.score(question, [doc.page_content for doc in docs])
+    # Ties keep retrieval order.
+    order = sorted(range(len(docs)), key=lambda index: (-scores[index], index))
+    return [docs[index] for index in order[:top_k]]
@@ -0,0 +1,235 @@
+import asyncio
+import os
+import threading
+import httpx
+from fastapi import Request
+from langchain_openai import ChatOpenAI
+from .config import settings
+from .catalog import ProductCatalog
+from .embedding import BatchEmbedder, load_embeddings
+from .embedding_cache import EmbeddingCache, CachedEmbeddings
+from .answer_cache import AnswerCache
+from .assets import asset_collection_name
+from .keyword_index import KeywordIndex
+from .metrics import stage
+from .reranking import load_reranker
+from .vector_routing import has_stored_vectors, open_vector_store
+from .jobs import JobStore, IngestionQueue
+
+LLM_PROVIDERS = ("openai", "fake")
+
+
+def configured_embeddings(resources):
+    # Only the OpenAI client needs the pooled HTTP clients.
+    if settings.EMBEDDING_PROVIDER != "openai":
+        return load_embeddings()
+    return load_embeddings(
+        http_client=resources.http_client,
+        http_async_client=resources.http_async_client
+    )
+
+def openai_llm(resources):
+    return ChatOpenAI(
+        model=settings.LLM_MODEL,
+        # Streamed answers end with a usage chunk, so token counts need no estimate.
+        stream_usage=True,
+        http_client=resources.http_client,
+        http_async_client=resources.http_async_client
+    )
+
+def configured_llm(resources):
+    if settings.LLM_PROVIDER not in LLM_PROVIDERS:
+        raise ValueError(f"LLM_PROVIDER must be one of {LLM_PROVIDERS}, got '{settings.LLM_PROVIDER}'")
+    if settings.LLM_PROVIDER == "fake":
+        from .offline import FakeChatModel
+        return FakeChatModel(settings.FAKE_LLM_LATENCY, settings.FAKE_LLM_TOKEN_LATENCY, settings.FAKE_LLM_ANSWER_TOKENS)
+    return openai_llm(resources)
+
+
+class ResourceRegistry:
+    """Process-wide handles shared by every request.
+
+    Handles are built lazily on first use and then reused, so the app can
+    start without an API key and the Chroma persistence is opened once.
+    """
+
+    def __init__(self, persist_directory=None, embeddings_factory=configured_embeddings, llm_factory=configured_llm):
+        self.persist_directory = persist_directory or settings.CHROMA_DIR
+        self._embeddings_factory = embeddings_factory
+        self._llm_factory = llm_factory
+        self._lock = threading.RLock()
+        self._http_client = None
+        self._http_async_client = None
+        self._embeddings = None
+        self._embedding_cache = None
+        self._llm = None
+        self._vectorstores = None
+        self._asset_store = None
+        self._catalog = None
+        self._keyword_index = None
+        self._reranker = None
+        self._answer_cache = AnswerCache()
+        self.embedding_slots = asyncio.Semaphore(settings.QUERY_EMBED_CONCURRENCY)
+        self.search_slots = asyncio.Semaphore(settings.VECTOR_SEARCH_CONCURRENCY)
+        self.llm_slots = asyncio.Semaphore(settings.LLM_CONCURRENCY)
+        self.rerank_slots = asyncio.Semaphore(settings.RERANK_CONCURRENCY)
+        self._jobs = None
+
+    def _limits(self):
+        return httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE
+        )
+
+    @property
+    def http_client(self):
+        if self._http_client is None:
+            with self._lock:
+                if self._http_client is None:
+                    self._http_client = httpx.Client(limits=self._limits(), timeout=settings.HTTP_TIMEOUT)
+        return self._http_client
+
+    @property
+    def http_async_client(self):
+        if self._http_async_client is None:
+            with self._lock:
+                if self._http_async_client is None:
+                    self._http_async_client = httpx.AsyncClient(limits=self._limits(), timeout=settings.HTTP_TIMEOUT)
+        return self._http_async_client
+
+    @property
+    def embedding_cache(self):
+        if self._embedding_cache is None:
+            with self._lock:
+                if self._embedding_cache is None:
+                    path = settings.EMBED_CACHE_PATH or os.path.join(self.persist_directory, "embedding_cache.sqlite3")
+                    self._embedding_cache = EmbeddingCache(path)
+        return self._embedding_cache
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    client = self._embeddings_factory(self)
+                    model = getattr(client, "model", None) or type(client).__name__
+                    self._embeddings = CachedEmbeddings(BatchEmbedder(client), self.embedding_cache, model)
+        return self._embeddings
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    self._llm = self._llm_factory(self)
+        return self._llm
+
+    @property
+    def vectorstores(self):
+        if self._vectorstores is None:
+            with self._lock:
+                if self._vectorstores is None:
+                    with stage("vector_store_open"):
+                        vectorstores = open_vector_store(self.persist_directory, self.embeddings)
+                    pending = vectorstores.pending_migration()
+                    if pending:
+                        print(f"WARNING: {pending} chunks are stored outside the COLLECTION_SHARDING={vectorstores.sharding} "
+                              f"layout and will not be searched. Run: python -m app.cli migrate-collections --to {vectorstores.sharding}")
+                    stale = vectorstores.embedding_models() - {self.embeddings.model}
+                    if stale:
+                        print(f"WARNING: stored vectors were embedded with {', '.join(sorted(stale))}, not "
+                              f"{self.embeddings.model}; searches will not match them. Run: python -m app.cli re-embed")
+                    self._vectorstores = vectorstores
+        return self._vectorstores
+
+    @property
+    def asset_store(self):
+        """Vector store of the tables and figures lane, or None with MULTIMODAL_INDEXING off."""
+        if not settings.MULTIMODAL_INDEXING:
+            return None
+        if self._asset_store is None:
+            with self._lock:
+                if self._asset_store is None:
+                    self._asset_store = open_vector_store(self.persist_directory, self.embeddings,
+                                                          name=asset_collection_name())
+        return self._asset_store
+
+    @property
+    def catalog(self):
+        if self._catalog is None:
+            with self._lock:
+                if self._catalog is None:
+                    catalog = ProductCatalog.for_directory(self.persist_directory)
+                    catalog.subscribe(self.answer_cache.invalidate)
+                    if catalog.is_empty() and has_stored_vectors(self.persist_directory):
+                        catalog.rebuild_from_vectorstore(self.vectorstores)
+                    self._catalog = catalog
+        return self._catalog
+
+    @property
+    def keyword_index(self):
+        if self._keyword_index is None:
+            with self._lock:
+                if self._keyword_index is None:
+                    keyword_index = KeywordIndex.for_directory(self.persist_directory)
+                    if keyword_index.is_empty() and not self.catalog.is_empty():
+                        keyword_index.rebuild_from_vectorstore(self.vectorstores)
+                    self._keyword_index = keyword_index
+        return self._keyword_index
+
+    @property
+    def reranker(self):
+        if self._reranker is None:
+            with self._lock:
+                if self._reranker is None:
+                    self._reranker = load_reranker()
+        return self._reranker
+
+    @property
+    def answer_cache(self):
+        return self._answer_cache
+
+    @property
+    def jobs(self):
+        if self._jobs is None:
+            with self._lock:
+                if self._jobs is None:
+                    self._jobs = IngestionQueue(JobStore(settings.JOBS_DB), self)
+        return self._jobs
+
+    def close(self):
+        with self._lock:
+            if self._jobs is not None:
+                self._jobs.shutdown()
+                self._jobs = None
+            if self._catalog is not None:
+                self._catalog.close()
+                self._catalog = None
+            if self._keyword_index is not None:
+                self._keyword_index.close()
+                self._keyword_index = None
+            if self._vectorstores is not None:
+                self._vectorstores.close()
+                self._vectorstores = None
+            if self._asset_store is not None:
+                self._asset_store.close()
+                self._asset_store = None
+            self._embeddings = None
+            if self._embedding_cache is not None:
+                self._embedding_cache.close()
+                self._embedding_cache = None
+            self._llm = None
+            self._reranker = None
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+
+    async def aclose(self):
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+            self._http_async_client = None
+        self.close()
+
+
+def get_resources(request: Request) -> ResourceRegistry:
+    return request.app.state.resources
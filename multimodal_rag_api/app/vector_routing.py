@@ -0,0 +1,260 @@
+import hashlib
+import os
+import threading
+import chromadb
+from chromadb.errors import NotFoundError
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from .config import settings
+
+SHARDING_MODES = ("global", "product")
+VECTOR_BACKENDS = ("chroma", "numpy")
+
+
+def shard_prefix(name=None):
+    return f"{name or settings.COLLECTION_NAME}-p-"
+
+def collection_name(product, sharding=None, name=None):
+    if (sharding or settings.COLLECTION_SHARDING) != "product":
+        return name or settings.COLLECTION_NAME
+    return shard_prefix(name) + hashlib.sha256(product.encode("utf-8")).hexdigest()[:32]
+
+def stored_batches(source, include, batch_size=1000):
+    """Pages of stored chunks from a vector store backend, or a single Chroma store or collection."""
+    if hasattr(source, "batches"):
+        yield from source.batches(include, batch_size)
+        return
+    offset = 0
+    while True:
+        batch = source.get(include=include, limit=batch_size, offset=offset)
+        yield batch
+        if len(batch["ids"]) < batch_size:
+            break
+        offset += batch_size
+
+def has_stored_vectors(persist_directory, backend=None):
+    marker = "numpy_store" if (backend or settings.VECTOR_BACKEND) == "numpy" else "chroma.sqlite3"
+    return os.path.exists(os.path.join(persist_directory, marker))
+
+def open_vector_store(persist_directory, embeddings=None, backend=None, name=None, embedding_model=None):
+    backend = backend or settings.VECTOR_BACKEND
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"VECTOR_BACKEND must be one of {VECTOR_BACKENDS}, got '{backend}'")
+    if backend == "numpy":
+        from .numpy_store import NumpyVectorStore
+        return NumpyVectorStore(persist_directory, embeddings, embedding_model=embedding_model, name=name)
+    return VectorStoreRouter(persist_directory, embeddings, name=name, embedding_model=embedding_model)
+
+
+class VectorStoreRouter:
+    """Chroma backend: maps a product to the Chroma collection that holds its chunks.
+
+    Ingestion and queries only use the backend methods (search,
+    search_many, stored_ids, upsert, update_metadata, delete,
+    delete_document, delete_product, batches, count, clear,
+    embedding_models, close), which NumpyVectorStore implements as well.
+
+    With COLLECTION_SHARDING=product every product has its own collection,
+    named by a hash of the product (the product itself is kept in the
+    collection metadata), so a search only walks that product's HNSW graph
+    and dropping a product drops its collection. With "global" all
+    products share COLLECTION_NAME and are told apart by a metadata filter.
+
+    Collections record the embedding model they are created for
+    (embedding_model, by default the model of `embeddings`) in their
+    metadata.
+    """
+
+    def __init__(self, persist_directory, embeddings=None, sharding=None, client=None, name=None, embedding_model=None):
+        self.name = name or settings.COLLECTION_NAME
+        self.sharding = sharding or settings.COLLECTION_SHARDING
+        if self.sharding not in SHARDING_MODES:
+            raise ValueError(f"COLLECTION_SHARDING must be one of {SHARDING_MODES}, got '{self.sharding}'")
+        self.client = client or chromadb.PersistentClient(path=persist_directory)
+        self.embeddings = embeddings
+        self.embedding_model = embedding_model or getattr(embeddings, "model", None)
+        self._lock = threading.Lock()
+        self._stores = {}
+
+    @property
+    def sharded(self):
+        return self.sharding == "product"
+
+    def collection_name(self, product):
+        return collection_name(product, self.sharding, self.name)
+
+    def store(self, name, metadata=None):
+        store = self._stores.get(name)
+        if store is None:
+            with self._lock:
+                store = self._stores.get(name)
+                if store is None:
+                    store = Chroma(client=self.client, collection_name=name, embedding_function=self.embeddings,
+                                   collection_metadata=metadata)
+                    self._stores[name] = store
+        return store
+
+    def collection_metadata(self, product=None):
+        metadata = {"product": product} if self.sharded else {}
+        if self.embedding_model:
+            metadata["embedding_model"] = self.embedding_model
+        return metadata or None
+
+    def for_product(self, product):
+        return self.store(self.collection_name(product), self.collection_metadata(product))
+
+    def collection(self, product):
+        return self.for_product(product)._collection
+
+    def product_filter(self, product):
+        return None if self.sharded else {"product": product}
+
+    def document_filter(self, product, document):
+        if self.sharded:
+            return {"document": document}
+        return {"$and": [{"product": product}, {"document": document}]}
+
+    def search(self, product, vector, k=5):
+        return self.for_product(product).similarity_search_by_vector(vector, k=k, filter=self.product_filter(product))
+
+    def search_many(self, product, vectors, k=5):
+        """Top k documents for each query vector, from one query to the product's collection."""
+        if not len(vectors):
+            return []
+        results = self.collection(product).query(query_embeddings=vectors, n_results=k, where=self.product_filter(product),
+                                                 include=["documents", "metadatas"])
+        return [
+            [Document(page_content=text, metadata=metadata or {}, id=chunk_id) for chunk_id, text, metadata in zip(*row)]
+            for row in zip(results["ids"], results["documents"], results["metadatas"])
+        ]
+
+    def stored_ids(self, product, document):
+        return set(self.collection(product).get(where=self.document_filter(product, document), include=[])["ids"])
+
+    def document_chunks(self, product, document):
+        """A stored document's ids, embeddings, texts and metadata."""
+        return self.collection(product).get(where=self.document_filter(product, document),
+                                            include=["embeddings", "documents", "metadatas"])
+
+    def upsert(self, product, ids, embeddings, documents, metadatas):
+        self.collection(product).upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update_metadata(self, product, ids, metadatas):
+        self.collection(product).update(ids=ids, metadatas=metadatas)
+
+    def delete(self, product, ids):
+        self.collection(product).delete(ids=ids)
+
+    def delete_document(self, product, document):
+        self.collection(product).delete(where=self.document_filter(product, document))
+
+    def delete_product(self, product):
+        if not self.sharded:
+            self.collection(product).delete(where={"product": product})
+            return
+        name = self.collection_name(product)
+        with self._lock:
+            self._stores.pop(name, None)
+            try:
+                self.client.delete_collection(name)
+            except NotFoundError:
+                pass
+
+    def clear(self):
+        for store in self.stores():
+            self.client.delete_collection(store._collection.name)
+        with self._lock:
+            self._stores = {}
+
+    def collection_names(self):
+        return [collection.name for collection in self.client.list_collections()]
+
+    def embedding_models(self):
+        """Embedding models recorded by this router's collections; older collections record none."""
+        return {
+            collection.metadata["embedding_model"] for collection in self.client.list_collections()
+            if (collection.name == self.name or collection.name.startswith(shard_prefix(self.name)))
+            and "embedding_model" in (collection.metadata or {})
+        }
+
+    def batches(self, include, batch_size=1000):
+        for store in self.stores():
+            yield from stored_batches(store, include, batch_size)
+
+    def count(self):
+        return sum(store._collection.count() for store in self.stores())
+
+    def stores(self):
+        if not self.sharded:
+            return [self.store(self.name, self.collection_metadata())]
+        return [self.store(name) for name in self.collection_names() if name.startswith(shard_prefix(self.name))]
+
+    def pending_migration(self):
+        """Chunks left in the layout this router does not read, e.g. after switching COLLECTION_SHARDING."""
+        names = self.collection_names()
+        if self.sharded:
+            if self.name not in names:
+                return 0
+            return self.client.get_collection(self.name).count()
+        return sum(self.client.get_collection(name).count() for name in names if name.startswith(shard_prefix(self.name)))
+
+    def close(self):
+        with self._lock:
+            self._stores = {}
+        self.client.clear_system_cache()
+
+
+def upsert_rows(target, ids, embeddings, documents, metadatas):
+    """Upsert rows of several products into a backend, grouped by product."""
+    groups = {}
+    for row in zip(ids, embeddings, documents, metadatas):
+        if row[3] and "product" in row[3]:
+            groups.setdefault(row[3]["product"], []).append(row)
+    for product, rows in groups.items():
+        ids, embeddings, documents, metadatas = zip(*rows)
+        target.upsert(product, list(ids), list(embeddings), list(documents), list(metadatas))
+    return sum(len(rows) for rows in groups.values())
+
+def copy_vectors(source, target, batch_size=1000):
+    """Upsert every chunk of one backend into another, keeping the stored embeddings and their model."""
+    models = source.embedding_models()
+    if target.embedding_model is None and len(models) == 1:
+        target.embedding_model = next(iter(models))
+    copied = 0
+    for batch in stored_batches(source, ["embeddings", "documents", "metadatas"], batch_size):
+        copied += upsert_rows(target, batch["ids"], batch["embeddings"], batch["documents"], batch["metadatas"])
+    return copied
+
+def reembed_vectors(source, staging, embeddings, batch_size=1000):
+    """Embed every chunk of `source` again with `embeddings` and replace its vectors.
+
+    New vectors go to `staging` first, so `source` keeps serving its old
+    vectors until all chunks are embedded; then `source` is cleared and
+    refilled from `staging`. Both backends should be opened with
+    embedding_model set to the new model. Safe to re-run after an
+    interruption: an empty `source` next to a filled `staging` resumes
+    with the copy back.
+    """
+    if source.count() or not staging.count():
+        for batch in stored_batches(source, ["documents", "metadatas"], batch_size):
+            upsert_rows(staging, batch["ids"], embeddings.embed_documents(batch["documents"]), batch["documents"],
+                        batch["metadatas"])
+        source.clear()
+    moved = copy_vectors(staging, source, batch_size)
+    staging.clear()
+    return moved
+
+
+def migrate_collections(persist_directory, to, batch_size=1000, client=None, name=None):
+    """Copy every chunk into the `to` layout, then drop the collections of the other one.
+
+    Safe to re-run after an interruption: copies are upserts and the source
+    is only dropped once everything has been copied.
+    """
+    source = VectorStoreRouter(persist_directory, sharding="global" if to == "product" else "product", client=client,
+                               name=name)
+    target = VectorStoreRouter(persist_directory, sharding=to, client=source.client, name=name)
+    moved = copy_vectors(source, target, batch_size)
+    for store in source.stores():
+        source.client.delete_collection(store._collection.name)
+    return moved
@@ -0,0 +1,6 @@
+import os
+
+# Benchmarks run against local stand-ins: no real key is needed and the
+# provider rate limit would only measure the token bucket.
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+os.environ.setdefault("EMBED_REQUESTS_PER_SECOND", "0")
@@ -0,0 +1,89 @@
+"""Many questions: one /rag/query call each vs. one /rag/query/batch call.
+
+Sends --questions unique questions spread over --products products,
+first one /rag/query call at a time (the QA scripts' pattern), then
+--concurrency calls at a time, then as a single NDJSON batch. Reports
+wall time, questions/s, embedding requests, and the time to the first
+batch result. Runs against local stand-in embedding/chat models with
+fixed latencies.
+
+Run from multimodal_rag_api/:
+
+    python -m benchmarks.bench_batch_query --questions 100 --products 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import httpx
+from app.config import settings
+from .fakes import FakeEmbeddings, fake_llm_factory
+from .harness import seeded_registry, offline_app, ServerThread
+
+
+async def one_by_one(url, payloads, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=300) as client:
+        async def ask(payload):
+            async with semaphore:
+                response = await client.post("/rag/query", json=payload)
+                response.raise_for_status()
+        await asyncio.gather(*(ask(payload) for payload in payloads))
+
+
+async def batch(url, payloads):
+    first = None
+    errors = 0
+    started = time.perf_counter()
+    async with httpx.AsyncClient(base_url=url, timeout=300) as client:
+        async with client.stream("POST", "/rag/query/batch", json={"queries": payloads}) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                first = first or time.perf_counter() - started
+                errors += "error" in json.loads(line)
+    return first, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--products", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel /rag/query calls, and BATCH_LLM_CONCURRENCY")
+    parser.add_argument("--embed-latency", type=float, default=0.1)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    args = parser.parse_args()
+    os.environ.setdefault("OPENAI_API_KEY", "offline")
+    settings.BATCH_LLM_CONCURRENCY = args.concurrency
+
+    for label in ("sequential", f"concurrency={args.concurrency}", "batch"):
+        # A fresh registry per run, so answers and embeddings are never cached across runs.
+        with tempfile.TemporaryDirectory() as persist_directory:
+            clients = []
+
+            def embeddings_factory(resources):
+                clients.append(FakeEmbeddings(256, args.embed_latency, resources.http_client))
+                return clients[-1]
+
+            resources = seeded_registry(persist_directory, args.products, 50, embeddings_factory=embeddings_factory,
+                                        llm_factory=fake_llm_factory(args.llm_latency))
+            seeded_calls = clients[0].calls
+            # Terms no chunk contains, so every question takes the embedding path rather than an exact keyword match.
+            payloads = [{"product": f"product-{i % args.products}", "question": f"How is feature f{i}x configured?"}
+                        for i in range(args.questions)]
+            with ServerThread(offline_app(resources)) as server:
+                started = time.perf_counter()
+                if label == "batch":
+                    first, errors = asyncio.run(batch(server.url, payloads))
+                else:
+                    asyncio.run(one_by_one(server.url, payloads, 1 if label == "sequential" else args.concurrency))
+                    first, errors = None, 0
+                elapsed = time.perf_counter() - started
+            extra = f"  first result={first * 1000:7.1f}ms  errors={errors}" if first is not None else ""
+            print(f"{label:<16} {elapsed:7.2f}s  {args.questions / elapsed:7.1f} questions/s  "
+                  f"embedding requests={clients[0].calls - seeded_calls:<4}{extra}")
+
+
+if __name__ == "__main__":
+    main()
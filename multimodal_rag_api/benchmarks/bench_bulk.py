@@ -0,0 +1,88 @@
+"""One upload per PDF vs. one bulk import of a ZIP file of the same size.
+
+Uploads --documents synthetic manuals one at a time through the real app,
+then imports --documents other manuals, zipped one folder per product,
+through POST /admin/imports, which embeds and writes them in batches of
+--batch-chunks chunks. Reports docs/s and chunks/s for each pass; a second
+import of the same ZIP file shows the cost of skipping files already
+indexed.
+
+Run from multimodal_rag_api/ (needs unstructured):
+
+    python -m benchmarks.bench_bulk --documents 200
+"""
+import argparse
+import os
+import tempfile
+import time
+import zipfile
+from types import SimpleNamespace
+import httpx
+from app.config import settings
+from .bench_e2e import configure, ingest_api
+from .corpus import pdf_bytes, synthetic_document
+from .harness import ServerThread
+
+
+def write_zip(corpus, path):
+    with zipfile.ZipFile(path, "w") as archive:
+        for document in corpus:
+            archive.writestr(f"manuals/{document['product']}/{document['name']}", pdf_bytes(document))
+    return path
+
+
+def ingest_zip(url, path):
+    from app.api import ADMIN_API_KEY
+    with httpx.Client(base_url=url, timeout=120, headers={"x-api-key": ADMIN_API_KEY}) as client:
+        with open(path, "rb") as archive:
+            response = client.post("/admin/imports", files={"file": (os.path.basename(path), archive, "application/zip")})
+        response.raise_for_status()
+        import_id = response.json()["id"]
+        while True:
+            time.sleep(0.05)
+            record = client.get(f"/admin/imports/{import_id}").json()
+            if record["status"] in ("completed", "failed"):
+                break
+    if record["files_failed"]:
+        print(f"WARNING: {record['files_failed']} files of the import failed")
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--products", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--batch-chunks", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        configure(SimpleNamespace(dimension=1024, embed_latency=args.embed_latency, llm_latency=0.0, token_latency=0.0,
+                                  answer_tokens=0), directory)
+        settings.IMPORT_BATCH_CHUNKS = args.batch_chunks
+        from app.main import app
+        with ServerThread(app) as server:
+            uploads = [synthetic_document(index, args.products, args.pages) for index in range(args.documents)]
+            pdf_directory = os.path.join(directory, "pdfs")
+            os.makedirs(pdf_directory)
+            started = time.perf_counter()
+            chunks = ingest_api(server.url, uploads, pdf_directory)
+            elapsed = time.perf_counter() - started
+            print(f"{'uploads':<12} {args.documents} docs, {chunks} chunks in {elapsed:6.2f}s  "
+                  f"{args.documents / elapsed:7.1f} docs/s  {chunks / elapsed:7.0f} chunks/s")
+
+            # Other manuals, so the import cannot copy the chunks of the uploads.
+            imported = [synthetic_document(index, args.products, args.pages)
+                        for index in range(args.documents, 2 * args.documents)]
+            path = write_zip(imported, os.path.join(directory, "manuals.zip"))
+            for label in ("import", "import again"):
+                started = time.perf_counter()
+                record = ingest_zip(server.url, path)
+                elapsed = time.perf_counter() - started
+                print(f"{label:<12} {record['files_done']} docs, {record['chunks_stored']} chunks in {elapsed:6.2f}s  "
+                      f"{record['files_done'] / elapsed:7.1f} docs/s  {record['chunks_stored'] / elapsed:7.0f} chunks/s")
+
+
+if __name__ == "__main__":
+    main()
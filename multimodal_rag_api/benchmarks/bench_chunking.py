@@ -0,0 +1,126 @@
+"""Character-count chunking loop vs. the token-aware chunker.
+
+Times both chunkers over synthetic elements, then compares retrieval on
+the bundled sample documents: hit@k and MRR over benchmarks.probes,
+embedded with the offline lexical proxy (or OpenAI with --openai).
+The retrieval part needs unstructured[pdf] installed; pass --micro to
+skip it.
+
+Run from multimodal_rag_api/:
+
+    python -m benchmarks.bench_chunking --elements 20000 --k 3 --max-tokens 128
+"""
+import argparse
+import random
+import time
+import numpy as np
+from app.chunking import Chunker
+from app.partitioning import iter_partitioned_elements
+from .fakes import LexicalEmbeddings
+from .probes import SAMPLE_PROBES, is_relevant, sample_pdfs
+
+
+def legacy_chunks(elements):
+    # The loop store_document_in_vector_db used before app.chunking.
+    texts = []
+    current_chunk = ""
+    for el in elements:
+        text = str(el).strip()
+        if len(text) < 10:
+            continue
+        current_chunk += text + " "
+        if len(current_chunk) > 500 or text.endswith('.') and len(current_chunk) > 200:
+            if current_chunk.strip():
+                texts.append(current_chunk.strip())
+            current_chunk = ""
+    if current_chunk.strip():
+        texts.append(current_chunk.strip())
+    return [t for t in texts if len(t) > 50]
+
+
+class Metadata:
+    def __init__(self, page_number):
+        self.page_number = page_number
+
+
+class Element(str):
+    def __new__(cls, text, category, page_number):
+        element = super().__new__(cls, text)
+        element.category = category
+        element.metadata = Metadata(page_number)
+        return element
+
+
+def synthetic_elements(count, seed=0):
+    rng = random.Random(seed)
+    words = "retrieval vector product chunk token section page embedding answer context document".split()
+    elements = []
+    for i in range(count):
+        if i % 25 == 0:
+            elements.append(Element(f"Section {i // 25}", "Title", i // 100 + 1))
+        else:
+            sentence_count = rng.choice([1, 1, 2, 4, 12])
+            text = " ".join(
+                " ".join(rng.choice(words) for _ in range(rng.randint(6, 20))).capitalize() + "."
+                for _ in range(sentence_count)
+            )
+            elements.append(Element(text, "NarrativeText", i // 100 + 1))
+    return elements
+
+
+def micro(count, chunker):
+    elements = synthetic_elements(count)
+    for label, fn in (("legacy", legacy_chunks), ("token-aware", lambda els: list(chunker.chunk(els)))):
+        start = time.perf_counter()
+        chunks = fn(elements)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<12} {count / elapsed:10.0f} elements/s  chunks={len(chunks)}")
+
+
+def retrieval(k, embeddings, chunker):
+    elements = [element for pdf_path in sample_pdfs() for element in iter_partitioned_elements(pdf_path, workers=1)]
+    chunkers = {
+        "legacy": legacy_chunks,
+        "token-aware": lambda els: [chunk["text"] for chunk in chunker.chunk(els)]
+    }
+    for label, fn in chunkers.items():
+        texts = fn(elements)
+        matrix = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+        hits = 0
+        reciprocal_ranks = 0.0
+        for question, phrase in SAMPLE_PROBES:
+            scores = matrix @ np.asarray(embeddings.embed_query(question), dtype=np.float32)
+            ranked = np.argsort(-scores)[:k]
+            for rank, index in enumerate(ranked, 1):
+                if is_relevant(texts[index], phrase):
+                    hits += 1
+                    reciprocal_ranks += 1 / rank
+                    break
+        lengths = [len(text) for text in texts]
+        print(f"{label:<12} chunks={len(texts):<4} mean chars={sum(lengths) / len(lengths):6.0f}  "
+              f"hit@{k}={hits / len(SAMPLE_PROBES):.2f}  mrr={reciprocal_ranks / len(SAMPLE_PROBES):.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--elements", type=int, default=20000)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--max-tokens", type=int, default=None)
+    parser.add_argument("--overlap", type=int, default=None)
+    parser.add_argument("--micro", action="store_true", help="only run the chunking microbenchmark")
+    parser.add_argument("--openai", action="store_true", help="embed with OpenAI instead of the lexical proxy")
+    args = parser.parse_args()
+
+    chunker = Chunker(args.max_tokens, args.overlap)
+    micro(args.elements, chunker)
+    if not args.micro:
+        if args.openai:
+            from langchain_openai import OpenAIEmbeddings
+            embeddings = OpenAIEmbeddings()
+        else:
+            embeddings = LexicalEmbeddings()
+        retrieval(args.k, embeddings, chunker)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Naive '\\n'.join context vs. the token-budgeted context builder.
+
+Ingests the bundled sample PDFs --copies times under different names,
+each copy with a word changed per chunk, as repeated uploads of a
+document do. For every probe in benchmarks.probes, compares the plain
+join of the retrieved chunks with ContextBuilder's output: prompt tokens,
+tokens saved, duplicates dropped, whether the answer phrase survives, and
+build time. Dense vectors come from the offline lexical proxy. Needs
+unstructured[pdf] installed.
+
+Run from multimodal_rag_api/:
+
+    python -m benchmarks.bench_context --copies 3 --k 5 --budget 800
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from app.chunking import chunk_elements
+from app.context import ContextBuilder
+from app.partitioning import iter_partitioned_elements
+from app.query import aembed_question, ahybrid_retrieve
+from app.rag_pipeline import sync_document
+from app.resources import ResourceRegistry
+from .fakes import fake_llm_factory, lexical_embeddings_factory
+from .probes import SAMPLE_PROBES, is_relevant, sample_pdfs
+
+PRODUCT = "samples"
+
+
+def near_duplicate(text, copy):
+    # Swap one word so the copy is not byte-identical.
+    words = text.split()
+    if copy and len(words) > 10:
+        words[len(words) // 2] = f"revision{copy}"
+    return " ".join(words)
+
+
+def seed(resources, copies):
+    for pdf_path in sample_pdfs():
+        chunks = chunk_elements(iter_partitioned_elements(pdf_path, workers=1))
+        for copy in range(copies):
+            document = os.path.basename(pdf_path) if copy == 0 else f"v{copy + 1}-{os.path.basename(pdf_path)}"
+            edited = [dict(chunk, text=near_duplicate(chunk["text"], copy)) for chunk in chunks]
+            sync_document(edited, PRODUCT, document, resources.vectorstores, resources.catalog,
+                          resources.embeddings, keyword_index=resources.keyword_index)
+
+
+async def run(resources, k, builder):
+    rows = []
+    for question, phrase in SAMPLE_PROBES:
+        docs = await ahybrid_retrieve(resources, PRODUCT, question, await aembed_question(resources, question), k)
+        naive = "\n".join(doc.page_content for doc in docs)
+        start = time.perf_counter()
+        context = builder.build(docs)
+        elapsed = (time.perf_counter() - start) * 1000
+        rows.append({
+            "naive_tokens": len(builder.tokenizer.encode(naive)),
+            "tokens": context["tokens"],
+            "saved": context["tokens_saved"],
+            "duplicates": context["duplicates"],
+            "naive_hit": is_relevant(naive, phrase),
+            "hit": is_relevant(context["text"], phrase),
+            "ms": elapsed
+        })
+
+    def mean(key):
+        return statistics.mean(row[key] for row in rows)
+    print(f"naive    hit={mean('naive_hit'):.2f}  prompt tokens={mean('naive_tokens'):7.0f}")
+    print(f"builder  hit={mean('hit'):.2f}  prompt tokens={mean('tokens'):7.0f}  saved={mean('saved'):6.0f}/request  "
+          f"duplicates dropped={mean('duplicates'):.1f}/request  build={mean('ms'):.2f}ms  budget={builder.budget}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=3, help="uploads of each sample document")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=None, help="context token budget (default: per model)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        resources = ResourceRegistry(persist_directory, lexical_embeddings_factory(), fake_llm_factory())
+        try:
+            seed(resources, args.copies)
+            asyncio.run(run(resources, args.k, ContextBuilder(budget=args.budget)))
+        finally:
+            resources.close()
+
+
+if __name__ == "__main__":
+    main()
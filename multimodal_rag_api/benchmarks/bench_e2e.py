@@ -0,0 +1,285 @@
+"""End-to-end benchmark of the real app with the offline embedding and chat models.
+
+Runs app.main.app under uvicorn with EMBEDDING_PROVIDER=fake and
+LLM_PROVIDER=fake (latency and dimension set by the flags below), ingests
+a synthetic corpus of --documents manuals and then measures:
+
+- ingestion docs/s and chunks/s. With unstructured installed the PDFs go
+  through POST /admin/upload and the job queue; without it (or with
+  --ingest direct) their elements are chunked and stored in-process.
+- sequential /rag/query/stream latency p50/p95/p99, time to first token
+  and source hit rate (a source comes from the manual holding the fact),
+- /rag/query throughput and p50/p95/p99 at --concurrency for --duration,
+- memory: current and peak RSS of the process.
+
+Every question is about a different part, so the answer cache only
+short-circuits once the corpus runs out of facts (reported as repeats).
+Results go to --output as JSON; --compare prints the change against an
+earlier result, e.g. one taken on the previous commit.
+
+Run from multimodal_rag_api/:
+
+    python -m benchmarks.bench_e2e --documents 1000 --output e2e.json
+    python -m benchmarks.bench_e2e --documents 1000 --compare e2e.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+from app.config import settings
+from .corpus import document_elements, synthetic_corpus, write_pdf
+from .harness import ServerThread
+
+# The results --compare looks at, and whether a larger value is an improvement.
+COMPARED = {
+    "ingest": {"docs_per_s": True, "chunks_per_s": True},
+    "query": {"p50_ms": False, "p95_ms": False, "p99_ms": False, "ttft_p50_ms": False, "source_hit_rate": True},
+    "load": {"requests_per_s": True, "p50_ms": False, "p95_ms": False, "p99_ms": False, "errors": False},
+    "memory": {"rss_mb": False, "peak_rss_mb": False}
+}
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    p = lambda q: round(latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000, 2) if latencies else None
+    return {"p50_ms": p(0.5), "p95_ms": p(0.95), "p99_ms": p(0.99)}
+
+
+def memory():
+    """Resident set size now and at its peak, in MB."""
+    try:
+        with open("/proc/self/status") as status:
+            fields = dict(line.split(":", 1) for line in status)
+        return {"rss_mb": round(int(fields["VmRSS"].split()[0]) / 1024, 1),
+                "peak_rss_mb": round(int(fields["VmHWM"].split()[0]) / 1024, 1)}
+    except (OSError, KeyError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"rss_mb": None, "peak_rss_mb": round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def configure(args, directory):
+    settings.EMBEDDING_PROVIDER = "fake"
+    settings.LLM_PROVIDER = "fake"
+    settings.FAKE_EMBEDDING_DIMENSION = args.dimension
+    settings.FAKE_EMBEDDING_LATENCY = args.embed_latency
+    settings.FAKE_LLM_LATENCY = args.llm_latency
+    settings.FAKE_LLM_TOKEN_LATENCY = args.token_latency
+    settings.FAKE_LLM_ANSWER_TOKENS = args.answer_tokens
+    settings.CHROMA_DIR = os.path.join(directory, "chroma_db")
+    settings.JOBS_DB = os.path.join(directory, "jobs.sqlite3")
+    settings.DATA_DIR = os.path.join(directory, "data")
+    settings.EXTRACTED_DOCS_DIR = os.path.join(directory, "extracted")
+
+
+def ingest_mode(requested):
+    if requested != "auto":
+        return requested
+    try:
+        import unstructured.partition.pdf  # noqa: F401
+        return "api"
+    except ImportError:
+        return "direct"
+
+
+def ingest_direct(resources, corpus):
+    from app.rag_pipeline import chunk_document, sync_document
+    chunks_total = 0
+    for document in corpus:
+        asset_store = resources.asset_store
+        chunks, assets = chunk_document(document_elements(document), asset_store is not None)
+        sync_document(chunks, document["product"], document["name"], resources.vectorstores, resources.catalog,
+                      resources.embeddings, keyword_index=resources.keyword_index, assets=assets,
+                      asset_store=asset_store)
+        chunks_total += len(chunks)
+    return chunks_total
+
+
+def ingest_api(url, corpus, pdf_directory):
+    from app.api import ADMIN_API_KEY
+    headers = {"x-api-key": ADMIN_API_KEY}
+    job_ids = []
+    with httpx.Client(base_url=url, timeout=120, headers=headers) as client:
+        for document in corpus:
+            with open(write_pdf(document, pdf_directory), "rb") as pdf:
+                response = client.post("/admin/upload", params={"product": document["product"]},
+                                       files={"file": (document["name"], pdf, "application/pdf")})
+            response.raise_for_status()
+            job_ids.append(response.json()["job_id"])
+        pending = set(job_ids)
+        chunks_total = failed = 0
+        while pending:
+            time.sleep(0.05)
+            for job in client.get("/admin/jobs", params={"limit": len(job_ids)}).json():
+                if job["id"] in pending and job["status"] in ("completed", "failed", "unchanged"):
+                    pending.discard(job["id"])
+                    chunks_total += job["chunks_stored"] or 0
+                    failed += job["status"] == "failed"
+    if failed:
+        print(f"WARNING: {failed} ingestion jobs failed")
+    return chunks_total
+
+
+async def sequential_queries(url, questions):
+    latencies, first_tokens = [], []
+    hits = 0
+    async with httpx.AsyncClient(base_url=url, timeout=120) as client:
+        for product, question, document in questions:
+            started = time.perf_counter()
+            first_token = None
+            sources = []
+            async with client.stream("POST", "/rag/query/stream", json={"product": product, "question": question}) as response:
+                response.raise_for_status()
+                event = None
+                async for line in response.aiter_lines():
+                    if line.startswith("event: "):
+                        event = line[7:]
+                    elif line.startswith("data: ") and event == "sources":
+                        sources = json.loads(line[6:])
+                    elif event == "token" and first_token is None:
+                        first_token = time.perf_counter() - started
+            latencies.append(time.perf_counter() - started)
+            first_tokens.append(first_token or latencies[-1])
+            hits += any(source.get("document") == document for source in sources)
+    return {**percentiles(latencies), "ttft_p50_ms": percentiles(first_tokens)["p50_ms"],
+            "source_hit_rate": round(hits / len(questions), 3) if questions else None, "queries": len(questions)}
+
+
+async def load(url, questions, concurrency, duration):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    cycle = itertools.cycle(questions)
+
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        async def user():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                product, question, _ = next(cycle)
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/rag/query", json={"product": product, "question": question})
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    sent = len(latencies) + errors
+    return {"requests_per_s": round(len(latencies) / elapsed, 1), **percentiles(latencies), "errors": errors,
+            "requests": sent, "repeats": max(0, sent - len(questions)), "concurrency": concurrency}
+
+
+def compare(result, baseline):
+    print(f"\nchange vs. {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp')}):")
+    differing = sorted(key for key, value in result["config"].items() if baseline.get("config", {}).get(key) != value)
+    if baseline.get("ingest", {}).get("mode") != result["ingest"]["mode"]:
+        differing.append("ingest mode")
+    if differing:
+        print(f"WARNING: the runs differ in {', '.join(differing)}; the numbers are not directly comparable")
+    for section, names in COMPARED.items():
+        for name, higher_is_better in names.items():
+            value, before = result[section].get(name), baseline.get(section, {}).get(name)
+            if value is None or before is None:
+                continue
+            change = (value - before) / before * 100 if before else 0.0
+            better = change > 0 if higher_is_better else change < 0
+            flag = "" if abs(change) < 5 else ("  better" if better else "  WORSE")
+            print(f"  {section}.{name:<16} {before:>10} -> {value:<10} {change:+6.1f}%{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--products", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=3, help="pages per manual (6 facts per page)")
+    parser.add_argument("--ingest", choices=("auto", "api", "direct"), default="auto")
+    parser.add_argument("--queries", type=int, default=200, help="sequential streamed queries")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds to the first token")
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--answer-tokens", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="a JSON file from an earlier run to compare against")
+    args = parser.parse_args()
+
+    mode = ingest_mode(args.ingest)
+    with tempfile.TemporaryDirectory() as directory:
+        configure(args, directory)
+        from app.main import app
+        with ServerThread(app) as server:
+            started = time.perf_counter()
+            corpus = synthetic_corpus(args.documents, args.products, args.pages)
+            if mode == "api":
+                pdf_directory = os.path.join(directory, "pdfs")
+                os.makedirs(pdf_directory)
+                chunks = ingest_api(server.url, corpus, pdf_directory)
+            else:
+                chunks = ingest_direct(app.state.resources, corpus)
+            elapsed = time.perf_counter() - started
+            ingest = {"mode": mode, "documents": args.documents, "chunks": chunks, "seconds": round(elapsed, 2),
+                      "docs_per_s": round(args.documents / elapsed, 2), "chunks_per_s": round(chunks / elapsed, 1)}
+            print(f"ingest ({mode}): {args.documents} docs, {chunks} chunks in {elapsed:.1f}s  "
+                  f"{ingest['docs_per_s']:.1f} docs/s  {ingest['chunks_per_s']:.0f} chunks/s")
+
+            questions = [(document["product"], question, document["name"])
+                         for document in synthetic_corpus(args.documents, args.products, args.pages)
+                         for question, _ in document["facts"]]
+            random.Random(args.seed).shuffle(questions)
+            query = asyncio.run(sequential_queries(server.url, questions[:args.queries]))
+            print(f"query (sequential, streamed): p50={query['p50_ms']}ms  p95={query['p95_ms']}ms  "
+                  f"p99={query['p99_ms']}ms  ttft p50={query['ttft_p50_ms']}ms  source hit={query['source_hit_rate']}")
+            load_result = asyncio.run(load(server.url, questions[args.queries:] or questions, args.concurrency,
+                                           args.duration))
+            print(f"load (concurrency {args.concurrency}): {load_result['requests_per_s']} req/s  "
+                  f"p50={load_result['p50_ms']}ms  p95={load_result['p95_ms']}ms  p99={load_result['p99_ms']}ms  "
+                  f"errors={load_result['errors']}  repeats={load_result['repeats']}")
+            usage = memory()
+            print(f"memory: rss={usage['rss_mb']}MB  peak={usage['peak_rss_mb']}MB")
+
+    result = {
+        "benchmark": "e2e",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "ingest": ingest,
+        "query": query,
+        "load": load_result,
+        "memory": usage
+    }
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(result, out, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(result, json.load(baseline))
+
+
+if __name__ == "__main__":
+    main()
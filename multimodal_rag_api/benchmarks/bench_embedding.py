@@ -0,0 +1,51 @@
+"""Embedding throughput: one serial call vs. the batched, concurrent BatchEmbedder.
+
+Run from multimodal_rag_api/:
+
+    python -m benchmarks.bench_embedding --chunks 2000 --error-rate 0.1
+"""
+import argparse
+import time
+from app.embedding import BatchEmbedder
+from .fakes import FakeEmbeddings, FakeRateLimitError
+
+
+def report(label, embeddings, texts, elapsed, retries=0):
+    print(f"{label:<22} {len(texts) / elapsed:9.1f} chunks/s  calls={embeddings.calls:<5} "
+          f"re-embedded={embeddings.texts_embedded - len(texts):<5} retries={retries}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05, help="fixed seconds per request")
+    parser.add_argument("--latency-per-text", type=float, default=0.0005)
+    parser.add_argument("--error-rate", type=float, default=0.1, help="fraction of requests answered with 429")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--rps", type=float, default=0, help="token-bucket rate, 0 disables")
+    args = parser.parse_args()
+
+    texts = [f"chunk {i}: " + "lorem ipsum " * 40 for i in range(args.chunks)]
+
+    embeddings = FakeEmbeddings(latency=args.latency, latency_per_text=args.latency_per_text)
+    start = time.perf_counter()
+    embeddings.embed_documents(texts)
+    report("single call", embeddings, texts, time.perf_counter() - start)
+
+    for in_flight in (1, 2, 4, 8):
+        embeddings = FakeEmbeddings(latency=args.latency, latency_per_text=args.latency_per_text,
+                                    error_rate=args.error_rate, seed=in_flight)
+        embedder = BatchEmbedder(embeddings, batch_size=args.batch_size, max_in_flight=in_flight,
+                                 requests_per_second=args.rps, max_retries=20, backoff_base=0.05)
+        start = time.perf_counter()
+        try:
+            vectors = embedder.embed(texts)
+        except FakeRateLimitError:
+            print(f"in-flight={in_flight}: gave up after retries")
+            continue
+        assert len(vectors) == len(texts)
+        report(f"batched in-flight={in_flight}", embeddings, texts, time.perf_counter() - start, embedder.retries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Dense-only vs. hybrid (dense + BM25) retrieval on part-number lookups.
+
+Seeds a product catalogue whose chunks differ mostly by part number,
+then asks short lookups ("PN-01234 torque") and longer natural
+questions. Reports hit@k, latency and how many questions the exact-match
+path answered without an embedding call. Dense vectors come from the
+offline lexical proxy with --embed-latency added per call.
+
+Run from multimodal_rag_api/:
+
+    python -m benchmarks.bench_hybrid --parts 3000 --queries 200
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from app.query import aembed_question, aexact_match, ahybrid_retrieve, aretrieve
+from app.rag_pipeline import sync_document
+from app.resources import ResourceRegistry
+from .fakes import fake_llm_factory, lexical_embeddings_factory
+
+FAMILIES = ["hydraulic", "pneumatic", "electric", "manual", "servo"]
+PRODUCT = "parts"
+
+
+def part_text(i):
+    family = FAMILIES[i % len(FAMILIES)]
+    return (f"Part PN-{i:05d} is a {family} actuator valve. Rated torque {10 + i % 90} Nm, "
+            f"operating pressure {1 + i % 12} bar. Use only with {family} fittings and the standard seal kit.")
+
+
+def seed(resources, parts):
+    chunks = [{"text": part_text(i), "metadata": {"part": i}} for i in range(parts)]
+    sync_document(chunks, PRODUCT, "catalogue.pdf", resources.vectorstores, resources.catalog,
+                  resources.embeddings, keyword_index=resources.keyword_index)
+
+
+async def dense(resources, question, k):
+    return await aretrieve(resources, PRODUCT, await aembed_question(resources, question), k), False
+
+
+async def hybrid(resources, question, k):
+    return await ahybrid_retrieve(resources, PRODUCT, question, await aembed_question(resources, question), k), False
+
+
+async def exact_then_hybrid(resources, question, k):
+    docs = await aexact_match(resources, PRODUCT, question, k)
+    if docs is not None:
+        return docs, True
+    return (await hybrid(resources, question, k))[0], False
+
+
+async def measure(resources, strategy, questions, k):
+    hits = 0
+    skipped = 0
+    timings = []
+    for part, question in questions:
+        start = time.perf_counter()
+        docs, exact = await strategy(resources, question, k)
+        timings.append((time.perf_counter() - start) * 1000)
+        hits += any(doc.metadata.get("part") == part for doc in docs)
+        skipped += exact
+    return hits / len(questions), statistics.mean(timings), statistics.median(timings), skipped
+
+
+async def run(resources, parts, queries, k):
+    rng = random.Random(0)
+    targets = rng.sample(range(parts), queries * 6)
+    kinds = {
+        "lookup": lambda i: f"PN-{i:05d} torque",
+        "question": lambda i: f"What torque is part PN-{i:05d} from the {FAMILIES[i % len(FAMILIES)]} range rated for?"
+    }
+    strategies = {"dense": dense, "hybrid": hybrid, "exact+hybrid": exact_then_hybrid}
+    # Every run asks about different parts so the embedding cache never answers for it.
+    offset = 0
+    for kind, template in kinds.items():
+        for label, strategy in strategies.items():
+            questions = [(i, template(i)) for i in targets[offset:offset + queries]]
+            offset += queries
+            hit_rate, mean, p50, skipped = await measure(resources, strategy, questions, k)
+            print(f"{kind:<9} {label:<13} hit@{k}={hit_rate:.2f}  mean={mean:7.2f}ms  p50={p50:7.2f}ms  "
+                  f"no-embedding={skipped}/{len(questions)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--parts", type=int, default=3000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="seconds per embedding call")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        resources = ResourceRegistry(persist_directory, lexical_embeddings_factory(), fake_llm_factory())
+        try:
+            seed(resources, args.parts)
+            resources.embeddings.inner.embeddings.latency = args.embed_latency
+            asyncio.run(run(resources, args.parts, args.queries, args.k))
+        finally:
+            resources.close()
+
+
+if __name__ == "__main__":
+    main()
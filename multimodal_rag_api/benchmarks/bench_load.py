@@ -0,0 +1,84 @@
+"""Load test: the async query path vs. a blocking `def` handler, against local stubs.
+
+The blocking baseline is the pre-async /rag/query shape: a plain `def`
+route calling the sync embedding, search and LLM interfaces, so every
+in-flight question holds one of Starlette's threadpool workers.
+
+Run from multimodal_rag_api/:
+
+    python -m benchmarks.bench_load --concurrency 100 --duration 10
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+import httpx
+from fastapi import Depends
+from app.models import RAGQueryRequest, RAGQueryResponse
+from app.query import retrieve, build_messages, message_text
+from app.resources import ResourceRegistry, get_resources
+from .fakes import fake_embeddings_factory, fake_llm_factory
+from .harness import seeded_registry, offline_app, ServerThread
+
+
+def blocking_query(request: RAGQueryRequest, resources: ResourceRegistry = Depends(get_resources)):
+    question_vector = resources.embeddings.embed_query(request.question)
+    docs = retrieve(resources, request.product, question_vector)
+    context_text = '\n'.join(doc.page_content for doc in docs)
+    return RAGQueryResponse(answer=message_text(resources.llm.invoke(build_messages(context_text, request.question))))
+
+
+async def load(url, path, concurrency, duration, products):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        async def user(worker):
+            nonlocal errors
+            i = 0
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                # Unique questions so the answer cache never short-circuits the backends.
+                payload = {"product": f"product-{(worker + i) % products}", "question": f"question {worker}-{i}"}
+                try:
+                    response = await client.post(path, json=payload)
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+                i += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(worker) for worker in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000 if latencies else 0.0
+    print(f"{path:<18} {len(latencies) / elapsed:8.1f} req/s  p50={p(0.5):7.1f}ms  p95={p(0.95):7.1f}ms  "
+          f"p99={p(0.99):7.1f}ms  errors={errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--products", type=int, default=5)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=2.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        resources = seeded_registry(persist_directory, args.products, 50,
+                                    embeddings_factory=fake_embeddings_factory(latency=args.embed_latency),
+                                    llm_factory=fake_llm_factory(args.llm_latency))
+        app = offline_app(resources)
+        app.add_api_route("/blocking/query", blocking_query, methods=["POST"], response_model=RAGQueryResponse)
+        with ServerThread(app) as server:
+            for path in ("/blocking/query", "/rag/query"):
+                asyncio.run(load(server.url, path, args.concurrency, args.duration, args.products))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Query and ingest embedding: remote API round trips vs. a local ONNX model.
+
+The remote side is FakeEmbeddings with --remote-latency seconds per call,
+standing in for the OpenAI round trip every question pays. The local side
+is OnnxEmbeddings loaded from --model-dir (model.onnx and tokenizer.json,
+e.g. all-MiniLM-L6-v2 exported with optimum). Both go through
+BatchEmbedder as in the app. Needs onnxruntime and tokenizers.
+
+Run from multimodal_rag_api/:
+
+    python -m benchmarks.bench_local_embedding --model-dir ./models/embedder --queries 200 --chunks 2000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from app.config import settings
+from app.embedding import BatchEmbedder, OnnxEmbeddings
+from .fakes import FakeEmbeddings
+
+
+async def query_latencies(embedder, questions):
+    timings = []
+    for question in questions:
+        start = time.perf_counter()
+        await embedder.aembed_query(question)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model-dir", default=settings.EMBED_LOCAL_MODEL_DIR)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--remote-latency", type=float, default=0.15, help="seconds per remote embedding call")
+    parser.add_argument("--remote-latency-per-text", type=float, default=0.0005)
+    args = parser.parse_args()
+    if not os.path.exists(os.path.join(args.model_dir, "model.onnx")):
+        parser.error(f"no model.onnx in {args.model_dir}")
+
+    questions = [f"What is the maximum operating temperature of unit {i}?" for i in range(args.queries)]
+    texts = [f"chunk {i}: the unit operates between -20 and 60 degrees and draws {i % 40} watts. " * 4
+             for i in range(args.chunks)]
+
+    remote = FakeEmbeddings(dimension=1536, latency=args.remote_latency, latency_per_text=args.remote_latency_per_text)
+    p50, p95 = asyncio.run(query_latencies(BatchEmbedder(remote, requests_per_second=0), questions))
+    start = time.perf_counter()
+    BatchEmbedder(remote, requests_per_second=0).embed(texts)
+    throughput = len(texts) / (time.perf_counter() - start)
+    print(f"{'remote':<24} query p50={p50:7.2f}ms  p95={p95:7.2f}ms  ingest={throughput:8.1f} chunks/s")
+
+    for workers in (1, 2, 4):
+        local = OnnxEmbeddings(args.model_dir, max_in_flight=workers)
+        local.embed_query("warm up")
+        p50, p95 = asyncio.run(query_latencies(BatchEmbedder(local), questions))
+        start = time.perf_counter()
+        vectors = BatchEmbedder(local).embed(texts)
+        throughput = len(texts) / (time.perf_counter() - start)
+        print(f"{f'{local.model} x{workers}':<24} query p50={p50:7.2f}ms  p95={p95:7.2f}ms  ingest={throughput:8.1f} chunks/s  "
+              f"dimension={len(vectors[0])}")
+
+
+if __name__ == "__main__":
+    main()
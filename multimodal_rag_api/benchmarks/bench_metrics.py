@@ -0,0 +1,67 @@
+"""Cost of stage timing: /rag/query latency with metrics off, on, and on with Server-Timing.
+
+Sends --queries unique questions one at a time (so each goes through
+the embedding, search, context and LLM stages) against local stand-in
+models with no added latency, which makes the instrumentation's share
+of a request as large as it can be. The modes take turns question by
+question on one server, so drift over the run affects them equally.
+The stand-in LLM reports no token usage, so "on" also pays for
+estimating token counts (ChatOpenAI reports usage). Prints the stage
+breakdown /metrics reports at the end.
+
+Run from multimodal_rag_api/:
+
+    python -m benchmarks.bench_metrics --queries 600
+"""
+import argparse
+import os
+import re
+import statistics
+import tempfile
+import time
+import httpx
+from app.config import settings
+from app.metrics import QUERY_STAGES, metrics
+from .harness import seeded_registry, offline_app, ServerThread
+
+MODES = {"metrics off": (False, False), "metrics on": (True, False), "metrics + Server-Timing": (True, True)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=600)
+    parser.add_argument("--chunks", type=int, default=500)
+    args = parser.parse_args()
+    os.environ.setdefault("OPENAI_API_KEY", "offline")
+
+    timings = {label: [] for label in MODES}
+    with tempfile.TemporaryDirectory() as persist_directory:
+        resources = seeded_registry(persist_directory, 1, args.chunks)
+        with ServerThread(offline_app(resources)) as server, httpx.Client(base_url=server.url, timeout=60) as client:
+            for i in range(args.queries + 30):
+                label = list(MODES)[i % len(MODES)]
+                metrics.enabled, settings.SERVER_TIMING = MODES[label]
+                # Terms no chunk contains, so no question is answered by an exact keyword match or from the cache.
+                payload = {"product": "product-0", "question": f"How is feature f{i}x configured?"}
+                started = time.perf_counter()
+                response = client.post("/rag/query", json=payload)
+                response.raise_for_status()
+                if i >= 30:
+                    timings[label].append((time.perf_counter() - started) * 1000)
+            metrics.enabled = True
+            scrape = client.get("/metrics").text
+
+    for label, values in timings.items():
+        values.sort()
+        print(f"{label:<24} p50={statistics.median(values):6.2f}ms  p95={values[int(len(values) * 0.95)]:6.2f}ms  "
+              f"mean={statistics.mean(values):6.2f}ms")
+
+    print("\nstage means from /metrics:")
+    totals = dict(re.findall(rf'{QUERY_STAGES}_sum{{stage="(\w+)"}} (\S+)', scrape))
+    counts = dict(re.findall(rf'{QUERY_STAGES}_count{{stage="(\w+)"}} (\S+)', scrape))
+    for name in sorted(totals, key=lambda name: -float(totals[name]) / float(counts[name])):
+        print(f"  {name:<18} {float(totals[name]) / float(counts[name]) * 1000:7.2f}ms  x{counts[name]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Text-only retrieval vs. text plus the tables-and-figures lane.
+
+Builds --sections manual sections, each with prose, a specifications
+table (as unstructured returns it with infer_table_structure: flattened
+text plus text_as_html) and a captioned wiring diagram, then asks
+for a table value or for the diagram of a component. A table question
+hits when the context holds the value as a Markdown table row, a
+figure question when a figure source with a stored image comes back.
+Also re-extracts the images --reextract times to show they are stored
+once. Dense vectors come from the offline lexical proxy.
+
+Run from multimodal_rag_api/:
+
+    python -m benchmarks.bench_multimodal --sections 200 --queries 100
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from app.assets import AssetCollector, store_extracted_images
+from app.chunking import chunk_elements
+from app.config import settings
+from app.context import build_context
+from app.query import aembed_question, ahybrid_retrieve
+from app.rag_pipeline import sync_document
+from app.resources import ResourceRegistry
+from .corpus import Element
+from .fakes import fake_llm_factory, lexical_embeddings_factory
+
+COMPONENTS = ["pump", "valve", "compressor", "fan", "heater", "sensor", "actuator", "motor", "filter", "relay"]
+PARAMETERS = ["torque", "pressure", "voltage", "current", "speed", "temperature"]
+PRODUCT = "manual"
+
+
+def component(s):
+    return f"{COMPONENTS[s % len(COMPONENTS)]} unit {s}"
+
+
+def value(s, parameter):
+    return str(10 + (s * 7 + PARAMETERS.index(parameter) * 13) % 90)
+
+
+def section_elements(s, image_directory, rng):
+    name = component(s)
+    page = s + 1
+    prose = (f"The {name} is installed behind the service panel. Check the {name} during every maintenance visit "
+             f"and refer to the table and the diagram below. " + " ".join(
+                 f"Step {i}: inspect the {rng.choice(COMPONENTS)} and {rng.choice(PARAMETERS)} settings." for i in range(6)))
+    rows = [(parameter, value(s, parameter), "units") for parameter in PARAMETERS]
+    html = "<table><tr><th>Setting</th><th>Value</th><th>Unit</th></tr>" + "".join(
+        f"<tr><td>{p}</td><td>{v}</td><td>{u}</td></tr>" for p, v, u in rows) + "</table>"
+    flat = "Setting Value Unit " + " ".join(f"{p} {v} {u}" for p, v, u in rows)
+    image = os.path.join(image_directory, f"figure-{s}.png")
+    with open(image, "wb") as out:
+        out.write(b"\x89PNG" + str(s % 50).encode() * 64)
+    return [
+        Element("Title", f"Section {s}: {name}", page),
+        Element("NarrativeText", prose, page),
+        Element("FigureCaption", f"Table {s}: specifications of the {name}", page),
+        Element("Table", flat, page, text_as_html=html),
+        Element("Image", "", page, image_path=image),
+        Element("FigureCaption", f"Figure {s}: wiring diagram of the {name}", page),
+    ]
+
+
+def extract(sections, image_directory):
+    rng = random.Random(0)
+    return [e for s in range(sections) for e in section_elements(s, image_directory, rng)]
+
+
+def ingest(resources, sections, image_directory):
+    elements = store_extracted_images(extract(sections, image_directory), image_directory)
+    collector = AssetCollector()
+    chunks = chunk_elements(collector.watch(elements))
+    sync_document(chunks, PRODUCT, "manual.pdf", resources.vectorstores, resources.catalog, resources.embeddings,
+                  keyword_index=resources.keyword_index, assets=collector.chunks(chunks),
+                  asset_store=resources.asset_store)
+    return len(chunks)
+
+
+def table_hit(docs, s, parameter):
+    row = f"| {parameter} | {value(s, parameter)} |"
+    return any(row in doc.page_content and component(s) in doc.page_content for doc in docs)
+
+
+def figure_hit(docs, s):
+    return any(doc.metadata.get("kind") == "image" and doc.metadata.get("image_path")
+               and component(s) in doc.page_content for doc in docs)
+
+
+async def measure(resources, sections, queries, k):
+    rng = random.Random(1)
+    table_hits = figure_hits = 0
+    timings = []
+    for _ in range(queries):
+        s = rng.randrange(sections)
+        parameter = rng.choice(PARAMETERS)
+        for kind, question in (("table", f"What is the {parameter} setting of the {component(s)}?"),
+                               ("figure", f"Show the wiring diagram of the {component(s)}")):
+            vector = await aembed_question(resources, question)
+            start = time.perf_counter()
+            docs = await ahybrid_retrieve(resources, PRODUCT, question, vector, k)
+            timings.append((time.perf_counter() - start) * 1000)
+            docs = build_context(docs)["docs"]
+            if kind == "table":
+                table_hits += table_hit(docs, s, parameter)
+            else:
+                figure_hits += figure_hit(docs, s)
+    return table_hits / queries, figure_hits / queries, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--reextract", type=int, default=3, help="times the same images are extracted again")
+    args = parser.parse_args()
+
+    for indexing in (False, True):
+        settings.MULTIMODAL_INDEXING = indexing
+        with tempfile.TemporaryDirectory() as persist_directory:
+            settings.EXTRACTED_DOCS_DIR = os.path.join(persist_directory, "extracted")
+            resources = ResourceRegistry(persist_directory, lexical_embeddings_factory(), fake_llm_factory())
+            try:
+                chunks = ingest(resources, args.sections, tempfile.mkdtemp(dir=persist_directory))
+                tables, figures, p50 = asyncio.run(measure(resources, args.sections, args.queries, args.k))
+                label = "text + assets" if indexing else "text only"
+                assets = resources.asset_store.count() if indexing else 0
+                print(f"{label:<14} chunks={chunks:<5} assets={assets:<5} table hit={tables:.2f}  "
+                      f"figure hit={figures:.2f}  retrieval p50={p50:6.2f}ms")
+                if indexing:
+                    for _ in range(args.reextract):
+                        output_dir = tempfile.mkdtemp(dir=persist_directory)
+                        store_extracted_images(extract(args.sections, output_dir), output_dir)
+                    stored = [os.path.join(root, name) for root, _, names in
+                              os.walk(os.path.join(settings.EXTRACTED_DOCS_DIR, "images")) for name in names]
+                    print(f"images: {args.sections * (args.reextract + 1)} extracted over {args.reextract + 1} runs, "
+                          f"{len(stored)} files stored ({sum(os.path.getsize(path) for path in stored)} bytes)")
+            finally:
+                resources.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Page-window partitioning: pages/sec and peak RSS across worker counts.
+
+Builds a long PDF by repeating the bundled sample documents, then
+partitions it once per configuration in a fresh interpreter so peak RSS
+is measured in isolation. Needs unstructured[pdf] installed.
+
+Run from multimodal_rag_api/:
+
+    python -m benchmarks.bench_partition --pages 100 --workers 1 2 4
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pypdf import PdfReader, PdfWriter
+from app.partitioning import iter_partitioned_elements
+
+SAMPLE_PDFS = os.path.join(os.path.dirname(__file__), "..", "data", "**", "*.pdf")
+
+
+def build_pdf(path, pages):
+    sources = [PdfReader(sample) for sample in sorted(glob.glob(SAMPLE_PDFS, recursive=True))]
+    writer = PdfWriter()
+    while len(writer.pages) < pages:
+        for reader in sources:
+            for page in reader.pages:
+                if len(writer.pages) < pages:
+                    writer.add_page(page)
+    with open(path, "wb") as pdf_file:
+        writer.write(pdf_file)
+
+
+def measure(pdf_path, workers, window):
+    pages = 0
+
+    def on_pages(done):
+        nonlocal pages
+        pages = done
+
+    start = time.perf_counter()
+    elements = sum(1 for _ in iter_partitioned_elements(pdf_path, window=window, on_pages=on_pages, workers=workers))
+    elapsed = time.perf_counter() - start
+    return {
+        "workers": workers,
+        "window": window,
+        "pages": pages,
+        "elements": elements,
+        "seconds": round(elapsed, 2),
+        "pages_per_sec": round(pages / elapsed, 2),
+        # ru_maxrss is in KiB on Linux; children reports the largest worker.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_worker_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--window", type=int, default=10)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--measure", metavar="PDF", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.workers[0], args.window)))
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        pdf_path = os.path.join(workdir, "bench.pdf")
+        build_pdf(pdf_path, args.pages)
+        configs = [(1, args.pages)] + [(workers, args.window) for workers in args.workers]
+        for workers, window in configs:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_partition", "--measure", pdf_path,
+                 "--workers", str(workers), "--window", str(window)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            label = "whole document" if window >= args.pages else f"{workers} worker(s)"
+            print(f"{label:<16} window={result['window']:<4} {result['pages_per_sec']:7.2f} pages/s  "
+                  f"peak rss={result['peak_rss_mb']:7.1f}MB  peak worker rss={result['peak_worker_rss_mb']:7.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
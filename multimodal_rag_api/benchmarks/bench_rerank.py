@@ -0,0 +1,87 @@
+"""Hybrid top-k vs. over-fetch + local rerank on the sample documents.
+
+Ingests the bundled sample PDFs, then answers benchmarks.probes twice:
+straight hybrid retrieval of --k chunks, and hybrid retrieval of
+--candidates chunks reranked down to --top-k. Reports hit rate and MRR
+of the chunks that would reach the LLM, their prompt tokens, and the
+reranker's own latency. Dense vectors come from the offline lexical
+proxy. Needs unstructured[pdf] installed.
+
+Run from multimodal_rag_api/:
+
+    python -m benchmarks.bench_rerank --candidates 50 --top-k 4
+    RERANKER=onnx RERANK_MODEL_DIR=./models/reranker python -m benchmarks.bench_rerank
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+from app.chunking import chunk_elements, get_tokenizer
+from app.config import settings
+from app.partitioning import iter_partitioned_elements
+from app.query import aembed_question, ahybrid_retrieve, arerank
+from app.rag_pipeline import sync_document
+from app.resources import ResourceRegistry
+from .fakes import fake_llm_factory, lexical_embeddings_factory
+from .probes import SAMPLE_PROBES, is_relevant, sample_pdfs
+
+PRODUCT = "samples"
+
+
+def seed(resources):
+    for pdf_path in sample_pdfs():
+        chunks = chunk_elements(iter_partitioned_elements(pdf_path, workers=1))
+        sync_document(chunks, PRODUCT, os.path.basename(pdf_path), resources.vectorstores, resources.catalog,
+                      resources.embeddings, keyword_index=resources.keyword_index)
+
+
+def first_relevant(docs, phrase):
+    for rank, doc in enumerate(docs, 1):
+        if is_relevant(doc.page_content, phrase):
+            return rank
+    return None
+
+
+async def run(resources, k, candidates, top_k):
+    tokenizer = get_tokenizer(settings.CHUNK_TOKENIZER)
+    results = {"hybrid": [], "rerank": []}
+    timings = []
+    for question, phrase in SAMPLE_PROBES:
+        question_vector = await aembed_question(resources, question)
+        docs = await ahybrid_retrieve(resources, PRODUCT, question, question_vector, k)
+        results["hybrid"].append((first_relevant(docs, phrase), docs))
+        docs = await ahybrid_retrieve(resources, PRODUCT, question, question_vector, candidates)
+        docs, rerank_ms = await arerank(resources, question, docs, top_k)
+        results["rerank"].append((first_relevant(docs, phrase), docs))
+        timings.append(rerank_ms)
+
+    for label, rows in results.items():
+        hits = sum(rank is not None for rank, _ in rows)
+        mrr = sum(1 / rank for rank, _ in rows if rank) / len(rows)
+        tokens = statistics.mean(sum(len(tokenizer.encode(doc.page_content)) for doc in docs) for _, docs in rows)
+        print(f"{label:<7} hit={hits / len(rows):.2f}  mrr={mrr:.2f}  context tokens={tokens:6.0f}")
+    timings.sort()
+    print(f"reranker={resources.reranker.name}  candidates={candidates}  "
+          f"mean={statistics.mean(timings):.2f}ms  p95={timings[int(0.95 * (len(timings) - 1))]:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--k", type=int, default=5, help="chunks sent to the LLM without reranking")
+    parser.add_argument("--candidates", type=int, default=settings.RERANK_CANDIDATES)
+    parser.add_argument("--top-k", type=int, default=settings.RERANK_TOP_K)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        resources = ResourceRegistry(persist_directory, lexical_embeddings_factory(), fake_llm_factory())
+        try:
+            seed(resources)
+            resources.reranker
+            asyncio.run(run(resources, args.k, args.candidates, args.top_k))
+        finally:
+            resources.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Per-request client construction vs. the pooled ResourceRegistry.
+
+Run from multimodal_rag_api/:
+
+    python -m benchmarks.bench_resources --queries 200
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from app.resources import ResourceRegistry
+from app.vector_routing import VectorStoreRouter
+from .fakes import FakeEmbeddings, FakeChatModel, fake_embeddings_factory, fake_llm_factory
+from .harness import seeded_registry
+
+
+def seed(persist_directory, products, chunks_per_product):
+    seeded_registry(persist_directory, products, chunks_per_product).close()
+
+
+def answer(vectorstores, llm, product, question):
+    vectorstore = vectorstores.for_product(product)
+    search_filter = vectorstores.product_filter(product)
+    vectorstore.as_retriever(search_kwargs={"k": 1, "filter": search_filter}).invoke("test")
+    docs = vectorstore.as_retriever(search_kwargs={"k": 5, "filter": search_filter}).invoke(question)
+    context_text = '\n'.join(doc.page_content for doc in docs)
+    messages = [
+        {"role": "system", "content": "Answer from the context."},
+        {"role": "user", "content": f"Context:\n{context_text}\n\nQuestion: {question}\n\nAnswer:"}
+    ]
+    return llm.invoke(messages).content
+
+
+def per_request(persist_directory, product, question):
+    embeddings = FakeEmbeddings()
+    vectorstores = VectorStoreRouter(persist_directory, embeddings)
+    llm = FakeChatModel()
+    try:
+        return answer(vectorstores, llm, product, question)
+    finally:
+        embeddings.http_client.close()
+        llm.http_client.close()
+
+
+def run(label, fn, queries, products):
+    timings = []
+    for i in range(queries):
+        start = time.perf_counter()
+        fn(f"product-{i % products}", f"What is in chunk {i}?")
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"{label:<12} mean={statistics.mean(timings):7.2f}ms  "
+          f"p50={timings[len(timings) // 2]:7.2f}ms  p95={timings[int(len(timings) * 0.95)]:7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--products", type=int, default=5)
+    parser.add_argument("--chunks", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        seed(persist_directory, args.products, args.chunks)
+
+        run("per-request", lambda product, question: per_request(persist_directory, product, question),
+            args.queries, args.products)
+
+        resources = ResourceRegistry(persist_directory, fake_embeddings_factory(), fake_llm_factory())
+        try:
+            run("pooled", lambda product, question: answer(resources.vectorstores, resources.llm, product, question),
+                args.queries, args.products)
+        finally:
+            resources.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""One global collection with a product filter vs. one collection per product.
+
+For each product count, stores --chunks random vectors per product in
+both layouts and times k-NN searches for random products, plus dropping
+one product. Vectors are written straight to Chroma, so no embedding
+model is involved.
+
+Run from multimodal_rag_api/:
+
+    python -m benchmarks.bench_sharding --products 10 100 1000 --chunks 50
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+import numpy as np
+from app.vector_routing import VectorStoreRouter
+
+
+def seed(vectorstores, products, chunks, dimension, rng):
+    for p in range(products):
+        product = f"product-{p}"
+        vectors = rng.standard_normal((chunks, dimension), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectorstores.collection(product).upsert(
+            ids=[f"{product}-{i}" for i in range(chunks)],
+            embeddings=vectors,
+            documents=[f"{product} chunk {i}" for i in range(chunks)],
+            metadatas=[{"product": product, "document": "doc.pdf", "chunk_id": i} for i in range(chunks)]
+        )
+
+
+def measure(vectorstores, products, queries, dimension, k, rng):
+    # The first search of a product pays for opening its collection; later ones are warm.
+    picks = random.Random(1)
+    searched = set()
+    cold = []
+    warm = []
+    for _ in range(queries):
+        product = f"product-{picks.randrange(products)}"
+        vector = rng.standard_normal(dimension).tolist()
+        start = time.perf_counter()
+        docs = vectorstores.search(product, vector, k)
+        (warm if product in searched else cold).append((time.perf_counter() - start) * 1000)
+        searched.add(product)
+        assert all(doc.metadata["product"] == product for doc in docs)
+    warm.sort()
+    start = time.perf_counter()
+    vectorstores.delete_product("product-0")
+    drop = (time.perf_counter() - start) * 1000
+    return statistics.mean(cold), statistics.mean(warm), warm[int(len(warm) * 0.95)], drop
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--chunks", type=int, default=50, help="chunks per product")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    for products in args.products:
+        for sharding in ("global", "product"):
+            with tempfile.TemporaryDirectory() as persist_directory:
+                rng = np.random.default_rng(0)
+                vectorstores = VectorStoreRouter(persist_directory, sharding=sharding)
+                try:
+                    start = time.perf_counter()
+                    seed(vectorstores, products, args.chunks, args.dimension, rng)
+                    ingest = time.perf_counter() - start
+                    cold, warm, p95, drop = measure(vectorstores, products, args.queries, args.dimension, args.k, rng)
+                finally:
+                    vectorstores.close()
+            print(f"products={products:<5} {sharding:<8} first search={cold:7.2f}ms  warm mean={warm:7.2f}ms  "
+                  f"warm p95={p95:7.2f}ms  drop product={drop:8.2f}ms  ingest={ingest:6.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Time to first token: POST /rag/query vs. the SSE POST /rag/query/stream.
+
+Run from multimodal_rag_api/:
+
+    python -m benchmarks.bench_streaming --queries 20 --token-latency 0.02
+"""
+import argparse
+import statistics
+import tempfile
+import time
+import httpx
+from .fakes import fake_llm_factory
+from .harness import seeded_registry, offline_app, ServerThread
+
+
+def summarize(label, values):
+    values = sorted(values)
+    print(f"{label:<28} p50={values[len(values) // 2]:8.1f}ms  mean={statistics.mean(values):8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    parser.add_argument("--answer-tokens", type=int, default=150)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        resources = seeded_registry(persist_directory, llm_factory=fake_llm_factory(args.latency, args.token_latency, args.answer_tokens))
+        with ServerThread(offline_app(resources)) as server, httpx.Client(base_url=server.url, timeout=60) as client:
+            blocking = []
+            for i in range(args.queries):
+                start = time.perf_counter()
+                client.post("/rag/query", json={"product": "product-0", "question": f"blocking question {i}"}).raise_for_status()
+                blocking.append((time.perf_counter() - start) * 1000)
+
+            first_token, total = [], []
+            for i in range(args.queries):
+                start = time.perf_counter()
+                seen_token = False
+                with client.stream("POST", "/rag/query/stream", json={"product": "product-0", "question": f"streamed question {i}"}) as response:
+                    for line in response.iter_lines():
+                        if line == "event: token" and not seen_token:
+                            first_token.append((time.perf_counter() - start) * 1000)
+                            seen_token = True
+                total.append((time.perf_counter() - start) * 1000)
+
+    summarize("/rag/query first byte", blocking)
+    summarize("/rag/query/stream 1st token", first_token)
+    summarize("/rag/query/stream complete", total)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Uploading new PDFs vs. the same PDFs under another product.
+
+Uploads --documents synthetic manuals to one product through the real app
+(partitioned and embedded), then the same files to a second product,
+whose jobs copy the stored chunks and vectors instead. Reports docs/s,
+embedding calls and the bytes kept under DATA_DIR for each pass.
+
+Run from multimodal_rag_api/ (needs unstructured):
+
+    python -m benchmarks.bench_upload --documents 100
+"""
+import argparse
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from .bench_e2e import configure, ingest_api
+from .corpus import synthetic_corpus
+from .harness import ServerThread
+
+
+def stored_bytes(directory):
+    """Bytes on disk under `directory`, counting hard-linked files once."""
+    seen = set()
+    total = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            stat = os.stat(os.path.join(root, name))
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_size
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        configure(SimpleNamespace(dimension=1024, embed_latency=args.embed_latency, llm_latency=0.0, token_latency=0.0,
+                                  answer_tokens=0), directory)
+        from app.main import app
+        with ServerThread(app) as server:
+            for product in ("original", "duplicate"):
+                corpus = [{**document, "product": product} for document in synthetic_corpus(args.documents, 1, args.pages)]
+                pdf_directory = tempfile.mkdtemp(dir=directory)
+                # Every text sent to the embedding model is an embedding cache miss.
+                misses = app.state.resources.embedding_cache.stats()["misses"]
+                started = time.perf_counter()
+                chunks = ingest_api(server.url, corpus, pdf_directory)
+                elapsed = time.perf_counter() - started
+                embedded = app.state.resources.embedding_cache.stats()["misses"] - misses
+                print(f"{product:<10} {args.documents} docs, {chunks} chunks in {elapsed:6.2f}s  "
+                      f"{args.documents / elapsed:7.1f} docs/s  texts embedded={embedded}  "
+                      f"DATA_DIR={stored_bytes(os.path.join(directory, 'data')) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Chroma vs. the in-process NumPy backend: parity, latency and size.
+
+Stores clustered random vectors for --products products in each backend
+(Chroma with a filtered global collection and with per-product
+collections; NumPy float32, int8, and int8 with IVF), then runs the same
+per-product k-NN queries. Reports recall@k against an exact brute-force
+search, top-k overlap with Chroma's global collection (parity), search
+latency, ingest time and the size of the store on disk.
+
+Run from multimodal_rag_api/:
+
+    python -m benchmarks.bench_vector_backends --products 20 --chunks 2000 --dimension 768
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import numpy as np
+from app.config import settings
+from app.numpy_store import NumpyVectorStore
+from app.vector_routing import VectorStoreRouter
+
+BACKENDS = {
+    "chroma/global": lambda directory, args: VectorStoreRouter(directory, sharding="global"),
+    "chroma/product": lambda directory, args: VectorStoreRouter(directory, sharding="product"),
+    "numpy/float32": lambda directory, args: NumpyVectorStore(directory, quantization="float32", ivf_lists=0),
+    "numpy/int8": lambda directory, args: NumpyVectorStore(directory, quantization="int8", ivf_lists=0),
+    "numpy/int8+ivf": lambda directory, args: NumpyVectorStore(directory, quantization="int8", ivf_lists=args.ivf_lists),
+}
+
+
+def corpus(products, chunks, dimension, seed=0):
+    # Vectors scattered around a few topics per product, normalized like OpenAI embeddings.
+    rng = np.random.default_rng(seed)
+    data = {}
+    for p in range(products):
+        topics = rng.standard_normal((8, dimension)).astype(np.float32)
+        vectors = topics[rng.integers(0, 8, chunks)] + 0.6 * rng.standard_normal((chunks, dimension)).astype(np.float32)
+        data[f"product-{p}"] = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return data
+
+
+def queries(data, count, seed=1):
+    rng = np.random.default_rng(seed)
+    picks = random.Random(seed)
+    result = []
+    for _ in range(count):
+        product = picks.choice(sorted(data))
+        vector = data[product][rng.integers(len(data[product]))] + 0.3 * rng.standard_normal(data[product].shape[1])
+        result.append((product, (vector / np.linalg.norm(vector)).astype(np.float32)))
+    return result
+
+
+def exact(data, product, vector, k):
+    distances = ((data[product] - vector) ** 2).sum(axis=1)
+    return [f"{product}-{i}" for i in np.argsort(distances)[:k]]
+
+
+def disk_bytes(directory):
+    # Allocated blocks: the memmap files are grown sparsely ahead of use.
+    return sum(os.stat(os.path.join(root, name)).st_blocks * 512 for root, _, names in os.walk(directory) for name in names)
+
+
+def run(label, factory, args, data, probes):
+    with tempfile.TemporaryDirectory() as directory:
+        vectorstores = factory(directory, args)
+        try:
+            start = time.perf_counter()
+            for product, vectors in data.items():
+                for offset in range(0, len(vectors), 1000):
+                    block = vectors[offset:offset + 1000]
+                    ids = [f"{product}-{offset + i}" for i in range(len(block))]
+                    vectorstores.upsert(product, ids, block.tolist(), ids,
+                                        [{"product": product, "document": "doc.pdf", "chunk_id": offset + i}
+                                         for i in range(len(block))])
+            ingest = time.perf_counter() - start
+            # Warm up: opens Chroma collections and builds IVF lists outside the timings.
+            for product in data:
+                vectorstores.search(product, probes[0][1].tolist(), args.k)
+            timings = []
+            results = []
+            for product, vector in probes:
+                start = time.perf_counter()
+                docs = vectorstores.search(product, vector.tolist(), args.k)
+                timings.append((time.perf_counter() - start) * 1000)
+                results.append([doc.id for doc in docs])
+            size = disk_bytes(directory)
+        finally:
+            vectorstores.close()
+    timings.sort()
+    return {"label": label, "results": results, "ingest": ingest, "mean": statistics.mean(timings),
+            "p95": timings[int(len(timings) * 0.95)], "bytes": size}
+
+
+def overlap(results, reference, k):
+    return statistics.mean(len(set(a) & set(b)) / k for a, b in zip(results, reference))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--chunks", type=int, default=2000, help="chunks per product")
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ivf-lists", type=int, default=32)
+    parser.add_argument("--ivf-probes", type=int, default=8)
+    parser.add_argument("--backends", nargs="+", choices=sorted(BACKENDS), default=list(BACKENDS))
+    args = parser.parse_args()
+    settings.VECTOR_IVF_MIN_ROWS = min(settings.VECTOR_IVF_MIN_ROWS, args.chunks)
+    settings.VECTOR_IVF_PROBES = args.ivf_probes
+
+    data = corpus(args.products, args.chunks, args.dimension)
+    probes = queries(data, args.queries)
+    truth = [exact(data, product, vector, args.k) for product, vector in probes]
+    reference = None
+    for label in args.backends:
+        result = run(label, BACKENDS[label], args, data, probes)
+        reference = reference or (result["results"] if label == "chroma/global" else None)
+        parity = f"{overlap(result['results'], reference, args.k):.3f}" if reference else "  n/a"
+        print(f"{label:<15} recall@{args.k}={overlap(result['results'], truth, args.k):.3f}  parity={parity}  "
+              f"search mean={result['mean']:6.2f}ms  p95={result['p95']:6.2f}ms  ingest={result['ingest']:6.1f}s  "
+              f"disk={result['bytes'] / 2 ** 20:7.1f}MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Synthetic product manuals: PDFs with a text layer, and the questions they answer.
+
+Every document is generated from its index alone, so a corpus of any size
+is the same on every run and documents can be produced one at a time.
+Each manual has titled sections describing parts by part number, and
+every part yields a fact: a question and a phrase its answer must contain.
+"""
+import os
+import random
+import textwrap
+from types import SimpleNamespace
+
+PART_KINDS = ["valve", "pump", "bearing", "seal kit", "sensor", "actuator", "filter", "relay", "gasket", "motor"]
+MATERIALS = ["stainless steel", "brass", "aluminium", "PTFE", "nitrile", "cast iron"]
+FILLER = ("inspect clean replace tighten calibrate lubricate verify record monitor adjust the assembly housing "
+          "before after during each service interval operator technician schedule pressure flow temperature "
+          "warning caution note ensure supply power isolate").split()
+LINE_CHARS = 95
+LINES_PER_PAGE = 44
+
+
+class Element:
+    """A partitioned element as unstructured returns it: a category, text and metadata."""
+
+    def __init__(self, category, text="", page=None, **metadata):
+        self.category = category
+        self.text = text
+        self.metadata = SimpleNamespace(**{"page_number": page, "image_path": None, "text_as_html": None, **metadata})
+
+    def __str__(self):
+        return self.text
+
+
+def sentence(rng, words=14):
+    return " ".join(rng.choice(FILLER) for _ in range(words)).capitalize() + "."
+
+
+def synthetic_document(index, products=10, pages=3):
+    """Document `index`: its product, file name, pages of (category, text) blocks, and its facts."""
+    rng = random.Random(index)
+    product = f"product-{index % products}"
+    blocks = []
+    facts = []
+    part = 0
+    for page in range(1, pages + 1):
+        for section in range(2):
+            blocks.append((page, "Title", f"Section {page}.{section + 1}: {rng.choice(PART_KINDS).title()} maintenance"))
+            for _ in range(3):
+                kind = rng.choice(PART_KINDS)
+                number = f"PN-{index:05d}-{part:02d}"
+                torque = rng.randint(5, 250)
+                material = rng.choice(MATERIALS)
+                blocks.append((page, "NarrativeText",
+                               f"Part {number} is the {kind} of the {product.replace('-', ' ')} line, made of {material}. "
+                               f"Tighten it to {torque} Nm. " + " ".join(sentence(rng) for _ in range(3))))
+                facts.append((f"What torque should part {number} be tightened to?", f"{torque} Nm"))
+                part += 1
+    return {"product": product, "name": f"manual-{index:05d}.pdf", "blocks": blocks, "facts": facts}
+
+
+def synthetic_corpus(documents, products=10, pages=3):
+    for index in range(documents):
+        yield synthetic_document(index, products, pages)
+
+
+def document_elements(document):
+    """The elements unstructured would return for the document's PDF."""
+    return [Element(category, text, page) for page, category, text in document["blocks"]]
+
+
+def escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def pdf_bytes(document):
+    """A minimal PDF of the document: Helvetica text, titles larger, wrapped to the page width."""
+    pages = {}
+    for page, category, text in document["blocks"]:
+        size = 14 if category == "Title" else 10
+        width = LINE_CHARS * 10 // size
+        pages.setdefault(page, []).extend((size, line) for line in textwrap.wrap(text, width))
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for page in sorted(pages):
+        operations = []
+        y = 756
+        for size, line in pages[page][:LINES_PER_PAGE]:
+            operations.append(f"BT /F1 {size} Tf 56 {y} Td ({escape(line)}) Tj ET")
+            y -= size + 6
+        stream = "\n".join(operations).encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+                       f"/Contents {len(objects)} 0 R >>".encode())
+        kids.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def write_pdf(document, directory):
+    path = os.path.join(directory, document["name"])
+    with open(path, "wb") as out:
+        out.write(pdf_bytes(document))
+    return path
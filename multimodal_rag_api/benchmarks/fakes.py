@@ -0,0 +1,91 @@
+import asyncio
+import hashlib
+import random
+import threading
+import time
+import httpx
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app import offline
+from app.offline import LexicalEmbeddings
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic stand-in for OpenAIEmbeddings.
+
+    Like the real client it builds its own HTTP client when none is shared
+    with it, so per-request construction costs roughly what it does in prod.
+    """
+
+    def __init__(self, dimension=256, latency=0.0, http_client=None, latency_per_text=0.0, error_rate=0.0, seed=0):
+        self.dimension = dimension
+        self.model = f"fake-{dimension}"
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+        self.error_rate = error_rate
+        self.http_client = http_client or httpx.Client()
+        self.calls = 0
+        self.texts_embedded = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimension)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def _start(self, texts):
+        with self._lock:
+            self.calls += 1
+            rate_limited = self._random.random() < self.error_rate
+        return self.latency + self.latency_per_text * len(texts), rate_limited
+
+    def _finish(self, texts, rate_limited):
+        if rate_limited:
+            raise FakeRateLimitError("429 Too Many Requests")
+        with self._lock:
+            self.texts_embedded += len(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_documents(self, texts):
+        delay, rate_limited = self._start(texts)
+        if delay:
+            time.sleep(delay)
+        return self._finish(texts, rate_limited)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        delay, rate_limited = self._start(texts)
+        if delay:
+            await asyncio.sleep(delay)
+        return self._finish(texts, rate_limited)
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeChatModel(offline.FakeChatModel):
+    """app.offline.FakeChatModel holding an HTTP client, as ChatOpenAI does.
+
+    Built without one it makes its own, like FakeEmbeddings.
+    """
+
+    def __init__(self, latency=0.0, http_client=None, token_latency=0.0, answer_tokens=0):
+        super().__init__(latency, token_latency, answer_tokens)
+        self.http_client = http_client or httpx.Client()
+
+
+def fake_embeddings_factory(dimension=256, latency=0.0, latency_per_text=0.0, error_rate=0.0):
+    return lambda resources: FakeEmbeddings(dimension, latency, resources.http_client, latency_per_text, error_rate)
+
+def lexical_embeddings_factory(dimension=1024, latency=0.0):
+    return lambda resources: LexicalEmbeddings(dimension, latency)
+
+def fake_llm_factory(latency=0.0, token_latency=0.0, answer_tokens=0):
+    return lambda resources: FakeChatModel(latency, resources.http_client, token_latency, answer_tokens)
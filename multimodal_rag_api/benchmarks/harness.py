@@ -0,0 +1,62 @@
+import socket
+import threading
+import time
+from contextlib import asynccontextmanager
+import uvicorn
+from fastapi import FastAPI
+from app.metrics import MetricsMiddleware
+from app.rag_pipeline import sync_document
+from app.resources import ResourceRegistry
+from .fakes import fake_embeddings_factory, fake_llm_factory
+
+
+def seeded_registry(persist_directory, products=5, chunks_per_product=200, embeddings_factory=None, llm_factory=None):
+    resources = ResourceRegistry(persist_directory, embeddings_factory or fake_embeddings_factory(),
+                                 llm_factory or fake_llm_factory())
+    for p in range(products):
+        chunks = [{"text": f"Product {p} chunk {i}: lorem ipsum dolor sit amet {i * p}.", "metadata": {}}
+                  for i in range(chunks_per_product)]
+        sync_document(chunks, f"product-{p}", f"doc-{p}.pdf", resources.vectorstores, resources.catalog,
+                      resources.embeddings, keyword_index=resources.keyword_index)
+    return resources
+
+
+def offline_app(resources):
+    """The API router wired to an already-built registry."""
+    from app.api import router
+
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.resources = resources
+        yield
+        await resources.aclose()
+
+    app = FastAPI(lifespan=lifespan)
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(router)
+    return app
+
+
+class ServerThread:
+    """Runs an app under uvicorn on a free local port for the duration of a with-block."""
+
+    def __init__(self, app):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
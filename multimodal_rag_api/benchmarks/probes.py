@@ -0,0 +1,39 @@
+"""Questions about the bundled sample documents and a phrase each answer must contain.
+
+A retrieved chunk counts as relevant when it contains the phrase.
+"""
+import glob
+import os
+
+SAMPLE_PDFS = os.path.join(os.path.dirname(__file__), "..", "data", "**", "*.pdf")
+
+SAMPLE_PROBES = [
+    ("Which vector database did the AI-powered product assistant chatbot use?", "OpenSearch"),
+    ("What was the tech stack of the SAP DMS Adapter feature development?", "MongoDB"),
+    ("By how much did the bridge load calculation web application reduce manual effort?", "60%"),
+    ("How much did feature integration and hyperparameter tuning improve forecasting accuracy in the master thesis?",
+     "65% to 77%"),
+    ("How much did the Customer Satisfaction Index increase?", "8.5 to 9.2"),
+    ("Which languages does Anilchoudary speak natively?", "Kannada"),
+    ("What is Smart Archive?", "document management system"),
+    ("Which master degree is listed under education?", "Computational Science"),
+    ("Which certifications are listed?", "Certified Data Scientist"),
+    ("What did the junior software developer automate with Terraform?", "AWS cloud infrastructure"),
+    ("Which languages are used for backend services and frontend modules in the current role?",
+     "Go for backend services"),
+    ("Which personal projects are mentioned in the cover letter?", "recommendation engine"),
+    ("Um wie viel reduzierte die Webanwendung für Brückenlasten den manuellen Aufwand?", "60 %"),
+    ("Welche Sprachen spricht Anilchoudary?", "Kannada"),
+]
+
+
+def sample_pdfs():
+    return sorted(glob.glob(SAMPLE_PDFS, recursive=True))
+
+
+def normalize(text):
+    return " ".join(text.casefold().split())
+
+
+def is_relevant(text, phrase):
+    return normalize(phrase) in normalize(text)
@@ -0,0 +1,38 @@
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app.api import ADMIN_API_KEY
+from app.config import settings
+from benchmarks.bench_e2e import ingest_direct
+from benchmarks.corpus import synthetic_corpus
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    """The app on offline models, with four synthetic manuals of product-0 ingested."""
+    directory = tmp_path_factory.mktemp("rag")
+    with pytest.MonkeyPatch.context() as patch:
+        for name, value in {
+            "EMBEDDING_PROVIDER": "fake", "LLM_PROVIDER": "fake", "FAKE_EMBEDDING_LATENCY": 0.0,
+            "FAKE_LLM_LATENCY": 0.0, "SERVER_TIMING": True, "CHROMA_DIR": str(directory / "chroma_db"),
+            "JOBS_DB": str(directory / "jobs.sqlite3"), "DATA_DIR": str(directory / "data"),
+            "EXTRACTED_DOCS_DIR": str(directory / "extracted")
+        }.items():
+            patch.setattr(settings, name, value)
+        from app.main import app
+        with TestClient(app) as client:
+            ingest_direct(app.state.resources, synthetic_corpus(4, 1, 1))
+            yield client
+
+
+@pytest.fixture
+def finished_job(client):
+    """Waits for an ingestion job to finish; returns its record."""
+    def wait(job_id):
+        for _ in range(200):
+            job = client.get(f"/admin/jobs/{job_id}", headers={"x-api-key": ADMIN_API_KEY}).json()
+            if job["status"] in ("completed", "failed", "unchanged"):
+                return job
+            time.sleep(0.05)
+        raise AssertionError(f"job {job_id} did not finish")
+    return wait
@@ -0,0 +1,26 @@
+import time
+import numpy as np
+from app.answer_cache import AnswerCache
+from app.api import ADMIN_API_KEY
+
+
+def test_expired_best_match_falls_through_to_a_valid_one():
+    cache = AnswerCache(max_entries=10, ttl=60, threshold=0.9)
+    cache.put("p", "old question", [1.0, 0.0], "old answer", 0)
+    cache.put("p", "new question", [0.95, np.sqrt(1 - 0.95 ** 2)], "new answer", 0)
+    cache._entries[("p", "old question")]["created"] = time.time() - 120
+
+    assert cache.get_similar("p", [1.0, 0.0]) == "new answer"
+    assert cache.stats()["entries"] == 1
+    assert cache._matrices["p"][0] == ["new question"]
+
+
+def test_every_request_counts_once(client):
+    question = {"product": "product-0", "question": "What torque should part PN-00001-03 be tightened to?"}
+    before = client.get("/admin/stats", headers={"x-api-key": ADMIN_API_KEY}).json()["answer_cache"]
+    for _ in range(2):
+        assert client.post("/rag/query", json=question).status_code == 200
+    after = client.get("/admin/stats", headers={"x-api-key": ADMIN_API_KEY}).json()["answer_cache"]
+
+    assert after["misses"] - before["misses"] == 1
+    assert after["exact_hits"] - before["exact_hits"] == 1
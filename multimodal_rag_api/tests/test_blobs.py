@@ -0,0 +1,77 @@
+import os
+from app.api import ADMIN_API_KEY
+from app.blobs import BlobStore, product_dir
+from app.config import settings
+from benchmarks.corpus import document_elements, pdf_bytes, synthetic_document
+
+HEADERS = {"x-api-key": ADMIN_API_KEY}
+
+
+def stored_files(directory):
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(directory) for name in names)
+
+
+def multipart(filename, data, boundary="test-boundary"):
+    head = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n').encode()
+    return head + data + f"\r\n--{boundary}--\r\n".encode(), f"multipart/form-data; boundary={boundary}"
+
+
+def test_oversized_upload_is_refused_without_leaving_a_blob(client, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_MAX_MB", 1)
+    blobs = BlobStore()
+    before = stored_files(blobs.root)
+    body, content_type = multipart("big.pdf", b"x" * (2 * 1024 * 1024))
+
+    declared = client.post("/admin/upload", params={"product": "blobs"}, content=body,
+                           headers={**HEADERS, "content-type": content_type})
+    # Without a content-length the body is cut off while streaming.
+    streamed = client.post("/admin/upload", params={"product": "blobs"},
+                           content=(body[start:start + 65536] for start in range(0, len(body), 65536)),
+                           headers={**HEADERS, "content-type": content_type})
+
+    assert declared.status_code == streamed.status_code == 413
+    assert stored_files(blobs.root) == before
+    assert not os.path.exists(os.path.join(product_dir("blobs"), "big.pdf"))
+
+
+def test_same_file_is_stored_once_and_its_chunks_reused(client, finished_job, monkeypatch):
+    document = synthetic_document(40, 1, 2)
+    monkeypatch.setattr("app.jobs.iter_partitioned_elements", lambda *args, **kwargs: document_elements(document))
+    data = pdf_bytes(document)
+
+    def upload(product):
+        return client.post("/admin/upload", params={"product": product}, headers=HEADERS,
+                           files={"file": ("manual.pdf", data, "application/pdf")}).json()
+
+    first = finished_job(upload("blobs-a")["job_id"])
+    second = finished_job(upload("blobs-b")["job_id"])
+    again = upload("blobs-a")
+
+    assert first["status"] == second["status"] == "completed"
+    assert second["chunks_reused"] == second["chunks_stored"] == first["chunks_stored"] > 0
+    assert again["status"] == "unchanged"
+    blob = BlobStore().path(first["file_hash"])
+    assert [path for path in stored_files(BlobStore().root) if os.path.basename(path) == first["file_hash"]] == [blob]
+    assert os.stat(blob).st_nlink == 3
+
+
+def test_prune_removes_only_unlinked_blobs(tmp_path):
+    blobs = BlobStore(str(tmp_path / "blobs"))
+    with open(__file__, "rb") as source:
+        kept = blobs.store(source, 1 << 20)
+    writer = blobs.writer(1 << 20)
+    writer.write(b"no document links to this")
+    dropped = writer.commit()
+    link = blobs.link(kept, str(tmp_path / "product" / "doc.pdf"))
+    abandoned = os.path.join(blobs.partial_directory, "interrupted.part")
+    with open(abandoned, "wb") as partial:
+        partial.write(b"interrupted upload")
+
+    assert blobs.prune(min_age=0) == 2
+    assert os.path.exists(blobs.path(kept)) and not os.path.exists(blobs.path(dropped))
+    assert not os.path.exists(abandoned)
+
+    os.remove(link)
+    assert blobs.prune(min_age=0) == 1
+    assert stored_files(blobs.root) == []
@@ -0,0 +1,13 @@
+from app.context import context_budget
+from app.query import build_messages
+
+
+def system_prompt(context_text, tokens=None):
+    return build_messages(context_text, "What is it?", tokens)[0]["content"]
+
+
+def test_answer_length_follows_the_share_of_the_token_budget():
+    budget = context_budget()
+    assert "concise" in system_prompt("short context")
+    assert "focused" in system_prompt("short context", budget // 10)
+    assert "comprehensive" in system_prompt("short context", budget // 2)
@@ -0,0 +1,30 @@
+import zipfile
+import pytest
+from app.bulk import source_files
+
+
+def test_zip_is_read_from_inside_its_enclosing_folder_and_closed_after(tmp_path):
+    path = tmp_path / "manuals.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("manuals/alpha/a.pdf", b"a")
+        archive.writestr("manuals/alpha/sub/b.pdf", b"b")
+        archive.writestr("manuals/beta/notes.txt", b"n")
+        archive.writestr("__MACOSX/manuals/alpha/._a.pdf", b"x")
+
+    with source_files(str(path)) as entries:
+        assert [entry[:2] for entry in entries] == [("alpha", "a.pdf"), ("alpha", "sub_b.pdf")]
+        with entries[0][2]() as member:
+            assert member.read() == b"a"
+    with pytest.raises(ValueError):
+        entries[1][2]()
+
+
+def test_loose_files_need_a_default_product(tmp_path):
+    (tmp_path / "alpha").mkdir()
+    (tmp_path / "alpha" / "a.pdf").write_bytes(b"a")
+    (tmp_path / "loose.pdf").write_bytes(b"l")
+
+    with source_files(str(tmp_path)) as entries:
+        assert [entry[:2] for entry in entries] == [("alpha", "a.pdf")]
+    with source_files(str(tmp_path), "misc") as entries:
+        assert [entry[:2] for entry in entries] == [("alpha", "a.pdf"), ("misc", "loose.pdf")]
@@ -0,0 +1,42 @@
+import random
+import pytest
+from app.chunking import Chunker, RegexTokenizer
+from benchmarks.corpus import Element
+
+
+def words(count, word="word"):
+    return " ".join([word] * count)
+
+
+def chunk(elements, max_tokens=40, overlap_tokens=20):
+    return list(Chunker(max_tokens, overlap_tokens, RegexTokenizer()).chunk(elements))
+
+
+def test_overlap_is_dropped_when_it_does_not_fit():
+    chunks = chunk([Element("NarrativeText", words(15, "a")), Element("NarrativeText", words(15, "b")),
+                    Element("NarrativeText", words(38, "c"))])
+    assert [c["metadata"]["tokens"] for c in chunks] == [30, 38]
+    assert chunks[1]["text"] == words(38, "c")
+
+
+def test_overlap_is_kept_when_it_fits():
+    chunks = chunk([Element("NarrativeText", words(15, "a")), Element("NarrativeText", words(15, "b")),
+                    Element("NarrativeText", words(20, "c"))])
+    assert chunks[1]["text"] == words(15, "b") + " " + words(20, "c")
+
+
+def test_long_title_gets_its_own_chunk():
+    chunks = chunk([Element("Title", words(10, "t")), Element("NarrativeText", words(35, "a"))])
+    assert [c["metadata"]["tokens"] for c in chunks] == [10, 35]
+    assert all(c["metadata"]["section"] == words(10, "t") for c in chunks)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_chunks_never_exceed_max_tokens(seed):
+    rng = random.Random(seed)
+    elements = [Element(rng.choice(["Title", "NarrativeText", "NarrativeText", "ListItem"]), words(rng.randint(1, 60)))
+                for _ in range(40)]
+    max_tokens, overlap_tokens = rng.randint(10, 50), rng.randint(0, 30)
+    chunks = chunk(elements, max_tokens, overlap_tokens)
+    assert chunks
+    assert all(c["metadata"]["tokens"] <= max_tokens for c in chunks)
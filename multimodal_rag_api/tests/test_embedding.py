@@ -0,0 +1,42 @@
+import asyncio
+import threading
+from langchain_core.embeddings import Embeddings
+from app.embedding import BatchEmbedder
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+class FlakyEmbeddings(Embeddings):
+    """Embeds a text as [its number]; the first call is rate limited."""
+
+    def __init__(self):
+        self.embedded = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls += 1
+            if self.calls == 1:
+                raise RateLimited("429 Too Many Requests")
+            self.embedded += texts
+        return [[float(text)] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+
+def test_rate_limited_batch_is_retried_alone():
+    texts = [str(i) for i in range(10)]
+    for embed in (lambda embedder: embedder.embed(texts), lambda embedder: asyncio.run(embedder.aembed(texts))):
+        embeddings = FlakyEmbeddings()
+        embedder = BatchEmbedder(embeddings, batch_size=3, max_in_flight=4, requests_per_second=0, backoff_base=0.001)
+
+        assert embed(embedder) == [[float(text)] for text in texts]
+        assert sorted(embeddings.embedded, key=int) == texts
+        assert embedder.retries == 1
@@ -0,0 +1,48 @@
+import json
+import pytest
+from app.keyword_index import exact_terms
+from app.rag_pipeline import chunk_document, sync_document
+from benchmarks.corpus import Element
+
+
+def stages(response):
+    assert response.status_code == 200, response.text
+    return {entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")}
+
+
+@pytest.mark.parametrize("question", ["Skills in AI?", "Does he know SQL?", "experience since 2019"])
+def test_plain_questions_have_no_exact_terms(question):
+    assert exact_terms(question) == []
+
+
+def test_codes_and_quoted_phrases_are_exact_terms():
+    assert exact_terms('Where is PN-00001-02 and "seal kit" in v2.1?') == ["seal kit", "pn-00001-02", "v2.1"]
+
+
+def test_acronym_question_uses_hybrid_retrieval(client):
+    timed = stages(client.post("/rag/query", json={"product": "product-0", "question": "Is the PTFE seal kit rated?"}))
+    assert {"embed", "vector_search", "keyword_search"} <= timed
+
+
+def test_part_number_lookup_skips_embedding(client):
+    timed = stages(client.post("/rag/query", json={"product": "product-0",
+                                                   "question": "What torque should part PN-00002-01 be tightened to?"}))
+    assert "exact_match" in timed
+    assert "embed" not in timed and "vector_search" not in timed
+
+
+def test_part_number_lookup_includes_tables_on_its_pages(client):
+    resources = client.app.state.resources
+    elements = [Element("Title", "Torque settings", 1), Element("NarrativeText", "Tighten part PN-77777-01 firmly.", 1),
+                Element("Table", "PN-77777-01 12 Nm", 1), Element("Title", "Lubrication", 2),
+                Element("NarrativeText", "Unrelated maintenance notes.", 2), Element("Table", "Oil grades 5W-30", 2)]
+    chunks, assets = chunk_document(elements, True)
+    sync_document(chunks, "tables", "manual.pdf", resources.vectorstores, resources.catalog, resources.embeddings,
+                  keyword_index=resources.keyword_index, assets=assets, asset_store=resources.asset_store)
+    question = {"product": "tables", "question": "What torque does PN-77777-01 need?", "rerank": False}
+
+    response = client.post("/rag/query", json=question)
+    assert {"exact_match", "asset_search"} <= stages(response) and "embed" not in stages(response)
+    events = client.post("/rag/query/stream", json={**question, "question": "Torque of PN-77777-01?"}).text
+    sources = json.loads(events.split("event: sources\ndata: ", 1)[1].split("\n", 1)[0])
+    assert [source.get("kind") for source in sources].count("table") == 1
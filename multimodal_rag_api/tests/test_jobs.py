@@ -0,0 +1,63 @@
+import sqlite3
+import time
+from app.jobs import ADDED_COLUMNS, JOB_FIELDS, IngestionQueue, JobStore
+from benchmarks.corpus import document_elements, synthetic_document, write_pdf
+
+
+def finished(store, job_id):
+    for _ in range(200):
+        job = store.get(job_id)
+        if job["status"] not in ("queued", "partitioning", "embedding"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_interrupted_job_is_resumed_from_the_database(client, tmp_path, monkeypatch):
+    resources = client.app.state.resources
+    document = synthetic_document(50, 1, 2)
+    monkeypatch.setattr("app.jobs.iter_partitioned_elements", lambda *args, **kwargs: document_elements(document))
+    path = tmp_path / "jobs.sqlite3"
+    store = JobStore(str(path))
+    job = store.create("jobs", document["name"], write_pdf(document, str(tmp_path)))
+    store.update(job["id"], status="partitioning", pages_parsed=1)
+    store.close()
+
+    queue = IngestionQueue(JobStore(str(path)), resources, max_workers=1)
+    try:
+        assert queue.resume() == 1
+        job = finished(queue.store, job["id"])
+    finally:
+        queue.shutdown()
+
+    assert job["status"] == "completed" and job["chunks_stored"] > 0
+    reopened = JobStore(str(path))
+    assert reopened.get(job["id"]) == job and reopened.active() == []
+    reopened.close()
+    assert resources.catalog.version("jobs", document["name"])[0] == job["file_hash"]
+
+
+def test_older_job_database_gains_the_added_columns(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE jobs (id TEXT PRIMARY KEY, product TEXT NOT NULL, document TEXT NOT NULL, path TEXT NOT NULL, "
+            "status TEXT NOT NULL, pages_parsed INTEGER NOT NULL DEFAULT 0, chunks_total INTEGER NOT NULL DEFAULT 0, "
+            "chunks_embedded INTEGER NOT NULL DEFAULT 0, chunks_stored INTEGER NOT NULL DEFAULT 0, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("INSERT INTO jobs (id, product, document, path, status, created_at, updated_at) "
+                     "VALUES ('old', 'p', 'a.pdf', '/tmp/a.pdf', 'embedding', 1, 1)")
+    conn.close()
+
+    store = JobStore(path)
+    job = store.get("old")
+    active = store.active()
+    store.close()
+
+    assert set(job) == set(JOB_FIELDS)
+    assert {name: job[name] for name in ADDED_COLUMNS} == {
+        "page_strategies": None, "file_hash": None, "chunks_reused": 0, "chunks_deleted": 0, "assets_stored": 0,
+        "copied_from": None, "import_id": None
+    }
+    assert [job["id"] for job in active] == ["old"]
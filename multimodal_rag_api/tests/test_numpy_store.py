@@ -0,0 +1,101 @@
+import os
+import numpy as np
+import pytest
+from app.config import settings
+from app.numpy_store import NumpyVectorStore
+from app.vector_routing import VectorStoreRouter
+
+
+def rows(product, count, dimension=32, seed=0, documents=4):
+    """Clustered unit vectors, like embeddings of related chunks, with ids, texts and metadata."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((8, dimension))
+    vectors = centers[rng.integers(0, 8, count)] + 0.5 * rng.standard_normal((count, dimension))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"{product}-{i}" for i in range(count)]
+    metadatas = [{"product": product, "document": f"doc-{i % documents}.pdf", "chunk_id": i} for i in range(count)]
+    return ids, vectors.astype(np.float32), [f"chunk {i} of {product}" for i in range(count)], metadatas
+
+
+def top_ids(store, product, queries, k=10):
+    return [[doc.id for doc in docs] for docs in store.search_many(product, queries, k)]
+
+
+def overlap(expected, found):
+    return np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(expected, found)])
+
+
+def nearest(product, seed, query_vectors, k=10):
+    ids, vectors, _, _ = rows(product, 2000, seed=seed)
+    distances = ((query_vectors[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    return [[ids[i] for i in order[:k]] for order in np.argsort(distances, axis=1)]
+
+
+def queries(count=20, dimension=32, seed=1):
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.fixture(scope="module")
+def chroma_results(tmp_path_factory):
+    chroma = VectorStoreRouter(str(tmp_path_factory.mktemp("chroma")))
+    for seed, product in enumerate(("alpha", "beta")):
+        ids, vectors, texts, metadatas = rows(product, 2000, seed=seed)
+        chroma.upsert(product, ids, vectors.tolist(), texts, metadatas)
+    results = {product: top_ids(chroma, product, queries()) for product in ("alpha", "beta")}
+    chroma.close()
+    return results
+
+
+# Recall against brute force; Chroma's HNSW index is itself approximate, so agreement with it is looser.
+@pytest.mark.parametrize("quantization, ivf_lists, threshold", [("float32", 0, 1.0), ("int8", 0, 0.9),
+                                                                ("float32", 16, 0.85)])
+def test_top_k_agrees_with_chroma(tmp_path, monkeypatch, chroma_results, quantization, ivf_lists, threshold):
+    monkeypatch.setattr(settings, "VECTOR_IVF_MIN_ROWS", 1000)
+    store = NumpyVectorStore(str(tmp_path), quantization=quantization, ivf_lists=ivf_lists)
+    for seed, product in enumerate(("alpha", "beta")):
+        ids, vectors, texts, metadatas = rows(product, 2000, seed=seed)
+        for start in range(0, 2000, 500):
+            store.upsert(product, ids[start:start + 500], vectors[start:start + 500], texts[start:start + 500],
+                         metadatas[start:start + 500])
+
+    found_before = top_ids(store, "alpha", queries())
+    for seed, product in enumerate(("alpha", "beta")):
+        found = top_ids(store, product, queries())
+        assert all(chunk_id.startswith(product) for ranking in found for chunk_id in ranking)
+        assert overlap(nearest(product, seed, queries()), found) >= threshold
+        assert overlap(chroma_results[product], found) >= min(threshold, 0.85)
+    store.close()
+
+    # The memory-mapped matrices come back as they were written.
+    reopened = NumpyVectorStore(str(tmp_path), ivf_lists=ivf_lists)
+    assert reopened.quantization == quantization
+    assert top_ids(reopened, "alpha", queries()) == found_before
+    reopened.close()
+
+
+def test_deleted_rows_stay_deleted_through_compaction_and_reopen(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), quantization="int8")
+    ids, vectors, texts, metadatas = rows("alpha", 400)
+    other = rows("beta", 400, seed=1)
+    # Interleaved writes leave alpha in many spans, which triggers a compaction.
+    for start in range(0, 400, 20):
+        store.upsert("alpha", ids[start:start + 20], vectors[start:start + 20], texts[start:start + 20],
+                     metadatas[start:start + 20])
+        if start == 100:
+            store.delete("alpha", ids[:50])
+        store.upsert("beta", *(column[start:start + 20] for column in other))
+    assert os.path.exists(os.path.join(store.directory, "vectors-1.bin"))
+    store.delete("alpha", ids[50:60])
+    store.delete_document("alpha", "doc-1.pdf")
+    store.delete_product("beta")
+    store.close()
+
+    store = NumpyVectorStore(str(tmp_path))
+    deleted = set(ids[:60]) | {chunk_id for chunk_id, metadata in zip(ids, metadatas) if metadata["document"] == "doc-1.pdf"}
+    found = {chunk_id for ranking in top_ids(store, "alpha", vectors, k=20) for chunk_id in ranking}
+    assert found and not found & deleted
+    assert store.count() == 400 - len(deleted)
+    assert store.stored_ids("alpha", "doc-1.pdf") == set()
+    assert store.search("beta", vectors[0]) == []
+    store.close()
@@ -0,0 +1,41 @@
+from pathlib import Path
+from app.api import ADMIN_API_KEY
+from app.rag_pipeline import chunk_document, chunk_ids
+from benchmarks.corpus import document_elements, pdf_bytes, synthetic_document
+
+HEADERS = {"x-api-key": ADMIN_API_KEY}
+
+
+def stored_ids(document):
+    return set(chunk_ids(chunk_document(document_elements(document), False)[0], "reingest", "manual.pdf"))
+
+
+def test_edited_copy_reuses_unchanged_chunks_and_bumps_the_version(client, finished_job, monkeypatch):
+    original = synthetic_document(60, 1, 2)
+    blocks = original["blocks"]
+    # Drop section 1.2 and change a torque value in section 2.2.
+    edited = {**original, "blocks": blocks[:4] + blocks[8:-1] + [(2, "NarrativeText", blocks[-1][2].replace("147", "148"))]}
+    versions = {pdf_bytes(document): document for document in (original, edited)}
+    monkeypatch.setattr("app.jobs.iter_partitioned_elements",
+                        lambda path, *args, **kwargs: document_elements(versions[Path(path).read_bytes()]))
+
+    def upload(document):
+        response = client.post("/admin/upload", params={"product": "reingest"}, headers=HEADERS,
+                               files={"file": ("manual.pdf", pdf_bytes(document), "application/pdf")})
+        assert response.status_code in (200, 202), response.text
+        return response.json()
+
+    first = finished_job(upload(original)["job_id"])
+    unchanged = upload(original)
+    second = finished_job(upload(edited)["job_id"])
+    catalog = client.app.state.resources.catalog
+
+    old, new = stored_ids(original), stored_ids(edited)
+    assert first["status"] == "completed" and first["chunks_reused"] == first["chunks_deleted"] == 0
+    assert unchanged["status"] == "unchanged" and unchanged["job_id"] is None and unchanged["version"] == 1
+    assert second["status"] == "completed"
+    assert second["chunks_stored"] - second["chunks_reused"] == len(new - old) > 0
+    assert second["chunks_reused"] == len(new & old) > 0
+    assert second["chunks_deleted"] == len(old - new) > 0
+    assert catalog.version("reingest", "manual.pdf") == (second["file_hash"], 2)
+    assert upload(edited)["status"] == "unchanged"
@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import json
 import os
 
 st.set_page_config(
@@ -253,6 +254,8 @@ if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
 if 'admin_authenticated' not in st.session_state:
     st.session_state.admin_authenticated = False
+if 'products_cache' not in st.session_state:
+    st.session_state.products_cache = None
 
 with st.sidebar:
     st.markdown("### 🔐 Admin Access")
@@ -326,16 +329,18 @@ if st.session_state.admin_authenticated:
                                 params={"product": upload_product}
                             )
                             
-                            if response.status_code == 200:
+                            if response.status_code == 200 and response.json().get("status") == "unchanged":
                                 result = response.json()
-                                st.success("✅ Document uploaded successfully!")
+                                st.info(f"ℹ️ `{result['filename']}` is unchanged since version {result['version']}; nothing to process.")
+                            elif response.status_code in (200, 202):
+                                result = response.json()
+                                st.success("✅ Document uploaded! Processing continues in the background.")
                                 st.markdown(f"""
                                 **Upload Details:**
                                 - 📁 Product: `{result['product']}`
                                 - 📄 File: `{result['filename']}`
-                                - 🧩 Chunks processed: `{result['chunks_stored']}`
+                                - 🆔 Job: `{result['job_id']}`
                                 """)
-                                st.rerun()
                             else:
                                 st.error(f"❌ Upload failed: {response.text}")
                                 
@@ -345,16 +350,41 @@ if st.session_state.admin_authenticated:
         elif uploaded_file is not None and not upload_product.strip():
             st.warning("⚠️ Please enter a product name before uploading.")
         
+        st.markdown("### ⏳ Ingestion Jobs")
+        if st.button("🔄 Refresh Jobs", key="refresh_jobs"):
+            st.rerun()
+        try:
+            jobs_resp = requests.get(f"{API_BASE}/admin/jobs", headers={"x-api-key": "admin123"}, params={"limit": 10})
+            jobs = jobs_resp.json() if jobs_resp.status_code == 200 else []
+        except Exception as e:
+            st.error(f"❌ Could not load jobs: {str(e)}")
+            jobs = []
+        for job in jobs:
+            line = (f"**{job['document']}** ({job['product']}) — `{job['status']}` · "
+                    f"pages: {job['pages_parsed']} · chunks: {job['chunks_embedded']}/{job['chunks_total']} "
+                    f"({job['chunks_reused']} reused)")
+            if job['status'] == 'failed':
+                st.error(f"{line} · {job['error']}")
+            else:
+                st.markdown(line)
+        
         st.markdown('</div>', unsafe_allow_html=True)
 
 with st.sidebar:
     st.markdown("### 🗂️ Available Products")
     
     try:
-        resp = requests.get(f"{API_BASE}/products")
-        if resp.status_code == 200:
+        cached = st.session_state.products_cache
+        headers = {"If-None-Match": cached["etag"]} if cached else {}
+        resp = requests.get(f"{API_BASE}/products", headers=headers)
+        if resp.status_code == 304 and cached:
+            products_data = cached["data"]
+            products = list(products_data.keys())
+        elif resp.status_code == 200:
             products_data = resp.json()
             products = list(products_data.keys())
+            if resp.headers.get("ETag"):
+                st.session_state.products_cache = {"etag": resp.headers["ETag"], "data": products_data}
         else:
             st.error("❌ Failed to fetch products")
             products = []
@@ -432,25 +462,47 @@ with col2:
     ask_clicked = st.button("🚀 Get Answer", type="primary", use_container_width=True)
 
 if ask_clicked and question.strip():
-    with st.spinner("🤖 Getting answer..."):
-        try:
-            response = requests.post(
-                f"{API_BASE}/rag/query",
-                json={"question": question, "product": st.session_state.selected_product}
-            )
-            
+    answer_placeholder = st.empty()
+    answer_placeholder.markdown("🤖 Getting answer...")
+    try:
+        with requests.post(
+            f"{API_BASE}/rag/query/stream",
+            json={"question": question, "product": st.session_state.selected_product},
+            stream=True
+        ) as response:
             if response.status_code == 200:
-                answer = response.json()["answer"]
-                st.session_state.chat_history.append({
-                    "question": question,
-                    "answer": answer,
-                    "product": st.session_state.selected_product
-                })
-                st.rerun()
+                answer = ""
+                error = None
+                event = None
+                for line in response.iter_lines(decode_unicode=True):
+                    if line.startswith("event: "):
+                        event = line[len("event: "):]
+                    elif line.startswith("data: "):
+                        data = json.loads(line[len("data: "):])
+                        if event == "token":
+                            answer += data["text"]
+                            answer_placeholder.markdown(f"""
+                            <div class="message-assistant">
+                                <strong>🤖 Answer:</strong><br>
+                                {answer}▌
+                            </div>
+                            """, unsafe_allow_html=True)
+                        elif event == "error":
+                            error = data["detail"]
+                if error:
+                    st.error(f"❌ Server Error: {error}")
+                else:
+                    st.session_state.chat_history.append({
+                        "question": question,
+                        "answer": answer,
+                        "product": st.session_state.selected_product
+                    })
+                    st.rerun()
             else:
+                answer_placeholder.empty()
                 st.error(f"❌ Server Error: {response.text}")
-        except Exception as e:
-            st.error(f"❌ Connection Error: {str(e)}")
+    except Exception as e:
+        st.error(f"❌ Connection Error: {str(e)}")
 
 elif ask_clicked and not question.strip():
     st.warning("⚠️ Please enter a question first!")